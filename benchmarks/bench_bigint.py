@@ -0,0 +1,49 @@
+import argparse
+import sys
+from time import perf_counter
+
+from interpreter.bigint import format_int, parse_int
+
+
+def measure(function, *args) -> float:
+    start = perf_counter()
+    function(*args)
+    return perf_counter() - start
+
+
+def builtin_str(value: int) -> str:
+    return str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.bench_bigint',
+        description='Время перевода длинных чисел в строку и обратно')
+    parser.add_argument('--digits', type=int, nargs='+',
+                        default=[10 ** 4, 10 ** 5, 10 ** 6],
+                        help='длины чисел в десятичных цифрах')
+    parser.add_argument('--builtin-limit', type=int, default=10 ** 5,
+                        help='встроенные int() и str() замеряются только '
+                             'до этой длины: дальше они слишком медленные')
+    args = parser.parse_args(argv)
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    try:
+        print(f'{"цифр":>10} {"format_int":>11} {"str":>8} '
+              f'{"parse_int":>10} {"int":>8}')
+        for digits in args.digits:
+            value = 7 ** int(digits / 0.845098)
+            text = format_int(value)
+            builtin = digits <= args.builtin_limit
+            str_time = f'{measure(builtin_str, value):.3f}' \
+                if builtin else '-'
+            int_time = f'{measure(int, text):.3f}' if builtin else '-'
+            print(f'{len(text):>10} {measure(format_int, value):>11.3f} '
+                  f'{str_time:>8} {measure(parse_int, text):>10.3f} '
+                  f'{int_time:>8}')
+    finally:
+        sys.set_int_max_str_digits(limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from benchmarks.programs import PROGRAMS
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.profiler import Profiler
+from interpreter.tracing_driver import TracingPietDriver
+
+
+def profiled(*args, **kwargs) -> CompiledPietDriver:
+    # профиль каждый раз новый: счетчики не копятся между запусками
+    return CompiledPietDriver(*args, profiler=Profiler(), **kwargs)
+
+
+ENGINES = {'interpret': PietDriver, 'compiled': CompiledPietDriver,
+           'int64': partial(CompiledPietDriver, int64='wrap'),
+           'tracing': TracingPietDriver,
+           'lazy': partial(CompiledPietDriver, lazy=True),
+           'profiled': profiled}
+# что сравнивается между запусками: для скорости больше - лучше
+METRICS = ('load_time', 'startup_time', 'steps_per_second', 'peak_memory')
+
+
+def run(path: str, engine: str, steps: int) -> Dict:
+    start = perf_counter()
+    picture = Picture.open_picture(path, 1)
+    loaded = perf_counter()
+    driver = ENGINES[engine](picture, False, io.StringIO(), io.StringIO(),
+                             io.StringIO(), Limits(steps=steps))
+    started = perf_counter()
+    status = driver.process_picture()
+    finished = perf_counter()
+    return {'width': picture.width, 'height': picture.height,
+            'status': status.value, 'steps': driver.governor.steps,
+            'load_time': loaded - start,
+            'startup_time': started - loaded,
+            'run_time': finished - started,
+            'steps_per_second': driver.governor.steps
+            / max(finished - started, 1e-9)}
+
+
+def peak_memory(path: str, engine: str, steps: int) -> int:
+    # отдельным запуском: под tracemalloc исполнение в разы медленнее
+    tracemalloc.start()
+    try:
+        run(path, engine, steps)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def get_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def profile_overhead(results: List[Dict]) -> Dict[str, float]:
+    # во сколько раз профиль замедляет скомпилированное исполнение
+    speeds = {(result['program'], result['engine']):
+              result['steps_per_second'] for result in results}
+    return {program: speeds[program, 'compiled'] / speed - 1
+            for (program, engine), speed in speeds.items()
+            if engine == 'profiled' and (program, 'compiled') in speeds}
+
+
+def compare(results: List[Dict], baseline: Dict):
+    old = {(result['program'], result['engine']): result
+           for result in baseline['results']}
+    print(f'\nпо сравнению с {baseline.get("commit") or "базой"} '
+          f'(новое / старое):')
+    print(f'{"программа":<16} {"способ":<10}'
+          + ''.join(f' {metric:>17}' for metric in METRICS))
+    for result in results:
+        previous = old.get((result['program'], result['engine']))
+        if previous is None:
+            continue
+        ratios = [f'{result[metric] / previous[metric]:>17.2f}'
+                  if result.get(metric) and previous.get(metric)
+                  else f'{"-":>17}' for metric in METRICS]
+        print(f'{result["program"]:<16} {result["engine"]:<10} '
+              + ' '.join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.bench_programs',
+        description='Замеры интерпретатора на порожденных картинках')
+    parser.add_argument('--programs', nargs='+', choices=PROGRAMS.keys(),
+                        default=list(PROGRAMS), help='какие программы')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES.keys(),
+                        default=list(ENGINES), help='способы исполнения')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='множитель размеров картинок')
+    parser.add_argument('--steps', type=int, default=100000,
+                        help='сколько шагов исполнять каждую программу')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='не замерять пиковую память')
+    parser.add_argument('-o', dest='output', type=str, default=None,
+                        help='куда записать результаты в json')
+    parser.add_argument('--compare', type=str, default=None,
+                        metavar='JSON',
+                        help='результаты прошлого запуска для сравнения')
+    args = parser.parse_args(argv)
+    results = []
+    print(f'{"программа":<16} {"способ":<10} {"размер":>11} '
+          f'{"загрузка":>9} {"старт":>7} {"шагов/с":>10} {"память":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.programs:
+            generate, share = PROGRAMS[name]
+            path = str(Path(directory) / f'{name}.png')
+            generate(args.scale).save(path)
+            steps = max(int(args.steps * share), 1)
+            for engine in args.engines:
+                result = {'program': name, 'engine': engine}
+                result.update(run(path, engine, steps))
+                result['peak_memory'] = peak_memory(
+                    path, engine, steps) if args.memory else None
+                results.append(result)
+                memory = f'{result["peak_memory"] / 2 ** 20:.1f}M' \
+                    if args.memory else '-'
+                size = f'{result["width"]}x{result["height"]}'
+                print(f'{name:<16} {engine:<10} {size:>11} '
+                      f'{result["load_time"]:>9.3f} '
+                      f'{result["startup_time"]:>7.3f} '
+                      f'{result["steps_per_second"]:>10.0f} {memory:>10}')
+    overhead = profile_overhead(results)
+    if overhead:
+        print('\nцена профиля (profiled к compiled):')
+        for name, share in overhead.items():
+            print(f'{name:<16} {share:>+8.1%}')
+    report = {'commit': get_commit(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'scale': args.scale,
+              'steps': args.steps, 'results': results,
+              'profile_overhead': overhead}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2),
+                                     encoding='utf-8')
+    if args.compare:
+        compare(results,
+                json.loads(Path(args.compare).read_text(encoding='utf-8')))
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from interpreter.colors import Hue, Lightness, colors
+from interpreter.commands import COMMANDS
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+START = (255, 192, 192)
+# (оттенок, светлота) : цвет
+RGB = {(hue, lightness): rgb for rgb, (lightness, hue) in colors.items()
+       if hue >= 0}
+# имя команды : (сдвиг оттенка, сдвиг светлоты)
+SHIFTS = {command.name: key for key, command in COMMANDS.items()}
+
+
+def shift_color(rgb: Tuple[int, int, int],
+                command: str) -> Tuple[int, int, int]:
+    lightness, hue = colors[rgb]
+    hue_shift, lightness_shift = SHIFTS[command]
+    return RGB[Hue((hue + hue_shift) % 6),
+               Lightness((lightness + lightness_shift) % 3)]
+
+
+def closed_cycle(pattern: List[Optional[str]]) -> List[Optional[str]]:
+    # повторяет pattern, пока сдвиги цвета не дадут в сумме ноль:
+    # иначе переход с последнего коделя на первый выполнит не ту команду
+    hue = sum(SHIFTS[command][0] for command in pattern if command)
+    lightness = sum(SHIFTS[command][1] for command in pattern if command)
+    repeat = 1
+    while (hue * repeat) % 6 or (lightness * repeat) % 3:
+        repeat += 1
+    cycle = pattern * repeat
+    # кольцо высотой 3 коделя состоит из четного числа коделей
+    return cycle * 2 if len(cycle) % 2 else cycle
+
+
+def ring(cycle: List[Optional[str]]) -> Image.Image:
+    # кольцо из одиночных коделей вокруг черной полосы: программа
+    # обходит его по часовой стрелке бесконечно, на углах направление
+    # меняется о край картинки, None - белый кодель
+    width = (len(cycle) - 2) // 2
+    if width < 2:
+        raise ValueError('слишком короткий цикл')
+    order = ([(x, 0) for x in range(width)] + [(width - 1, 1)]
+             + [(x, 2) for x in range(width - 1, -1, -1)] + [(0, 1)])
+    pixels = [BLACK] * (width * 3)
+    pixels[0] = color = START
+    # cycle[i] - команда при входе в i-й кодель, cycle[0] выполняется
+    # при возврате с последнего коделя на первый
+    for (x, y), command in zip(order[1:], cycle[1:]):
+        if command is None:
+            pixels[y * width + x] = WHITE
+            continue
+        color = shift_color(color, command)
+        pixels[y * width + x] = color
+    picture = Image.new('RGB', (width, 3))
+    picture.putdata(pixels)
+    return picture
+
+
+def huge_block(scale: float) -> Image.Image:
+    # один блок size x size и кодель справа от него: программа ходит
+    # между ними, push туда и pop обратно
+    size = max(int(1000 * scale), 2)
+    picture = Image.new('RGB', (size + 1, size), BLACK)
+    picture.paste(START, (0, 0, size, size))
+    picture.putpixel((size, 0), shift_color(START, 'push'))
+    return picture
+
+
+def white_corridor(scale: float) -> Image.Image:
+    # push и pop по краям длинных белых коридоров сверху и снизу
+    length = max(int(1000 * scale), 1)
+    whites: List[Optional[str]] = [None] * length
+    return ring(['push'] + whites + ['pop', 'push', 'pop'] + whites
+                + ['push', 'pop'])
+
+
+def roll_loop(scale: float) -> Image.Image:
+    # каждый круг кладет в стэк одно значение и сдвигает верхние
+    # 2 ** bits значений на одно
+    bits = max(int(10 * scale), 1)
+    return ring(closed_cycle(['push', 'push'] + ['duplicate', 'add'] * bits
+                             + ['push', 'roll']))
+
+
+def arithmetic_loop(scale: float) -> Image.Image:
+    # ((1 + 1) * (1 + 1)) без роста стэка
+    return ring(closed_cycle(['push', 'push', 'add', 'duplicate',
+                              'multiply', 'pop']))
+
+
+def bigint_growth(scale: float) -> Image.Image:
+    # число на вершине стэка удваивается каждые четыре шага
+    return ring(closed_cycle(['push', 'add', 'duplicate', 'add']))
+
+
+def output_loop(scale: float) -> Image.Image:
+    # печатает "1\n" каждые 14 шагов
+    return ring(closed_cycle(['push', 'duplicate', 'out_int', 'push',
+                              'duplicate', 'add', 'duplicate', 'multiply',
+                              'push', 'add', 'duplicate', 'add',
+                              'out_char', 'pop']))
+
+
+def branch_loop(scale: float) -> Image.Image:
+    # счетчик растет на каждом круге, switch и pointer снимают его
+    # четность и четность, умноженную на 4: путь тот же, но dp и cc
+    # каждый раз зависят от значений в стэке
+    return ring(closed_cycle(['push', 'add', 'duplicate', 'push', 'push',
+                              'add', 'mod', 'duplicate', 'switch', 'push',
+                              'duplicate', 'add', 'duplicate', 'add',
+                              'multiply', 'pointer']))
+
+
+def decorated_loop(scale: float) -> Image.Image:
+    # маленький цикл в углу огромной картинки, остальное - узор из
+    # одиночных коделей случайных цветов, до которого исполнение не
+    # доходит: его отделяет черная рамка
+    loop = arithmetic_loop(scale)
+    size = max(int(1000 * scale), loop.width + 2, 5)
+    generator = random.Random(0)
+    palette = list(RGB.values()) + [WHITE]
+    picture = Image.new('RGB', (size, size))
+    picture.putdata([generator.choice(palette) for _ in range(size * size)])
+    picture.paste(BLACK, (0, 0, loop.width + 1, loop.height + 1))
+    picture.paste(loop, (0, 0))
+    return picture
+
+
+# имя : (картинка по масштабу, доля от --steps): на больших блоках и
+# длинных белых коридорах шаг обходом картинки стоит O(размер)
+PROGRAMS: Dict[str, Tuple[Callable[[float], Image.Image], float]] = {
+    'huge_block': (huge_block, 0.002),
+    'white_corridor': (white_corridor, 0.05),
+    'roll_loop': (roll_loop, 1),
+    'arithmetic_loop': (arithmetic_loop, 1),
+    'bigint_growth': (bigint_growth, 1),
+    'output_loop': (output_loop, 1),
+    'branch_loop': (branch_loop, 1),
+    'decorated_loop': (decorated_loop, 1),
+}
@@ -1,28 +1,409 @@
 import argparse
+import json
+import signal
 import sys
+from functools import partial
 from pathlib import Path
+from typing import Optional
 
+from interpreter.cache import ProgramCache
+from interpreter.checkpoint import (Checkpointer, open_checkpoint,
+                                    output_position, truncate_output)
+from interpreter.commands import COMMANDS as COMMAND_CLASSES
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.graph import split_state
+from interpreter.limits import Limits, Status
+from interpreter.mapped import save_grid
 from interpreter.picture import Picture
 from interpreter.piet_driver import PietDriver
+from interpreter.profiler import Profiler, write_profile
+from interpreter.program import Program
+from interpreter.stacks import STACKS
+from interpreter.streams import FlushPolicy
+from interpreter.trace import TraceReader, TraceRecorder
+from interpreter.tracing_driver import TracingPietDriver
+from interpreter.transpiler import transpile_picture
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Piet Interpreter')
+ENGINES = {'interpret': PietDriver, 'compiled': CompiledPietDriver,
+           'tracing': TracingPietDriver}
+
+
+def add_picture_arguments(parser: argparse.ArgumentParser):
     parser.add_argument('script',
                         help='путь до программы-картинки',
                         type=str)
-    parser.add_argument('-s', dest='step_by_step',
-                        action='store_true',
-                        help='выполнить в пошаговом режиме')
-    args = parser.parse_args()
+    parser.add_argument('--codel-size', dest='codel_size',
+                        type=int, default=None,
+                        help='размер коделя в пикселях, по умолчанию '
+                             'определяется по картинке')
+
+
+def add_limit_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--max-steps', dest='max_steps', type=int,
+                        default=None, help='наибольшее число шагов')
+    parser.add_argument('--max-time', dest='max_time', type=float,
+                        default=None, help='наибольшее время работы, с')
+    parser.add_argument('--max-stack', dest='max_stack', type=int,
+                        default=None, help='наибольшая длина стэка')
+    parser.add_argument('--max-int-bits', dest='max_int_bits', type=int,
+                        default=None,
+                        help='наибольший суммарный размер чисел в стэке, '
+                             'бит')
+    parser.add_argument('--max-output', dest='max_output', type=int,
+                        default=None, help='наибольший размер вывода, байт')
+
+
+def get_limits(args: argparse.Namespace) -> Optional[Limits]:
+    limits = Limits(steps=args.max_steps, seconds=args.max_time,
+                    stack=args.max_stack, int_bits=args.max_int_bits,
+                    output=args.max_output)
+    return None if limits == Limits() else limits
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--output-buffer', dest='output_buffer', type=int,
+                        default=FlushPolicy.size,
+                        help='размер буфера вывода в символах, '
+                             '0 - без буферизации')
+    parser.add_argument('--flush-newline', dest='flush_newline',
+                        action='store_true', default=None,
+                        help='сбрасывать вывод после каждой строки, '
+                             'по умолчанию - только для терминала')
+
+
+def get_flush_policy(args: argparse.Namespace) -> FlushPolicy:
+    newline = args.flush_newline
+    if newline is None:
+        newline = sys.stdout.isatty()
+    return FlushPolicy(max(args.output_buffer, 0), newline)
+
+
+def add_input_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('-i', '--input', dest='input', type=str,
+                        default=None,
+                        help='файл с вводом программы вместо стандартного '
+                             'ввода')
+    parser.add_argument('--tokens', dest='tokens', action='store_true',
+                        help='in_int читает числа, разделенные любыми '
+                             'пробельными символами, а не по одному '
+                             'на строку')
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true',
+                        help='не использовать кэш разобранных картинок')
+
+
+def open_program(parser: argparse.ArgumentParser,
+                 args: argparse.Namespace, open_function):
+    if args.codel_size is not None and args.codel_size < 1:
+        parser.error('размер коделя должен быть положительным')
     script_path = Path(args.script)
     if not (script_path.exists() and script_path.is_file()):
         print('Файл не найден')
         exit(1)
-    piet_driver = PietDriver(
-        Picture.open_picture(script_path),
-        args.step_by_step, sys.stdin, sys.stdout, sys.stderr)
     try:
-        piet_driver.process_picture()
+        return open_function(script_path, args.codel_size)
+    except ValueError as error:
+        print(error)
+        exit(1)
+
+
+def open_picture(parser: argparse.ArgumentParser,
+                 args: argparse.Namespace) -> Picture:
+    if not args.no_cache:
+        return open_cached_program(parser, args).picture
+    return open_program(parser, args, Picture.open_picture)
+
+
+def open_cached_program(parser: argparse.ArgumentParser,
+                        args: argparse.Namespace) -> Program:
+    return open_program(parser, args, ProgramCache().open_program)
+
+
+def run_program(argv):
+    parser = argparse.ArgumentParser(description='Piet Interpreter')
+    add_picture_arguments(parser)
+    parser.add_argument('-s', dest='step_by_step',
+                        action='store_true',
+                        help='выполнить в пошаговом режиме')
+    parser.add_argument('-e', '--engine', dest='engine',
+                        choices=ENGINES.keys(), default='interpret',
+                        help='способ исполнения: interpret - обход '
+                             'картинки на каждом шаге, compiled - заранее '
+                             'построенный граф переходов, tracing - он же, '
+                             'а часто повторяющиеся пути переводятся в '
+                             'код на питоне')
+    parser.add_argument('--lazy', dest='lazy', action='store_true',
+                        help='размечать блоки и вычислять переходы, только '
+                             'когда до них доходит исполнение, - для '
+                             'огромных картинок; кэш не используется')
+    parser.add_argument('--stack', dest='stack', choices=STACKS.keys(),
+                        default='list',
+                        help='устройство стэка: list - обычный список, '
+                             'blocks - список кусков с быстрым roll '
+                             'на большую глубину')
+    parser.add_argument('--int64', dest='int64', nargs='?',
+                        choices=('wrap', 'trap'), const='wrap',
+                        default=None,
+                        help='числа в 64 битах в массиве вместо длинных: '
+                             'wrap - переполнение по модулю 2^64, trap - '
+                             'остановка с int_limit')
+    parser.add_argument('--profile', dest='profile', nargs='?',
+                        const='', default=None, metavar='PREFIX',
+                        help='посчитать исполнения блоков, переходов и '
+                             'команд и записать PREFIX.profile.txt и '
+                             'PREFIX.profile.png, по умолчанию PREFIX - '
+                             'путь до картинки без расширения')
+    parser.add_argument('--trace', dest='trace', type=str, default=None,
+                        metavar='FILE',
+                        help='записать двоичную трассу исполнения')
+    parser.add_argument('--trace-ring', dest='trace_ring', type=int,
+                        default=None, metavar='BYTES',
+                        help='хранить только последние BYTES байт трассы '
+                             'и записать их в конце')
+    parser.add_argument('--keyframe-every', dest='keyframe_every',
+                        type=int, default=10000,
+                        help='через сколько шагов записывать весь стэк')
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str,
+                        default=None, metavar='FILE',
+                        help='сохранять состояние исполнения в FILE: '
+                             'по сигналу SIGUSR1, при превышении '
+                             'ограничения и каждые --checkpoint-every шагов')
+    parser.add_argument('--checkpoint-every', dest='checkpoint_every',
+                        type=int, default=None, metavar='N',
+                        help='сохранять состояние каждые N шагов')
+    parser.add_argument('--resume', dest='resume', type=str, default=None,
+                        metavar='FILE',
+                        help='продолжить исполнение с контрольной точки')
+    add_limit_arguments(parser)
+    add_input_arguments(parser)
+    add_output_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.step_by_step and args.engine != 'interpret':
+        parser.error('пошаговый режим доступен только для -e interpret')
+    if args.lazy:
+        program = open_program(parser, args,
+                               partial(Program.open_program, lazy=True))
+        picture = program.picture
+    elif args.no_cache:
+        picture, program = open_picture(parser, args), None
+    else:
+        program = open_cached_program(parser, args)
+        picture = program.picture
+    if args.keyframe_every < 1:
+        parser.error('--keyframe-every должен быть положительным')
+    if args.int64 is not None and args.stack != 'list':
+        parser.error('--int64 использует свой стэк, --stack не нужен')
+    if args.checkpoint_every is not None and args.checkpoint is None:
+        parser.error('--checkpoint-every нужен вместе с --checkpoint')
+    if args.checkpoint_every is not None and args.checkpoint_every < 1:
+        parser.error('--checkpoint-every должен быть положительным')
+    if args.step_by_step and (args.checkpoint or args.resume):
+        parser.error('контрольные точки недоступны в пошаговом режиме')
+    try:
+        in_stream = open(args.input, 'rb') if args.input else sys.stdin
+        trace_stream = open(args.trace, 'wb') if args.trace else None
+    except OSError as error:
+        print(error)
+        exit(1)
+    tracer = TraceRecorder(trace_stream, picture.width, picture.height,
+                           args.keyframe_every, args.trace_ring) \
+        if trace_stream is not None else None
+    checkpointer = None
+    if args.checkpoint is not None:
+        checkpointer = Checkpointer(args.checkpoint, args.checkpoint_every)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, checkpointer.request)
+    # в двоичный поток вывод пишется без лишнего текстового слоя
+    out_stream = getattr(sys.stdout, 'buffer', sys.stdout)
+    piet_driver = ENGINES[args.engine](
+        picture, args.step_by_step, in_stream, out_stream, sys.stderr,
+        get_limits(args), program=program,
+        flush_policy=None if args.step_by_step else get_flush_policy(args),
+        input_tokens=args.tokens, stack_class=STACKS[args.stack],
+        profiler=Profiler() if args.profile is not None else None,
+        tracer=tracer, checkpointer=checkpointer, int64=args.int64)
+    if args.resume is not None:
+        try:
+            checkpoint = open_checkpoint(args.resume)
+            piet_driver.restore(checkpoint)
+        except (OSError, ValueError) as error:
+            print(error)
+            exit(1)
+        # вывод до точки уже есть в файле, если он дописывается через >>
+        truncate_output(out_stream, checkpoint.output_start
+                        + checkpoint.output_offset)
+    else:
+        piet_driver.output_start = output_position(out_stream)
+    try:
+        status = piet_driver.process_picture()
     except KeyboardInterrupt:
         print('Вы прервали обработку программы')
         exit(1)
+    finally:
+        if trace_stream is not None:
+            trace_stream.close()
+        if args.profile is not None:
+            write_profile(piet_driver.profiler, piet_driver.blocks,
+                          piet_driver.picture, args.script,
+                          args.profile
+                          or str(Path(args.script).with_suffix('')))
+    if status != Status.FINISHED:
+        sys.stderr.write(f'\nпревышено ограничение: {status.value}\n')
+        exit(2)
+
+
+def compile_program(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m interpreter compile',
+        description='Перевод программы-картинки в модуль на питоне')
+    add_picture_arguments(parser)
+    parser.add_argument('-o', dest='output', type=str, default=None,
+                        help='куда записать модуль, по умолчанию - '
+                             'рядом с картинкой с расширением .py')
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    picture = open_picture(parser, args)
+    output = Path(args.output) if args.output \
+        else Path(args.script).with_suffix('.py')
+    output.write_text(transpile_picture(picture, Path(args.script).name),
+                      encoding='utf-8')
+
+
+def export_program(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m interpreter export',
+        description='Запись разобранных коделей картинки в файл, который '
+                    'читается через mmap без разбора')
+    add_picture_arguments(parser)
+    parser.add_argument('-o', dest='output', type=str, default=None,
+                        help='куда записать, по умолчанию - рядом с '
+                             'картинкой с расширением .grid')
+    args = parser.parse_args(argv)
+    args.no_cache = True
+    picture = open_picture(parser, args)
+    output = args.output or str(Path(args.script).with_suffix('.grid'))
+    save_grid(picture, output)
+
+
+def batch_program(argv):
+    # пул процессов не нужен обычному запуску картинки
+    from interpreter.batch import read_manifest, run_batch
+    parser = argparse.ArgumentParser(
+        prog='python -m interpreter batch',
+        description='Исполнение многих заданий (картинка, ввод) в пуле '
+                    'процессов')
+    parser.add_argument('manifest', type=str,
+                        help='файл заданий, по одному json на строку: '
+                             '{"program": ..., "input": ..., "id": ..., '
+                             '"codel_size": ...}')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=None,
+                        help='число процессов, по умолчанию - по числу ядер')
+    parser.add_argument('-o', dest='output', type=str, default=None,
+                        help='куда записать результаты, по умолчанию - '
+                             'стандартный вывод')
+    add_limit_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('число процессов должно быть положительным')
+    jobs = read_manifest(args.manifest)
+    output = open(args.output, 'w', encoding='utf-8') if args.output \
+        else sys.stdout
+    try:
+        for result in run_batch(jobs, get_limits(args), args.jobs):
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def serve_programs(argv):
+    # сервер и asyncio не нужны обычному запуску картинки
+    import asyncio
+    from interpreter.server import (MAX_PROGRAMS, MAX_REQUEST, MAX_RUNNING,
+                                    ProgramServer)
+    parser = argparse.ArgumentParser(
+        prog='python -m interpreter serve',
+        description='Сервер исполнения программ по HTTP: POST /programs '
+                    'с картинкой в теле возвращает ее хэш, POST /run с '
+                    'json {"program" или "image" (base64), "input", '
+                    '"max_steps", ...} - вывод, статус и число шагов')
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', dest='socket', type=str,
+                         help='путь до unix-сокета')
+    address.add_argument('--port', dest='port', type=int,
+                         help='порт на 127.0.0.1')
+    parser.add_argument('--programs', dest='programs', type=int,
+                        default=MAX_PROGRAMS,
+                        help='сколько разобранных программ держать '
+                             'в памяти')
+    parser.add_argument('--concurrency', dest='concurrency', type=int,
+                        default=MAX_RUNNING,
+                        help='сколько программ исполнять одновременно')
+    parser.add_argument('--max-request', dest='max_request', type=int,
+                        default=MAX_REQUEST,
+                        help='наибольший размер запроса, байт')
+    add_limit_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if min(args.programs, args.concurrency, args.max_request) < 1:
+        parser.error('--programs, --concurrency и --max-request должны '
+                     'быть положительными')
+    server = ProgramServer(get_limits(args), args.programs,
+                           args.concurrency, args.max_request,
+                           None if args.no_cache else ProgramCache())
+    try:
+        asyncio.run(server.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        print(error)
+        exit(1)
+    finally:
+        if args.socket and Path(args.socket).is_socket():
+            Path(args.socket).unlink()
+
+
+def replay_trace(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m interpreter replay',
+        description='Состояние исполнения по записанной трассе')
+    parser.add_argument('trace', type=str, help='файл трассы')
+    parser.add_argument('--step', dest='step', type=int, default=None,
+                        help='номер шага, по умолчанию - последний')
+    parser.add_argument('-n', dest='count', type=int, default=1,
+                        help='сколько шагов показать начиная со --step')
+    args = parser.parse_args(argv)
+    try:
+        reader = TraceReader.open(args.trace)
+    except (OSError, ValueError) as error:
+        print(error)
+        exit(1)
+    print(f'записаны шаги {reader.first_step()}..{reader.steps}')
+    step = reader.steps if args.step is None else args.step
+    try:
+        for frame, _ in zip(reader.frames(step), range(args.count)):
+            codel, dp, cc = split_state(frame.state)
+            y, x = divmod(codel, reader.width)
+            name = COMMAND_CLASSES[frame.command].name \
+                if frame.command is not None else '-'
+            print(f'шаг {frame.step}: кодель ({x}, {y}), dp: {dp}, '
+                  f'cc: {cc}, команда: {name}, стэк: {frame.stack}')
+    except IndexError as error:
+        print(error)
+        exit(1)
+
+
+# подкоманды, имя которых не может быть путем до картинки
+COMMANDS = {'compile': compile_program, 'batch': batch_program,
+            'replay': replay_trace, 'export': export_program,
+            'serve': serve_programs}
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+    else:
+        run_program(sys.argv[1:])
@@ -0,0 +1,152 @@
+import asyncio
+import io
+from collections import deque
+from typing import Callable, Deque, List, Optional, Union
+
+from interpreter.commands import Pointer, Switch
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.graph import CODEL_CHOOSERS, DIRECTIONS
+from interpreter.limits import Limits, LimitExceeded, Status
+from interpreter.picture import Picture
+from interpreter.program import Program
+from interpreter.streams import FlushPolicy
+
+# через сколько шагов исполнение отдает управление циклу событий
+YIELD_EVERY = 1000
+
+
+class InputPending(Exception):
+    # команде ввода нужны данные, которых источник еще не прислал
+    pass
+
+
+class AsyncInput:
+    # поток для InputReader поверх асинхронного источника с await
+    # readline(), как у asyncio.StreamReader: отдает только уже
+    # полученные строки
+    def __init__(self, source):
+        self.source = source
+        self.lines: Deque[Union[str, bytes]] = deque()
+        self.empty: Union[str, bytes] = ''
+        self.eof = False
+
+    def readline(self) -> Union[str, bytes]:
+        if self.lines:
+            return self.lines.popleft()
+        if self.eof:
+            return self.empty
+        raise InputPending
+
+    async def receive(self):
+        line = await self.source.readline()
+        if line:
+            self.lines.append(line)
+        else:
+            self.empty = line
+            self.eof = True
+
+
+class PendingOutput:
+    # вывод, который еще не отправлен в асинхронный приемник
+    def __init__(self):
+        self.parts: List[str] = []
+
+    def write(self, value: str):
+        self.parts.append(value)
+        return len(value)
+
+    def take(self) -> str:
+        text = ''.join(self.parts)
+        self.parts.clear()
+        return text
+
+
+class AsyncPietDriver(CompiledPietDriver):
+    def __init__(self, picture: Picture, source, sink,
+                 error_stream=None,
+                 limits: Optional[Limits] = None,
+                 program: Optional[Program] = None,
+                 flush_policy: Optional[FlushPolicy] = None,
+                 input_tokens: bool = False,
+                 stack_class: Callable[[], List[int]] = list,
+                 yield_every: int = YIELD_EVERY):
+        # source - с await readline(), sink - с write(bytes) и,
+        # если есть, await drain(), как у asyncio.StreamWriter
+        self.source = AsyncInput(source)
+        self.pending = PendingOutput()
+        self.sink = sink
+        self.yield_every = yield_every
+        super().__init__(picture, False, self.source, self.pending,
+                         error_stream if error_stream is not None
+                         else io.StringIO(), limits,
+                         optimize_chains=False, program=program,
+                         flush_policy=flush_policy,
+                         input_tokens=input_tokens, stack_class=stack_class)
+
+    async def send(self):
+        self.output.flush()
+        text = self.pending.take()
+        if text:
+            self.sink.write(text.encode('utf-8', 'surrogatepass'))
+        drain = getattr(self.sink, 'drain', None)
+        if drain is not None:
+            await drain()
+
+    async def process(self) -> Status:
+        if self.governor is not None:
+            self.governor.start()
+        try:
+            await self.run_async()
+        except LimitExceeded as error:
+            self.status = error.status
+        else:
+            self.status = Status.FINISHED
+        finally:
+            await self.send()
+        return self.status
+
+    async def run_async(self):
+        # тот же обход переходов, что и run_transitions, но команда
+        # ввода без данных не выполняется, а ждет их и повторяется
+        transitions = self.graph.transitions
+        resolve = self.graph.resolve
+        commands = self.command_instances
+        stack = self.stack
+        governor = self.governor
+        state = self.get_state()
+        countdown = self.yield_every
+        try:
+            while True:
+                transition = transitions.get(state, False)
+                if transition is False:
+                    transition = resolve(state)
+                if transition is None:
+                    break
+                if governor is not None:
+                    governor.before_steps(stack)
+                next_state = transition.state
+                if transition.command is not None:
+                    command = commands[transition.command]
+                    if isinstance(command, (Pointer, Switch)):
+                        next_state = self.run_branch(transition)
+                    else:
+                        self.current_command = command
+                        try:
+                            command(stack, transition.block_size,
+                                    DIRECTIONS[transition.dp],
+                                    CODEL_CHOOSERS[transition.cc])
+                        except InputPending:
+                            # стэк не изменился: шаг повторится целиком
+                            if governor is not None:
+                                governor.steps -= 1
+                            await self.send()
+                            await self.source.receive()
+                            continue
+                state = next_state
+                countdown -= 1
+                if countdown == 0:
+                    countdown = self.yield_every
+                    await self.send()
+                    await asyncio.sleep(0)
+        finally:
+            self.set_state(state)
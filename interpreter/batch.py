@@ -0,0 +1,96 @@
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator, List, Optional
+
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.program import Program
+
+
+@dataclass
+class Job:
+    id: str
+    program: str
+    # путь до файла с вводом, None - пустой ввод
+    input: Optional[str] = None
+    codel_size: Optional[int] = None
+
+
+# сколько разобранных программ держит процесс-исполнитель
+MAX_PROGRAMS = 16
+
+
+# картинка открывается и размечается один раз на процесс, а не на каждое
+# задание; давно не использованные программы вытесняются, чтобы длинный
+# список разных картинок не занимал память исполнителя без предела
+@lru_cache(maxsize=MAX_PROGRAMS)
+def get_program(path: str, codel_size: Optional[int]) -> Program:
+    return Program.open_program(path, codel_size)
+
+
+def read_manifest(manifest_path: str) -> List[Job]:
+    # строки вида {"program": ..., "input": ..., "id": ..., "codel_size": ...},
+    # относительные пути считаются от папки манифеста
+    base = Path(manifest_path).parent
+    jobs = []
+    with open(manifest_path, encoding='utf-8') as manifest:
+        for number, line in enumerate(manifest, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            jobs.append(Job(
+                str(record.get('id', number)),
+                str(base / record['program']),
+                str(base / record['input']) if record.get('input') else None,
+                record.get('codel_size')))
+    return jobs
+
+
+def run_job(job: Job, limits: Optional[Limits] = None) -> dict:
+    # шаги считает governor, поэтому ограничения есть всегда
+    limits = limits if limits is not None else Limits()
+    result = {'id': job.id, 'program': job.program}
+    out_stream = io.StringIO()
+    start = perf_counter()
+    driver = None
+    try:
+        program = get_program(job.program, job.codel_size)
+        # файл ввода читается через mmap
+        with open(job.input, 'rb') if job.input is not None \
+                else io.BytesIO() as in_stream:
+            driver = CompiledPietDriver(program.picture, False, in_stream,
+                                        out_stream, io.StringIO(), limits,
+                                        program=program)
+            try:
+                result['status'] = driver.process_picture().value
+            finally:
+                driver.in_stream.close()
+    except (Exception, SystemExit) as error:
+        result['status'] = 'error'
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['stdout'] = out_stream.getvalue()
+    result['steps'] = driver.governor.steps if driver is not None else 0
+    result['time'] = perf_counter() - start
+    return result
+
+
+def run_batch(jobs: List[Job], limits: Optional[Limits] = None,
+              workers: Optional[int] = None) -> Iterator[dict]:
+    # результаты отдаются по мере готовности, а не в порядке заданий
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            yield run_job(job, limits)
+        return
+    # по заданию на future, чтобы результат выводился сразу; картинку
+    # каждый процесс все равно разбирает один раз (get_program)
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(run_job, job, limits) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
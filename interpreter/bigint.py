@@ -0,0 +1,65 @@
+import decimal
+from typing import Dict
+
+# числа короче этого переводятся встроенными int() и str(): они быстрые
+# на малых длинах и не упираются в sys.get_int_max_str_digits()
+PARSE_DIGITS = 3000
+FORMAT_BITS = 9000
+
+_CONTEXT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX,
+                           Emin=decimal.MIN_EMIN)
+_POWERS_OF_FIVE: Dict[int, int] = {}
+_POWERS_OF_TWO: Dict[int, decimal.Decimal] = {}
+
+
+def _power_of_five(exponent: int) -> int:
+    power = _POWERS_OF_FIVE.get(exponent)
+    if power is None:
+        power = _POWERS_OF_FIVE[exponent] = 5 ** exponent
+    return power
+
+
+def _power_of_two(exponent: int) -> decimal.Decimal:
+    power = _POWERS_OF_TWO.get(exponent)
+    if power is None:
+        power = _POWERS_OF_TWO[exponent] = _CONTEXT.power(
+            decimal.Decimal(2), exponent)
+    return power
+
+
+def _parse(text: str, start: int, end: int) -> int:
+    if end - start <= PARSE_DIGITS:
+        return int(text[start:end])
+    # старшая половина * 10 ** k = (старшая * 5 ** k) << k
+    middle = (start + end + 1) // 2
+    exponent = end - middle
+    return (((_parse(text, start, middle) * _power_of_five(exponent))
+             << exponent) + _parse(text, middle, end))
+
+
+def parse_int(text: str) -> int:
+    # строка десятичных цифр без знака, делится пополам, пока части
+    # не станут короткими, поэтому разбор не квадратичный
+    if len(text) <= PARSE_DIGITS:
+        return int(text)
+    return _parse(text, 0, len(text))
+
+
+def _to_decimal(value: int, bits: int) -> decimal.Decimal:
+    if bits <= FORMAT_BITS:
+        return decimal.Decimal(value)
+    # склейка половин по битам: умножение в decimal не квадратичное
+    low_bits = bits >> 1
+    high = value >> low_bits
+    low = value - (high << low_bits)
+    return _CONTEXT.fma(_to_decimal(high, bits - low_bits),
+                        _power_of_two(low_bits),
+                        _to_decimal(low, low_bits))
+
+
+def format_int(value: int) -> str:
+    if value.bit_length() <= FORMAT_BITS:
+        return str(value)
+    if value < 0:
+        return '-' + format_int(-value)
+    return str(_to_decimal(value, value.bit_length()))
@@ -0,0 +1,299 @@
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from interpreter.colors import Color, COLORS
+from interpreter.directions import Direction
+from interpreter.picture import Picture
+
+
+class Block:
+    def __init__(self, index: int, color: Color, block_map: 'BlockMap'):
+        self.index = index
+        self.color = color
+        self.block_map = block_map
+        self.size = 0
+        # ограничивающий прямоугольник: (min_x, min_y, max_x, max_y)
+        self.bbox: Tuple[int, int, int, int] = (0, 0, 0, 0)
+        # y : [min_x, max_x] и x : [min_y, max_y] кодели блока
+        # в строке (столбце) - крайние кодели по dp
+        self.rows: Dict[int, List[int]] = {}
+        self.cols: Dict[int, List[int]] = {}
+        # отрезки блока в строке (столбце) - (начала, концы) по
+        # возрастанию; крайние кодели по cc, считаются при первом выходе
+        # из блока через эту строку (столбец)
+        self.row_runs: Dict[int, Tuple[List[int], List[int]]] = {}
+        self.col_runs: Dict[int, Tuple[List[int], List[int]]] = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, cord) -> bool:
+        return self.block_map.block_id(cord[0], cord[1]) == self.index
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        min_x, min_y, max_x, max_y = self.bbox
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+                if self.block_map.block_id(x, y) == self.index:
+                    yield x, y
+
+    def __repr__(self):
+        return (f'блок {self.index}: {self.color}, '
+                f'размер: {self.size}, границы: {self.bbox}')
+
+    def uttermost_by_dp(self, x: int, y: int,
+                        dp: Direction) -> Tuple[int, int]:
+        if dp == Direction.RIGHT:
+            return self.rows[y][1], y
+        if dp == Direction.LEFT:
+            return self.rows[y][0], y
+        if dp == Direction.DOWN:
+            return x, self.cols[x][1]
+        return x, self.cols[x][0]
+
+    def _runs(self, line: int, lines: Dict[int, List[int]],
+              codel: int, step: int) -> Tuple[List[int], List[int]]:
+        first, last = lines[line]
+        starts: List[int] = []
+        ends: List[int] = []
+        owns = self.block_map.owns
+        index = self.index
+        inside = False
+        for i in range(first, last + 1):
+            if owns(codel + i * step, index):
+                if not inside:
+                    starts.append(i)
+                    inside = True
+            elif inside:
+                ends.append(i - 1)
+                inside = False
+        ends.append(last)
+        return starts, ends
+
+    def uttermost_by_cc(self, x: int, y: int,
+                        direction: Direction) -> Tuple[int, int]:
+        # конец отрезка блока, на котором лежит (x, y), по direction -
+        # как шаги по коделям того же цвета, но без обхода
+        dx, dy = direction.value
+        if dy == 0:
+            runs = self.row_runs.get(y)
+            if runs is None:
+                runs = self.row_runs[y] = self._runs(
+                    y, self.rows, y * self.block_map.width, 1)
+            position = x
+        else:
+            runs = self.col_runs.get(x)
+            if runs is None:
+                runs = self.col_runs[x] = self._runs(
+                    x, self.cols, x, self.block_map.width)
+            position = y
+        starts, ends = runs
+        run = bisect_right(starts, position) - 1
+        edge = ends[run] if dx + dy > 0 else starts[run]
+        if dy == 0:
+            return edge, y
+        return x, edge
+
+
+class BlockMap:
+    def __init__(self, picture: Picture):
+        self.width = picture.width
+        self.height = picture.height
+        self.codels = picture.codels
+        self.labels: List[int] = [-1] * (self.width * self.height)
+        self.blocks: List[Block] = []
+        # номера блоков, пропавших при update, - их получат новые блоки
+        self.free: List[int] = []
+        for start in range(len(self.codels)):
+            if self.labels[start] == -1:
+                self._fill(start)
+
+    @classmethod
+    def restore(cls, picture: Picture, labels: List[int],
+                blocks: List[tuple]) -> 'BlockMap':
+        # разметка из кэша: blocks - (индекс цвета, размер,
+        # границы, rows, cols) по номерам блоков
+        block_map = cls.__new__(cls)
+        block_map.width = picture.width
+        block_map.height = picture.height
+        block_map.codels = picture.codels
+        block_map.labels = labels
+        block_map.blocks = []
+        block_map.free = []
+        for key, size, bbox, rows, cols in blocks:
+            block = Block(len(block_map.blocks), COLORS[key], block_map)
+            block.size = size
+            block.bbox = bbox
+            block.rows = rows
+            block.cols = cols
+            block_map.blocks.append(block)
+        return block_map
+
+    def _fill(self, start: int, index: Optional[int] = None):
+        width = self.width
+        height = self.height
+        labels = self.labels
+        keys = self.codels
+        key = keys[start]
+        if index is None:
+            block = Block(len(self.blocks), COLORS[key], self)
+            self.blocks.append(block)
+        else:
+            block = Block(index, COLORS[key], self)
+            self.blocks[index] = block
+        index = block.index
+        rows = block.rows
+        cols = block.cols
+        min_x = min_y = width + height
+        max_x = max_y = -1
+        size = 0
+        labels[start] = index
+        stack = [start]
+        while stack:
+            p = stack.pop()
+            y, x = divmod(p, width)
+            size += 1
+            min_x = x if x < min_x else min_x
+            max_x = x if x > max_x else max_x
+            min_y = y if y < min_y else min_y
+            max_y = y if y > max_y else max_y
+            row = rows.get(y)
+            if row is None:
+                rows[y] = [x, x]
+            elif x < row[0]:
+                row[0] = x
+            elif x > row[1]:
+                row[1] = x
+            col = cols.get(x)
+            if col is None:
+                cols[x] = [y, y]
+            elif y < col[0]:
+                col[0] = y
+            elif y > col[1]:
+                col[1] = y
+            if x > 0 and labels[p - 1] == -1 and keys[p - 1] == key:
+                labels[p - 1] = index
+                stack.append(p - 1)
+            if x < width - 1 and labels[p + 1] == -1 and keys[p + 1] == key:
+                labels[p + 1] = index
+                stack.append(p + 1)
+            if y > 0 and labels[p - width] == -1 and keys[p - width] == key:
+                labels[p - width] = index
+                stack.append(p - width)
+            if (y < height - 1 and labels[p + width] == -1
+                    and keys[p + width] == key):
+                labels[p + width] = index
+                stack.append(p + width)
+        block.size = size
+        block.bbox = (min_x, min_y, max_x, max_y)
+
+    def neighbours(self, codel: int) -> Iterator[int]:
+        y, x = divmod(codel, self.width)
+        if x > 0:
+            yield codel - 1
+        if x < self.width - 1:
+            yield codel + 1
+        if y > 0:
+            yield codel - self.width
+        if y < self.height - 1:
+            yield codel + self.width
+
+    def touched(self, changed: Iterable[int]) -> Set[int]:
+        # блоки с измененными коделями и соседние с ними: у остальных
+        # не меняются ни форма, ни то, что вокруг
+        labels = self.labels
+        touched = set()
+        for codel in changed:
+            touched.add(labels[codel])
+            touched.update(labels[neighbour]
+                           for neighbour in self.neighbours(codel))
+        return touched
+
+    def update(self, picture: Picture, changed: Iterable[int]):
+        # changed - кодели, цвет которых в picture другой; заново
+        # размечаются только блоки с ними и блоки того же нового цвета
+        # рядом, с которыми они могут слиться
+        codels = picture.codels
+        labels = self.labels
+        dirty = set()
+        for codel in changed:
+            dirty.add(labels[codel])
+            dirty.update(labels[neighbour]
+                         for neighbour in self.neighbours(codel)
+                         if codels[neighbour] == codels[codel])
+        starts = []
+        for index in dirty:
+            for x, y in list(self.blocks[index]):
+                start = y * self.width + x
+                labels[start] = -1
+                starts.append(start)
+            # пустой блок остается на месте до нового владельца номера
+            self.blocks[index] = Block(index, self.blocks[index].color, self)
+        self.free.extend(sorted(dirty, reverse=True))
+        self.codels = codels
+        for start in starts:
+            if labels[start] == -1:
+                self._fill(start, self.free.pop() if self.free else None)
+
+    def block_id(self, x: int, y: int) -> int:
+        return self.labels[y * self.width + x]
+
+    def owns(self, codel: int, index: int) -> bool:
+        return self.labels[codel] == index
+
+    def block_at(self, x: int, y: int) -> Block:
+        return self.blocks[self.labels[y * self.width + x]]
+
+
+class LazyLabels(dict):
+    # номера блоков по коделям как у списка, но блок размечается при
+    # первом обращении к любому его коделю; в словаре только
+    # размеченные кодели
+    def __init__(self, block_map: 'LazyBlockMap', size: int):
+        super().__init__()
+        self.block_map = block_map
+        self.size = size
+        # во время разметки неразмеченный кодель - просто -1
+        self.filling = False
+
+    def __missing__(self, codel: int) -> int:
+        if self.filling:
+            return -1
+        if not 0 <= codel < self.size:
+            raise IndexError('кодель вне картинки')
+        self.block_map._fill(codel)
+        return dict.__getitem__(self, codel)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        # обход размечает всю картинку
+        return (self[codel] for codel in range(self.size))
+
+    def labeled(self) -> int:
+        return dict.__len__(self)
+
+
+class LazyBlockMap(BlockMap):
+    # разметка без обхода всей картинки: на огромной картинке программа
+    # обычно проходит только часть блоков
+    def __init__(self, picture: Picture):
+        self.width = picture.width
+        self.height = picture.height
+        self.codels = picture.codels
+        self.labels = LazyLabels(self, self.width * self.height)
+        self.blocks = []
+        self.free = []
+
+    def owns(self, codel: int, index: int) -> bool:
+        # неразмеченный кодель не принадлежит уже размеченному блоку;
+        # соседние блоки при этом не размечаются
+        return self.labels.get(codel) == index
+
+    def _fill(self, start: int, index: Optional[int] = None):
+        self.labels.filling = True
+        try:
+            super()._fill(start, index)
+        finally:
+            self.labels.filling = False
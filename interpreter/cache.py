@@ -0,0 +1,148 @@
+import hashlib
+import marshal
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from interpreter.blocks import BlockMap
+from interpreter.colors import PALETTE_INDEXES
+from interpreter.graph import Transition
+from interpreter.mapped import is_mapped
+from interpreter.picture import Picture
+from interpreter.program import Program
+
+MAGIC = b'PIETC'
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# модули, от которых зависят разбор картинки, разметка, переходы и
+# формат файла кэша
+SOURCES = ('interpreter.colors', 'interpreter.directions',
+           'interpreter.picture', 'interpreter.blocks', 'interpreter.graph',
+           'interpreter.program', __name__)
+
+
+def interpreter_version() -> str:
+    # хэш исходников вместо номера версии, который надо не забыть
+    # поменять руками: после любой правки старые записи не подходят
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        digest.update(Path(sys.modules[name].__file__).read_bytes())
+    return digest.hexdigest()
+
+
+INTERPRETER_VERSION = interpreter_version()
+
+
+def default_directory() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME')
+    return (Path(base) if base else Path.home() / '.cache') / 'piet'
+
+
+def dump_program(program: Program) -> bytes:
+    # marshal быстро загружается, но его формат зависит от версии питона,
+    # поэтому она входит в ключ
+    blocks = [(PALETTE_INDEXES[block.color.rgb], block.size, block.bbox,
+               block.rows, block.cols)
+              for block in program.blocks.blocks]
+    transitions = {state: tuple(transition) if transition is not None
+                   else None
+                   for state, transition in program.graph.transitions.items()}
+    return MAGIC + marshal.dumps((
+        program.picture.width, program.picture.height,
+        bytes(program.picture.codels),
+        array('i', program.blocks.labels).tobytes(), blocks,
+        transitions, sorted(program.leaders)))
+
+
+def load_program(data: bytes) -> Program:
+    if not data.startswith(MAGIC):
+        raise ValueError('неизвестный формат кэша')
+    (width, height, codels, labels, blocks,
+     transitions, leaders) = marshal.loads(data[len(MAGIC):])
+    picture = Picture(width, height, codels)
+    block_map = BlockMap.restore(picture, array('i', labels).tolist(),
+                                 blocks)
+    return Program(picture, block_map,
+                   {state: Transition(*transition)
+                    if transition is not None else None
+                    for state, transition in transitions.items()},
+                   set(leaders))
+
+
+class ProgramCache:
+    def __init__(self, directory: Optional[Path] = None,
+                 max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = Path(directory) if directory is not None \
+            else default_directory()
+        # наибольший суммарный размер файлов кэша в байтах
+        self.max_size = max_size
+
+    def key(self, content: bytes, codel_size: Optional[int]) -> str:
+        digest = hashlib.sha256(content)
+        digest.update(f'|{INTERPRETER_VERSION}|{codel_size}|'
+                      f'{sys.version_info[:2]}'.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f'{key}.piet'
+
+    def get(self, key: str) -> Optional[Program]:
+        path = self.path(key)
+        try:
+            program = load_program(path.read_bytes())
+        except (OSError, ValueError, EOFError, TypeError):
+            # нет в кэше или файл испорчен - тогда он будет перезаписан
+            return None
+        # время изменения - время последнего использования для вытеснения
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def put(self, key: str, program: Program):
+        data = dump_program(program)
+        if len(data) > self.max_size:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.path(key)
+            temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+            self.evict()
+        except OSError:
+            # без кэша программа все равно исполняется
+            pass
+
+    def evict(self):
+        files = []
+        for path in self.directory.glob('*.piet'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files, key=lambda file: file[0]):
+            if total <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def open_program(self, file_name: str,
+                     codel_size: Optional[int] = None) -> Program:
+        if is_mapped(file_name):
+            # такой файл и так читается без разбора, а хэш содержимого
+            # потребовал бы прочитать его целиком
+            return Program.open_program(file_name, codel_size)
+        key = self.key(Path(file_name).read_bytes(), codel_size)
+        program = self.get(key)
+        if program is None:
+            program = Program.open_program(file_name, codel_size)
+            self.put(key, program)
+        return program
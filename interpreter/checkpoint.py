@@ -0,0 +1,162 @@
+import hashlib
+import os
+import stat
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from interpreter.hooks import Hooks
+from interpreter.limits import Status
+from interpreter.picture import Picture
+from interpreter.trace import read_int, read_uint, write_int, write_uint
+
+MAGIC = b'PIETCKP2'
+DIGEST_SIZE = 32
+
+
+def program_digest(picture: Picture) -> bytes:
+    digest = hashlib.sha256(f'{picture.width}x{picture.height}|'.encode())
+    size = picture.width * picture.height
+    # кусками, чтобы не собирать в памяти картинку из mapped.py целиком
+    for start in range(0, size, 1 << 20):
+        digest.update(bytes(picture.codels[start:start + (1 << 20)]))
+    return digest.digest()
+
+
+@dataclass
+class Checkpoint:
+    # sha256 коделей картинки
+    program: bytes
+    # состояние между шагами: кодель, dp и cc
+    state: int
+    steps: int
+    # прочитано символов ввода и записано байт (в текстовый поток -
+    # символов) вывода
+    input_offset: int
+    output_offset: int
+    stack: List[int] = field(default_factory=list)
+    # размер файла вывода, к которому исполнение начало дописывать
+    # (>>), - смещение вывода считается от него
+    output_start: int = 0
+
+
+def dump_checkpoint(checkpoint: Checkpoint) -> bytes:
+    buffer = bytearray(MAGIC + checkpoint.program)
+    for value in (checkpoint.state, checkpoint.steps,
+                  checkpoint.input_offset, checkpoint.output_offset,
+                  checkpoint.output_start, len(checkpoint.stack)):
+        write_uint(buffer, value)
+    for value in checkpoint.stack:
+        write_int(buffer, value)
+    return bytes(buffer)
+
+
+def load_checkpoint(data: bytes) -> Checkpoint:
+    if not data.startswith(MAGIC) or \
+            len(data) < len(MAGIC) + DIGEST_SIZE:
+        raise ValueError('это не файл контрольной точки')
+    position = len(MAGIC) + DIGEST_SIZE
+    values = []
+    try:
+        for _ in range(6):
+            value, position = read_uint(data, position)
+            values.append(value)
+        stack = []
+        for _ in range(values[-1]):
+            value, position = read_int(data, position)
+            stack.append(value)
+    except IndexError:
+        raise ValueError('файл контрольной точки обрезан')
+    return Checkpoint(data[len(MAGIC):len(MAGIC) + DIGEST_SIZE],
+                      *values[:4], stack, values[4])
+
+
+def save_checkpoint(file_name: str, checkpoint: Checkpoint):
+    # атомарно: при падении во время записи остается прошлая точка
+    temp_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temp_name, 'wb') as stream:
+        stream.write(dump_checkpoint(checkpoint))
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temp_name, file_name)
+
+
+def open_checkpoint(file_name: str) -> Checkpoint:
+    with open(file_name, 'rb') as stream:
+        return load_checkpoint(stream.read())
+
+
+def output_position(stream) -> int:
+    # куда в обычный файл будет дописан вывод; у канала и терминала - 0
+    try:
+        stream.flush()
+        status = os.fstat(stream.fileno())
+    except (OSError, ValueError, AttributeError):
+        return 0
+    return status.st_size if stat.S_ISREG(status.st_mode) else 0
+
+
+def truncate_output(stream, offset: int):
+    # вывод после контрольной точки, записанный до падения, будет
+    # выведен снова - из обычного файла он убирается
+    try:
+        stream.flush()
+        descriptor = stream.fileno()
+        if not stat.S_ISREG(os.fstat(descriptor).st_mode) or \
+                os.fstat(descriptor).st_size <= offset:
+            return
+        os.ftruncate(descriptor, offset)
+        stream.seek(offset)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+
+class Checkpointer(Hooks):
+    # сохраняется только состояние между участками, отдельные шаги
+    # не нужны
+    every_step = False
+
+    def __init__(self, file_name: str, every: Optional[int] = None):
+        self.file_name = file_name
+        # через сколько шагов сохранять, None - только по запросу
+        self.every = every
+        self.steps = 0
+        self.next_save = every
+        # последнее состояние между шагами: на нем можно остановиться
+        self.state: Optional[int] = None
+        self.requested = False
+
+    def request(self, *args):
+        # можно вызывать из обработчика сигнала: сохранение будет
+        # после ближайшего шага
+        self.requested = True
+
+    def on_start(self, driver, state: int):
+        # при продолжении с контрольной точки счет шагов - с нее
+        self.state = state
+        self.steps = driver.resumed_steps
+        if self.every is not None:
+            self.next_save = self.steps + self.every
+
+    def on_step(self, driver, state: int, count: int):
+        self.steps += count
+        self.state = state
+        if self.requested or (self.next_save is not None
+                              and self.steps >= self.next_save):
+            self.save(driver)
+
+    def on_terminate(self, driver, status: Optional[Status]):
+        # остановленное ограничением исполнение можно продолжить, но
+        # только если оно остановлено между шагами: команда, прерванная
+        # ограничением вывода или переполнением, уже сняла значения со
+        # стэка, а участок мог выполниться наполовину - остается
+        # прошлая точка
+        if status is not None and status != Status.FINISHED \
+                and driver.between_steps:
+            self.save(driver)
+
+    def save(self, driver):
+        self.requested = False
+        if self.every is not None:
+            self.next_save = self.steps + self.every
+        save_checkpoint(self.file_name, driver.checkpoint(self.state,
+                                                          self.steps))
@@ -57,3 +57,14 @@ colors = {(255, 192, 192): (Lightness.LIGHT, Hue.RED),
           (192, 0, 192): (Lightness.DARK, Hue.MAGENTA),
           (255, 255, 255): (Lightness.NORMAL, Hue.WHITE),
           (0, 0, 0): (Lightness.NORMAL, Hue.BLACK)}
+
+# индекс цвета в палитре - то, что хранится в каждом коделе картинки
+PALETTE = list(colors.keys())
+COLORS = [Color(rgb) for rgb in PALETTE]
+WHITE_INDEX = PALETTE.index((255, 255, 255))
+BLACK_INDEX = PALETTE.index((0, 0, 0))
+PALETTE_INDEXES = {rgb: i for i, rgb in enumerate(PALETTE)}
+
+
+def color_index(rgb: Tuple[int, ...]) -> int:
+    return PALETTE_INDEXES.get(tuple(rgb[:3]), WHITE_INDEX)
@@ -1,20 +1,37 @@
-from typing import List
+from typing import List, Optional
 
+from interpreter.bigint import format_int, parse_int
 from interpreter.directions import Direction, CodelChooser
+from interpreter.limits import LimitExceeded, Status
+from interpreter.streams import InputReader
 
 
 class BaseCommand:
     name = 'no_action'
     description = 'эта команда ничего не делает'
-    arguments = None
+    # сколько верхних значений стэка команда снимает
+    arity = 0
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: 'Direction', cc: 'CodelChooser'):
         pass
 
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        # аргументы, с которыми команда будет исполнена, - только для
+        # пошагового режима, само исполнение их не запоминает
+        if len(stack) < self.arity or self.arity == 0:
+            return None
+        if self.arity == 1:
+            return stack[-1]
+        return stack[-1], stack[-2]
+
+    def show_value(self, value: int):
+        # значение ввода-вывода так, как его показывает пошаговый режим
+        return value
+
     def __repr__(self):
         return (f'\tназвание: {self.name},\n\tописание: '
-                f'{self.description},\n\tаргументы: {self.arguments}')
+                f'{self.description}')
 
 
 class Push(BaseCommand):
@@ -24,25 +41,29 @@ class Push(BaseCommand):
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
-        self.arguments = len_current_block
-        stack.append(self.arguments)
+        stack.append(len_current_block)
+
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        return len_current_block
 
 
 class Pop(BaseCommand):
     name = 'pop'
     description = 'убирает верхнее значение стэка'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         if len(stack) == 0:
             return
-        self.arguments = stack.pop()
+        stack.pop()
 
 
 class Add(BaseCommand):
     name = 'add'
     description = 'убирает два значения из стэка, складывает их, ' \
                   'кладет результат обратно в стэк'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -50,7 +71,6 @@ class Add(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (a, b)
         stack.append(a + b)
 
 
@@ -58,6 +78,7 @@ class Subtract(BaseCommand):
     name = 'subtract'
     description = 'убирает два значения из стэка, вычитает верхнее из ' \
                   'предыдущего, кладет результат обратно в стэк'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -65,7 +86,6 @@ class Subtract(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (a, b)
         stack.append(b - a)
 
 
@@ -73,6 +93,7 @@ class Multiply(BaseCommand):
     name = 'multiply'
     description = 'Убирает два значения из стэка, умножает их, кладет ' \
                   'результат обратно в стэк'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -80,7 +101,6 @@ class Multiply(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (a, b)
         stack.append(a * b)
 
 
@@ -88,6 +108,7 @@ class Divide(BaseCommand):
     name = 'divide'
     description = 'убирает два значения из стэка, делит нацело предыдущее ' \
                   'на верхнее, кладет результат обратно в стэк'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -95,7 +116,6 @@ class Divide(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (a, b)
         stack.append(b // a)
 
 
@@ -103,6 +123,7 @@ class Mod(BaseCommand):
     name = 'mod'
     description = 'убирает два значения из стэка, кладет остаток от ' \
                   'деления предыдущего на верхнее обратно в стэк'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -110,7 +131,6 @@ class Mod(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (a, b)
         stack.append(b % abs(a))
 
 
@@ -118,13 +138,13 @@ class Not(BaseCommand):
     name = 'not'
     description = 'заменяет верхнее значение стэка на 0, если оно было ' \
                   'равно 1, иначе на 1'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         if len(stack) == 0:
             return
         old_value = stack.pop()
-        self.arguments = old_value
         stack.append(1 if old_value == 0 else 0)
 
 
@@ -132,6 +152,7 @@ class Greater(BaseCommand):
     name = 'greater'
     description = 'убирает два значения из стэка, кладет в него 1, если ' \
                   'предыдущее значение было больше верхнего, иначе кладет 0'
+    arity = 2
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
@@ -139,50 +160,54 @@ class Greater(BaseCommand):
             return
         a = stack.pop()
         b = stack.pop()
-        self.arguments = (b, a)
         stack.append(1 if b > a else 0)
 
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        # сравниваются предыдущее и верхнее - в этом порядке и показываются
+        if len(stack) < 2:
+            return None
+        return stack[-2], stack[-1]
+
 
 class Pointer(BaseCommand):
     name = 'pointer'
     description = 'убирает значение(далее х) из стэка, меняет dp по часовой' \
                   ' стрелке abs(x) раз, если х > 0, иначе - против часовой'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         new_dp = dp
         if len(stack) != 0:
-            turn_count = stack.pop()
-            self.arguments = turn_count
-            for i in range(abs(turn_count)):
-                new_dp = new_dp.next(turn_count > 0)
+            # четыре поворота возвращают dp обратно, а против часовой
+            # k раз - то же, что по часовой -k % 4 раз
+            for i in range(stack.pop() % 4):
+                new_dp = new_dp.next()
         return new_dp
 
 
 class Switch(BaseCommand):
     name = 'switch'
     description = 'убирает значение(далее х) из стэка, меняет cc abs(x) раз'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         new_cc = cc
-        if len(stack) != 0:
-            turn_count = stack.pop()
-            self.arguments = turn_count
-            for i in range(abs(turn_count)):
-                new_cc = new_cc.next()
+        if len(stack) != 0 and stack.pop() % 2:
+            new_cc = new_cc.next()
         return new_cc
 
 
 class Duplicate(BaseCommand):
     name = 'duplicate'
     description = 'дублирует в стэк его верхнее значение'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         if len(stack) == 0:
             return
-        self.arguments = stack[-1]
         stack.append(stack[-1])
 
 
@@ -194,34 +219,47 @@ class Roll(BaseCommand):
                   '\n\t\t  берет depth последних элементов стэка и ' \
                   '\n\t\t  циклически сдвигает их с шагом count ' \
                   '\n\t\t  (count > 0 - вправо, count < 0 - влево)'
+    arity = 2
+
+    def __init__(self, max_stack: Optional[int] = None):
+        # ограничение размера стэка: при count % depth == 0 стэк почти
+        # удваивается за один шаг, и ждать периодической проверки нельзя
+        self.max_stack = max_stack
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: Direction, cc: CodelChooser):
         if len(stack) < 2 or stack[-2] < 0:
             return
+        if (self.max_stack is not None and stack[-2] > 1
+                and stack[-1] % stack[-2] == 0
+                and 2 * (len(stack) - 2) - stack[-2] > self.max_stack):
+            raise LimitExceeded(Status.STACK_LIMIT)
         count = stack.pop()
         depth = stack.pop()
-        self.arguments = (depth, count)
         if depth == 1:
             return
         count %= depth
+        if type(stack) is not list:
+            # у стэков из stacks.py сдвиг свой, без копирования
+            stack.roll(depth, count)
+            return
         index = -abs(count) + depth * (count < 0)
         stack[-depth:] = stack[index:] + stack[-depth:index]
 
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        if len(stack) < 2 or stack[-2] < 0:
+            return None
+        return stack[-2], stack[-1]
+
 
 class In(BaseCommand):
     def __init__(self, in_stream, error_stream):
         self.error_stream = error_stream
-        self.in_stream = in_stream
+        self.in_stream = in_stream if isinstance(in_stream, InputReader) \
+            else InputReader(in_stream)
 
-    def _read_value(self) -> List[str]:
-        chars = []
-        while True:
-            x = self.in_stream.read(1)
-            if x == '\n' or not x:
-                break
-            chars.append(x)
-        return chars
+    def _read_value(self) -> str:
+        return self.in_stream.read_line()
 
 
 class InInt(In):
@@ -231,10 +269,15 @@ class InInt(In):
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: 'Direction', cc: 'CodelChooser'):
-        chars = self._read_value()
+        number = self.read_int()
+        if number is not None:
+            stack.append(number)
+
+    def read_int(self) -> Optional[int]:
+        # None - в стэк ничего не кладется
+        chars = self.in_stream.read_number()
         if len(chars) == 0:
-            return
-        number = 0
+            return None
         k = 1
         sign = chars[0]
         if not sign.isdigit():
@@ -244,13 +287,15 @@ class InInt(In):
                 exit(1)
             chars = chars[1:]
         if len(chars) == 0:
-            return
-        for i in range(len(chars)):
-            if not chars[i].isdigit():
-                return
-            number += int(chars[i]) * 10 ** (len(chars) - (i + 1)) * k
-        self.arguments = number
-        stack.append(number)
+            return None
+        if not chars.isdecimal():
+            # до первой не цифры: тогда ничего не кладется, а цифру,
+            # которую не понимает int (например '²'), - ошибка
+            for char in chars:
+                if not char.isdigit():
+                    return None
+                int(char)
+        return parse_int(chars) * k
 
 
 class InChar(In):
@@ -264,12 +309,14 @@ class InChar(In):
             if len(chars) > 1:
                 return
             stack.append(ord(chars[0]))
-            self.arguments = chars[0]
         except TypeError:
             return
         except ValueError:
             return
 
+    def show_value(self, value: int):
+        return chr(value)
+
 
 class Out(BaseCommand):
     def __init__(self, out_stream, error_stream):
@@ -281,20 +328,21 @@ class OutInt(Out):
     name = 'out_int'
     description = 'убирает значение из стэка и выводит ' \
                   'его в указанный поток вывода'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: 'Direction', cc: 'CodelChooser'):
         if len(stack) == 0:
             return
         out_value = stack.pop()
-        self.arguments = out_value
-        self.out_stream.write(str(out_value))
+        self.out_stream.write(format_int(out_value))
 
 
 class OutChar(Out):
     name = 'out_char'
     description = 'убирает значение из стэка и выводит chr(значение) ' \
                   'в указанный поток вывода'
+    arity = 1
 
     def __call__(self, stack: List[int], len_current_block: int,
                  dp: 'Direction', cc: 'CodelChooser'):
@@ -305,4 +353,27 @@ class OutChar(Out):
         except ValueError:
             return
         self.out_stream.write(out_value)
-        self.arguments = out_value
+
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        if len(stack) == 0:
+            return None
+        return self.show_value(stack[-1])
+
+    def show_value(self, value: int):
+        # непечатаемое значение команда не выводит - показывается числом
+        try:
+            return chr(value)
+        except (ValueError, OverflowError):
+            return value
+
+
+# (сдвиг оттенка, сдвиг яркости) : команда
+COMMANDS = {(0, 0): BaseCommand, (0, 1): Push,
+            (0, 2): Pop, (1, 0): Add,
+            (1, 1): Subtract, (1, 2): Multiply,
+            (2, 0): Divide, (2, 1): Mod,
+            (2, 2): Not, (3, 0): Greater,
+            (3, 1): Pointer, (3, 2): Switch,
+            (4, 0): Duplicate, (4, 1): Roll,
+            (4, 2): InInt, (5, 0): InChar,
+            (5, 1): OutInt, (5, 2): OutChar}
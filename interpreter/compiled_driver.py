@@ -0,0 +1,249 @@
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Tuple)
+
+from interpreter.checkpoint import Checkpointer
+from interpreter.commands import COMMANDS, BaseCommand, Pointer, Switch
+from interpreter.graph import (Transition, DIRECTIONS, CODEL_CHOOSERS,
+                               DIRECTION_INDEXES, CODEL_CHOOSER_INDEXES,
+                               make_state)
+from interpreter.hooks import Hooks
+from interpreter.int64 import INT64_BOUNDS, Int64ConstantOperation
+from interpreter.limits import Limits, LimitExceeded
+from interpreter.optimizer import ConstantOperation, PushValues, Operation
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.profiler import Profiler
+from interpreter.program import Program
+from interpreter.trace import TraceRecorder
+from interpreter.streams import FlushPolicy
+
+# класс команды : (сдвиг оттенка, сдвиг яркости)
+COMMAND_KEYS = {command: key for key, command in COMMANDS.items()}
+
+
+class Chain(NamedTuple):
+    # (команда, размер блока) линейного участка
+    operations: Tuple[Tuple[BaseCommand, int], ...]
+    # переход с pointer или switch в конце участка
+    branch: Optional[Transition]
+    # состояние после участка или последнее состояние перед концом
+    state: int
+    terminated: bool
+    # число переходов участка вместе с ветвлением
+    steps: int
+
+
+class CompiledPietDriver(PietDriver):
+    def __init__(self, picture: Picture, step_by_step: bool,
+                 in_stream, out_stream, error_stream,
+                 limits: Optional[Limits] = None,
+                 optimize_chains: bool = True,
+                 program: Optional[Program] = None,
+                 flush_policy: Optional[FlushPolicy] = None,
+                 input_tokens: bool = False,
+                 stack_class: Callable[[], List[int]] = list,
+                 profiler: Optional[Profiler] = None,
+                 tracer: Optional[TraceRecorder] = None,
+                 checkpointer: Optional[Checkpointer] = None,
+                 hooks: Iterable[Hooks] = (),
+                 int64: Optional[str] = None,
+                 lazy: bool = False):
+        if step_by_step:
+            raise ValueError('пошаговый режим не поддерживается '
+                             'скомпилированным исполнением')
+        # готовую программу можно переиспользовать между запусками
+        if program is None:
+            program = Program(picture, lazy=lazy)
+        super().__init__(program.picture, False, in_stream, out_stream,
+                         error_stream, limits, program, flush_policy,
+                         input_tokens, stack_class, profiler, tracer,
+                         checkpointer, hooks, int64, program.lazy)
+        self.optimize_chains = optimize_chains
+        # один экземпляр каждой команды на весь запуск
+        self.command_instances = {key: self.create_command(command_class)
+                                  for key, command_class
+                                  in self.commands.items()}
+        self.graph = self.program.graph
+        self.chains: Dict[int, Chain] = {}
+
+    def change_picture(self, picture: Picture):
+        super().change_picture(picture)
+        self.program = Program(picture, lazy=self.lazy)
+        self.blocks = self.program.blocks
+        self.graph = self.program.graph
+        self.chains = {}
+
+    def update_picture(self, picture: Picture,
+                       codels: Optional[Iterable[int]] = None):
+        super().update_picture(picture, codels)
+        self.graph = self.program.graph
+        self.chains = {}
+
+    def collect_profile(self):
+        self.profiler.collect(self.program)
+
+    def create_operation(self, operation: Operation) -> BaseCommand:
+        if operation.command is PushValues:
+            return PushValues(operation.argument)
+        if operation.command is ConstantOperation:
+            if self.int64 is not None:
+                return Int64ConstantOperation(*operation.argument)
+            return ConstantOperation(*operation.argument)
+        # план строится по общим командам, исполняются - свои
+        return self.create_command(
+            self.commands[COMMAND_KEYS[operation.command]])
+
+    def compile_chain(self, state: int) -> Chain:
+        plan = self.program.plan(
+            state, INT64_BOUNDS if self.int64 is not None else None)
+        chain = Chain(
+            tuple((self.create_operation(operation),
+                   operation.argument if isinstance(operation.argument, int)
+                   else 0)
+                  for operation in plan.operations),
+            plan.branch, plan.state, plan.terminated, plan.steps)
+        self.chains[state] = chain
+        return chain
+
+    def run_steps(self):
+        # рост чисел внутри участка не проверить, поэтому при
+        # ограничении на их размер - только по одному переходу,
+        # наблюдателям отдельных шагов и команд - тоже
+        if self.optimize_chains and not self.hooks.every_step and (
+                self.governor is None
+                or self.governor.limits.int_bits is None):
+            self.run_chains()
+        else:
+            self.run_transitions()
+
+    def run_branch(self, transition: Transition) -> int:
+        command = self.command_instances[transition.command]
+        self.current_command = command
+        if isinstance(command, Pointer):
+            dp = command(self.stack, transition.block_size,
+                         DIRECTIONS[transition.dp],
+                         CODEL_CHOOSERS[transition.cc])
+            return make_state(transition.codel, DIRECTION_INDEXES[dp],
+                              transition.cc)
+        cc = command(self.stack, transition.block_size,
+                     DIRECTIONS[transition.dp],
+                     CODEL_CHOOSERS[transition.cc])
+        return make_state(transition.codel, transition.dp,
+                          CODEL_CHOOSER_INDEXES[cc])
+
+    def run_chains(self):
+        chains = self.chains
+        stack = self.stack
+        governor = self.governor
+        profiled = self.profiler.chains if self.profiler is not None \
+            else None
+        # наблюдатели здесь узнают только о концах участков
+        on_step = self.hooks.step
+        state = self.get_state()
+        while True:
+            chain = chains.get(state)
+            if chain is None:
+                chain = self.compile_chain(state)
+            if governor is not None:
+                if not governor.fits(chain.steps):
+                    # остаток до ограничения на число шагов - по одному
+                    self.set_state(state)
+                    self.run_transitions()
+                    return
+                try:
+                    governor.before_steps(stack, chain.steps)
+                except LimitExceeded:
+                    self.set_state(state)
+                    raise
+            if profiled is not None:
+                profiled[state] += 1
+            for command, block_size in chain.operations:
+                command(stack, block_size, None, None)
+            if chain.branch is not None:
+                state = self.run_branch(chain.branch)
+            elif chain.terminated:
+                state = chain.state
+                break
+            else:
+                state = chain.state
+            for hook in on_step:
+                hook(self, state, chain.steps)
+        self.set_state(state)
+
+    def run_transitions(self):
+        if self.hooks or self.profiler is not None:
+            self.run_observed_transitions()
+        else:
+            self.run_plain_transitions()
+
+    def run_plain_transitions(self):
+        transitions = self.graph.transitions
+        resolve = self.graph.resolve
+        commands = self.command_instances
+        stack = self.stack
+        governor = self.governor
+        state = self.get_state()
+        while True:
+            transition = transitions.get(state, False)
+            if transition is False:
+                transition = resolve(state)
+            if transition is None:
+                break
+            if governor is not None:
+                try:
+                    governor.before_steps(stack)
+                except LimitExceeded:
+                    self.set_state(state)
+                    raise
+            state = transition.state
+            if transition.command is not None:
+                command = commands[transition.command]
+                if isinstance(command, (Pointer, Switch)):
+                    state = self.run_branch(transition)
+                else:
+                    self.current_command = command
+                    command(stack, transition.block_size,
+                            DIRECTIONS[transition.dp],
+                            CODEL_CHOOSERS[transition.cc])
+        self.set_state(state)
+
+    def run_observed_transitions(self):
+        transitions = self.graph.transitions
+        resolve = self.graph.resolve
+        commands = self.command_instances
+        stack = self.stack
+        governor = self.governor
+        profiled = self.profiler.states if self.profiler is not None \
+            else None
+        on_command = self.hooks.command
+        on_step = self.hooks.step
+        state = self.get_state()
+        while True:
+            transition = transitions.get(state, False)
+            if transition is False:
+                transition = resolve(state)
+            if transition is None:
+                break
+            if governor is not None:
+                try:
+                    governor.before_steps(stack)
+                except LimitExceeded:
+                    self.set_state(state)
+                    raise
+            if profiled is not None:
+                profiled[state] += 1
+            state = transition.state
+            if transition.command is not None:
+                command = commands[transition.command]
+                for hook in on_command:
+                    hook(self, command, transition.block_size)
+                if isinstance(command, (Pointer, Switch)):
+                    state = self.run_branch(transition)
+                else:
+                    self.current_command = command
+                    command(stack, transition.block_size,
+                            DIRECTIONS[transition.dp],
+                            CODEL_CHOOSERS[transition.cc])
+            for hook in on_step:
+                hook(self, state, 1)
+        self.set_state(state)
@@ -0,0 +1,200 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from interpreter.blocks import BlockMap
+from interpreter.colors import BLACK_INDEX, WHITE_INDEX
+from interpreter.commands import COMMANDS, Pointer, Switch
+from interpreter.directions import Direction, CodelChooser
+
+# порядок по часовой стрелке: Direction.next() - это индекс + 1
+DIRECTIONS = (Direction.RIGHT, Direction.DOWN,
+              Direction.LEFT, Direction.UP)
+CODEL_CHOOSERS = (CodelChooser.LEFT, CodelChooser.RIGHT)
+DIRECTION_INDEXES = {dp: i for i, dp in enumerate(DIRECTIONS)}
+CODEL_CHOOSER_INDEXES = {cc: i for i, cc in enumerate(CODEL_CHOOSERS)}
+
+
+def make_state(codel: int, dp: int, cc: int) -> int:
+    return codel * 8 + dp * 2 + cc
+
+
+def split_state(state: int) -> Tuple[int, int, int]:
+    codel, rest = divmod(state, 8)
+    return codel, rest // 2, rest % 2
+
+
+class Transition(NamedTuple):
+    # (сдвиг оттенка, сдвиг яркости) команды или None при проходе
+    # через белую область
+    command: Optional[Tuple[int, int]]
+    block_size: int
+    # кодель, в который попадает указатель, и dp, cc после попыток выхода
+    codel: int
+    dp: int
+    cc: int
+    state: int
+
+
+class TransitionGraph:
+    def __init__(self, block_map: BlockMap):
+        self.blocks = block_map
+        self.width = block_map.width
+        self.height = block_map.height
+        self.codels = block_map.codels
+        # состояние : переход, None - программа завершается
+        self.transitions: Dict[int, Optional[Transition]] = {}
+
+    def is_correct_codel(self, x: int, y: int) -> bool:
+        return (0 <= x < self.width and 0 <= y < self.height
+                and self.codels[y * self.width + x] != BLACK_INDEX)
+
+    def _walk_by_cc(self, x: int, y: int,
+                    dp: int, cc: int) -> Tuple[int, int]:
+        if self.codels[y * self.width + x] == BLACK_INDEX:
+            # из черного блока программа может только начинаться; по
+            # черным коделям, как и в PietDriver, не ходят
+            return x, y
+        # угловое направление: cc LEFT - против часовой от dp, RIGHT - по
+        return self.blocks.block_at(x, y).uttermost_by_cc(
+            x, y, DIRECTIONS[(dp + (1 if cc else 3)) % 4])
+
+    def _slide(self, x: int, y: int, dp: int) -> Optional[Tuple[int, int]]:
+        k = 0
+        while True:
+            dx, dy = DIRECTIONS[dp].value
+            if not self.is_correct_codel(x + dx, y + dy):
+                k += 1
+                dp = (dp + 1) % 4
+                if k == 4:
+                    return None
+            else:
+                x += dx
+                y += dy
+                if self.codels[y * self.width + x] != WHITE_INDEX:
+                    return y * self.width + x, dp
+
+    def resolve(self, state: int) -> Optional[Transition]:
+        if state in self.transitions:
+            return self.transitions[state]
+        codel, dp, cc = split_state(state)
+        y, x = divmod(codel, self.width)
+        k = 0
+        while k < 8:
+            block = self.blocks.block_at(x, y)
+            x, y = block.uttermost_by_dp(x, y, DIRECTIONS[dp])
+            x, y = self._walk_by_cc(x, y, dp, cc)
+            dx, dy = DIRECTIONS[dp].value
+            if self.is_correct_codel(x + dx, y + dy):
+                break
+            if k % 2 == 0:
+                cc = 1 - cc
+            else:
+                dp = (dp + 1) % 4
+            k += 1
+        else:
+            self.transitions[state] = None
+            return None
+        next_block = self.blocks.block_at(x + dx, y + dy)
+        if self.codels[(y + dy) * self.width + x + dx] == WHITE_INDEX:
+            slide = self._slide(x + dx, y + dy, dp)
+            if slide is None:
+                transition = None
+            else:
+                target, dp = slide
+                transition = Transition(None, 0, target, dp, cc,
+                                        make_state(target, dp, cc))
+        else:
+            target = (y + dy) * self.width + x + dx
+            hue_shift = (6 - block.color.hue + next_block.color.hue) % 6
+            lightness_shift = (3 - block.color.lightness
+                               + next_block.color.lightness) % 3
+            transition = Transition((hue_shift, lightness_shift),
+                                    len(block), target, dp, cc,
+                                    make_state(target, dp, cc))
+        self.transitions[state] = transition
+        return transition
+
+    def invalidate(self, touched: Set[int]) -> List[int]:
+        # убирает переходы, зависящие от блоков touched, до их новой
+        # разметки: переход зависит от блока, из которого выходит,
+        # соседних с ним коделей, а проход через белое - еще и от белого
+        # блока, по которому он идет; по концу программы не узнать,
+        # был ли проход, но таких состояний мало - они убираются всегда
+        labels = self.blocks.labels
+        width = self.width
+        removed = []
+        for state, transition in self.transitions.items():
+            if transition is None or labels[state >> 3] in touched:
+                removed.append(state)
+            elif transition.command is None:
+                dx, dy = DIRECTIONS[transition.dp].value
+                if labels[transition.codel - dy * width - dx] in touched:
+                    removed.append(state)
+        for state in removed:
+            del self.transitions[state]
+        return removed
+
+    def successors(self, state: int) -> List[int]:
+        transition = self.resolve(state)
+        if transition is None:
+            return []
+        # после pointer и switch dp и cc известны только во время
+        # исполнения, поэтому достижимы все их варианты
+        command = COMMANDS.get(transition.command)
+        if command is Pointer:
+            return [make_state(transition.codel, dp, transition.cc)
+                    for dp in range(4)]
+        if command is Switch:
+            return [make_state(transition.codel, transition.dp, cc)
+                    for cc in range(2)]
+        return [transition.state]
+
+    def build(self, start: int) -> 'TransitionGraph':
+        queue: List[int] = [start]
+        while queue:
+            state = queue.pop()
+            if state not in self.transitions:
+                queue.extend(self.successors(state))
+        return self
+
+    def reachable(self, start: int) -> Set[int]:
+        visited = {start}
+        queue = [start]
+        while queue:
+            for successor in self.successors(queue.pop()):
+                if successor not in visited:
+                    visited.add(successor)
+                    queue.append(successor)
+        return visited
+
+    def find_leaders(self, start: int) -> Set[int]:
+        # линейный участок начинается там, куда можно попасть
+        # не только из предыдущего состояния
+        predecessors: Dict[int, int] = {}
+        leaders = {start}
+        for state in list(self.transitions):
+            successors = self.successors(state)
+            if len(successors) > 1:
+                leaders.update(successors)
+            for successor in successors:
+                predecessors[successor] = predecessors.get(successor, 0) + 1
+        leaders.update(state for state, count in predecessors.items()
+                       if count > 1)
+        return leaders
+
+    def chain(self, state: int,
+              leaders: Set[int]) -> Tuple[List[Transition], bool]:
+        # переходы линейного участка до pointer/switch, до следующего
+        # начала участка или до конца программы (тогда True)
+        transitions: List[Transition] = []
+        visited = {state}
+        while True:
+            transition = self.resolve(state)
+            if transition is None:
+                return transitions, True
+            transitions.append(transition)
+            if COMMANDS.get(transition.command) in (Pointer, Switch):
+                return transitions, False
+            state = transition.state
+            if state in leaders or state in visited:
+                return transitions, False
+            visited.add(state)
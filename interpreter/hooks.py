@@ -0,0 +1,78 @@
+from typing import Callable, Iterable, List, Optional
+
+from interpreter.limits import Status
+
+
+class Hooks:
+    # наблюдатель за исполнением: драйвер вызывает только те методы,
+    # которые переопределены в подклассе
+    # False - on_step можно вызвать один раз после нескольких шагов
+    # (участков скомпилированного драйвера), count - их число
+    every_step = True
+
+    def on_start(self, driver, state: int):
+        pass
+
+    def on_step(self, driver, state: int, count: int):
+        pass
+
+    # перед исполнением команды, стэк еще не изменен
+    def on_command(self, driver, command, block_size: int):
+        pass
+
+    # после ввода или вывода: value - положенное в стэк или снятое
+    # с него значение
+    def on_io(self, driver, command, value: int):
+        pass
+
+    # status - None, если исполнение прервано ошибкой
+    def on_terminate(self, driver, status: Optional[Status]):
+        pass
+
+
+def _overridden(hooks: Iterable[Hooks], name: str) -> List[Callable]:
+    base = getattr(Hooks, name)
+    return [getattr(hook, name) for hook in hooks
+            if getattr(type(hook), name) is not base]
+
+
+class HookSet:
+    # методы наблюдателей, разобранные по событиям при создании драйвера
+    def __init__(self, hooks: Iterable[Hooks]):
+        self.hooks = [hook for hook in hooks if hook is not None]
+        self.start = _overridden(self.hooks, 'on_start')
+        self.step = _overridden(self.hooks, 'on_step')
+        self.command = _overridden(self.hooks, 'on_command')
+        self.io = _overridden(self.hooks, 'on_io')
+        self.terminate = _overridden(self.hooks, 'on_terminate')
+        # нужен ли обход по одному шагу
+        self.every_step = bool(self.command) or any(
+            hook.__self__.every_step for hook in self.step)
+
+    def __bool__(self) -> bool:
+        return bool(self.start or self.step or self.command or self.io
+                    or self.terminate)
+
+
+class ObservedCommand:
+    # команда ввода-вывода, о значениях которой узнают наблюдатели
+    def __init__(self, command, driver, callbacks: List[Callable]):
+        self.command = command
+        self.driver = driver
+        self.callbacks = callbacks
+
+    def __call__(self, stack, len_current_block, dp, cc):
+        size = len(stack)
+        top = stack[-1] if size else None
+        result = self.command(stack, len_current_block, dp, cc)
+        if len(stack) != size:
+            value = stack[-1] if len(stack) > size else top
+            for callback in self.callbacks:
+                callback(self.driver, self.command, value)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.command, name)
+
+    def __repr__(self):
+        return repr(self.command)
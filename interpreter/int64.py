@@ -0,0 +1,133 @@
+from array import array
+from typing import Dict, List, Tuple
+
+from interpreter.commands import (COMMANDS, Add, Divide, InInt, Multiply,
+                                  Subtract)
+from interpreter.directions import CodelChooser, Direction
+from interpreter.limits import LimitExceeded, Status
+from interpreter.optimizer import ConstantOperation
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+INT64_BOUNDS: Tuple[int, int] = (INT64_MIN, INT64_MAX)
+MASK = (1 << 64) - 1
+
+
+def wrap(value: int) -> int:
+    # по модулю 2 ** 64, как в C
+    return ((value - INT64_MIN) & MASK) + INT64_MIN
+
+
+def trap(value: int) -> int:
+    if INT64_MIN <= value <= INT64_MAX:
+        return value
+    raise LimitExceeded(Status.INT_LIMIT)
+
+
+# поведение при переполнении : функция, приводящая результат к 64 битам
+OVERFLOWS = {'wrap': wrap, 'trap': trap}
+
+
+class Int64Stack(array):
+    # значения лежат подряд по 8 байт, а не ссылками на объекты int;
+    # fit приводит результат команды к 64 битам или останавливает
+    # исполнение
+    def __new__(cls, values=(), overflow: str = 'wrap'):
+        return super().__new__(cls, 'q', values)
+
+    def __init__(self, values=(), overflow: str = 'wrap'):
+        self.overflow = overflow
+        self.fit = OVERFLOWS[overflow]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, array)):
+            return len(other) == len(self) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def roll(self, depth: int, count: int):
+        # как у списка, вместе с порчей стэка при count == 0
+        index = -abs(count) + depth * (count < 0)
+        self[-depth:] = self[index:] + self[-depth:index]
+
+
+# команды, результат которых может не поместиться в 64 бита: сначала
+# считается результат, и только потом меняется стэк, чтобы при
+# остановке в нем оставались аргументы; fit вызывается только при
+# переполнении - вызов функции на каждой команде дорог
+
+
+class Int64Add(Add):
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        if len(stack) < 2:
+            return
+        value = stack[-2] + stack[-1]
+        if not INT64_MIN <= value <= INT64_MAX:
+            value = stack.fit(value)
+        stack.pop()
+        stack[-1] = value
+
+
+class Int64Subtract(Subtract):
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        if len(stack) < 2:
+            return
+        value = stack[-2] - stack[-1]
+        if not INT64_MIN <= value <= INT64_MAX:
+            value = stack.fit(value)
+        stack.pop()
+        stack[-1] = value
+
+
+class Int64Multiply(Multiply):
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        if len(stack) < 2:
+            return
+        value = stack[-2] * stack[-1]
+        if not INT64_MIN <= value <= INT64_MAX:
+            value = stack.fit(value)
+        stack.pop()
+        stack[-1] = value
+
+
+class Int64Divide(Divide):
+    # деление с округлением вниз, как у python: переполняется только
+    # INT64_MIN // -1
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        if len(stack) < 2:
+            return
+        value = stack[-2] // stack[-1]
+        if not INT64_MIN <= value <= INT64_MAX:
+            value = stack.fit(value)
+        stack.pop()
+        stack[-1] = value
+
+
+class Int64InInt(InInt):
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        number = self.read_int()
+        if number is not None:
+            stack.append(stack.fit(number))
+
+
+class Int64ConstantOperation(ConstantOperation):
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        if len(stack) == 0:
+            stack.append(self.value)
+        else:
+            stack[-1] = stack.fit(self.operation(self.value, stack[-1]))
+
+
+# mod, greater, not и остальные не выходят за 64 бита
+INT64_COMMANDS: Dict[Tuple[int, int], type] = dict(COMMANDS)
+INT64_COMMANDS.update({(1, 0): Int64Add, (1, 1): Int64Subtract,
+                       (1, 2): Int64Multiply, (2, 0): Int64Divide,
+                       (4, 2): Int64InInt})
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import List, Optional
+
+
+class Status(Enum):
+    FINISHED = 'finished'
+    STEP_LIMIT = 'step_limit'
+    TIME_LIMIT = 'time_limit'
+    STACK_LIMIT = 'stack_limit'
+    INT_LIMIT = 'int_limit'
+    OUTPUT_LIMIT = 'output_limit'
+
+
+class LimitExceeded(Exception):
+    def __init__(self, status: Status, between_steps: bool = False):
+        super().__init__(status.value)
+        self.status = status
+        # True - остановка до шага, False - посреди команды, которая
+        # уже могла изменить стэк
+        self.between_steps = between_steps
+
+
+@dataclass
+class Limits:
+    # None - ограничения нет
+    steps: Optional[int] = None
+    seconds: Optional[float] = None
+    stack: Optional[int] = None
+    # суммарный размер чисел в стэке в битах
+    int_bits: Optional[int] = None
+    output: Optional[int] = None
+    # время, размер стэка и сумма битов проверяются раз в столько шагов,
+    # верхнее значение стэка - на каждом шаге
+    check_every: int = 1024
+
+
+class Governor:
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        self.steps = 0
+        self.deadline: Optional[float] = None
+        self.next_check = 0
+        self.periodic = (limits.seconds is not None
+                         or limits.stack is not None
+                         or limits.int_bits is not None)
+
+    def start(self):
+        if self.limits.seconds is not None:
+            self.deadline = monotonic() + self.limits.seconds
+        self.next_check = self.steps
+
+    def check(self, stack: List[int]):
+        limits = self.limits
+        if limits.steps is not None and self.steps >= limits.steps:
+            raise LimitExceeded(Status.STEP_LIMIT, True)
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise LimitExceeded(Status.TIME_LIMIT, True)
+        if limits.stack is not None and len(stack) > limits.stack:
+            raise LimitExceeded(Status.STACK_LIMIT, True)
+        if (limits.int_bits is not None
+                and sum(value.bit_length() for value in stack)
+                > limits.int_bits):
+            raise LimitExceeded(Status.INT_LIMIT, True)
+        next_check = self.steps + limits.check_every \
+            if self.periodic else float('inf')
+        if limits.steps is not None:
+            next_check = min(next_check, limits.steps)
+        self.next_check = next_check
+
+    def before_steps(self, stack: List[int], count: int = 1):
+        # вызывается перед каждым шагом (или линейным участком из count
+        # шагов) и бросает LimitExceeded, если выполнять его уже нельзя
+        if self.steps >= self.next_check:
+            self.check(stack)
+        # размер стэка - O(1), его можно проверять на каждом шаге
+        if self.limits.stack is not None and \
+                len(stack) > self.limits.stack:
+            raise LimitExceeded(Status.STACK_LIMIT, True)
+        if (self.limits.int_bits is not None and stack
+                and stack[-1].bit_length() > self.limits.int_bits):
+            raise LimitExceeded(Status.INT_LIMIT, True)
+        self.steps += count
+
+    def fits(self, count: int) -> bool:
+        return (self.limits.steps is None
+                or self.steps + count <= self.limits.steps)
+
+
+class LimitedOutput:
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.written = 0
+
+    def write(self, value):
+        size = len(value.encode('utf-8')) \
+            if isinstance(value, str) else len(value)
+        if self.written + size > self.limit:
+            raise LimitExceeded(Status.OUTPUT_LIMIT)
+        self.written += size
+        return self.stream.write(value)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
@@ -0,0 +1,251 @@
+import mmap
+import re
+import struct
+from collections import OrderedDict
+from math import gcd
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from interpreter.colors import PALETTE, WHITE_INDEX
+from interpreter.picture import Picture, _RGB_CODES, _channel_code
+
+# файл разобранных коделей: заголовок и индексы цветов в палитре
+GRID_MAGIC = b'PIETGRD1'
+GRID_HEADER = struct.Struct('<II')
+# сколько коделей классифицируется за раз и сколько кусков хранится
+TILE_CODELS = 1 << 16
+MAX_TILES = 256
+# размер коделя определяется по стольким первым пикселям картинки
+PREFIX_CODELS = TILE_CODELS
+
+# код канала, сдвинутый под свое место в коде цвета r * 16 + g * 4 + b:
+# суммы не больше 63, поэтому складывать можно целые строки байт
+_SHIFTED_CODES = [bytes(_channel_code(value) << shift
+                        for value in range(256)) for shift in (4, 2, 0)]
+# неизвестный индекс в файле коделей - белый, как и неизвестный цвет
+_GRID_CODES = bytes(value if value < len(PALETTE) else WHITE_INDEX
+                    for value in range(256))
+_PNM_TOKEN = re.compile(rb'(?:\s|#[^\n]*\n)*(\S+)')
+
+
+class MappedCodels:
+    # индексы цветов картинки в несжатом файле через mmap: кодели
+    # классифицируются кусками по несколько строк при первом обращении,
+    # в памяти остаются последние MAX_TILES кусков
+    def __init__(self, data, offset: int, width: int, height: int,
+                 channels: int, codel_size: int = 1,
+                 max_tiles: int = MAX_TILES, verify: bool = False):
+        self.data = data
+        self.offset = offset
+        self.channels = channels
+        self.codel_size = codel_size
+        # размер коделя определен по началу картинки: каждый кусок при
+        # разборе проверяется, что он сложен из таких квадратов
+        self.verify = verify
+        self.row_size = width * channels
+        # размер в коделях
+        self.width = width // codel_size
+        self.height = height // codel_size
+        self.tile_rows = max(TILE_CODELS // max(self.width, 1), 1)
+        self.tile_size = self.tile_rows * self.width
+        self.max_tiles = max_tiles
+        self.tiles: Dict[int, bytes] = OrderedDict()
+
+    def __len__(self):
+        return self.width * self.height
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return bytes(self[i] for i in range(start, stop, step))
+            return self._range(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('кодель вне картинки')
+        tile, position = divmod(index, self.tile_size)
+        return self.tile(tile)[position]
+
+    def __bytes__(self):
+        return self._range(0, len(self))
+
+    def _range(self, start: int, stop: int) -> bytes:
+        parts: List[bytes] = []
+        while start < stop:
+            tile, position = divmod(start, self.tile_size)
+            part = self.tile(tile)[position:position + stop - start]
+            parts.append(part)
+            start += len(part)
+        return b''.join(parts)
+
+    def tile(self, index: int) -> bytes:
+        tiles = self.tiles
+        tile = tiles.get(index)
+        if tile is not None:
+            tiles.move_to_end(index)
+            return tile
+        tile = self._classify(index)
+        tiles[index] = tile
+        if len(tiles) > self.max_tiles:
+            tiles.popitem(last=False)
+        return tile
+
+    def _classify(self, index: int) -> bytes:
+        first = index * self.tile_rows
+        rows = range(first, min(first + self.tile_rows, self.height))
+        size = self.codel_size
+        # левый верхний пиксель каждого коделя
+        codels = self._classify_pixels([row * size for row in rows], size)
+        if self.verify and size > 1:
+            width = self.width
+            for number, row in enumerate(rows):
+                first_row = codels[number * width:(number + 1) * width]
+                pixels = self._classify_pixels(
+                    range(row * size, (row + 1) * size), 1)
+                for y in range(size):
+                    line = pixels[y * width * size:(y + 1) * width * size]
+                    if any(line[k::size] != first_row for k in range(size)):
+                        raise ValueError(
+                            f'картинка сложена не из коделей {size}x{size}, '
+                            f'как ее начало: задайте --codel-size')
+        return codels
+
+    def _classify_pixels(self, pixel_rows: Iterable[int],
+                         step: int) -> bytes:
+        # каждый step-й пиксель строк pixel_rows, по каналам
+        step *= self.channels
+        channels = []
+        for channel in range(self.channels if self.channels < 4 else 3):
+            parts = []
+            for row in pixel_rows:
+                start = self.offset + row * self.row_size + channel
+                parts.append(self.data[start:start + self.row_size:step])
+            channels.append(b''.join(parts))
+        if self.channels == 1:
+            return channels[0].translate(_GRID_CODES)
+        size = len(channels[0])
+        codes = sum(int.from_bytes(values.translate(table), 'little')
+                    for values, table in zip(channels, _SHIFTED_CODES))
+        return codes.to_bytes(size, 'little').translate(_RGB_CODES)
+
+
+def _read_pnm_header(data) -> Tuple[int, int, int, int]:
+    # P6: ширина, высота, наибольшее значение канала и один пробел
+    head = bytes(data[:1024])
+    values = []
+    position = 2
+    for _ in range(3):
+        match = _PNM_TOKEN.match(head, position)
+        if match is None:
+            raise ValueError('испорчен заголовок PPM')
+        try:
+            values.append(int(match.group(1)))
+        except ValueError:
+            raise ValueError('испорчен заголовок PPM')
+        position = match.end()
+    width, height, maxval = values
+    if maxval != 255:
+        raise ValueError('поддерживаются только PPM по 8 бит на канал')
+    return width, height, 3, position + 1
+
+
+def _read_pam_header(data) -> Tuple[int, int, int, int]:
+    end = data.find(b'ENDHDR\n', 0, 4096)
+    if end == -1:
+        raise ValueError('испорчен заголовок PAM')
+    fields = {}
+    for line in bytes(data[3:end]).split(b'\n'):
+        key, _, value = line.partition(b' ')
+        if key and not key.startswith(b'#'):
+            fields[key] = value.strip()
+    try:
+        width = int(fields[b'WIDTH'])
+        height = int(fields[b'HEIGHT'])
+        depth = int(fields[b'DEPTH'])
+        maxval = int(fields[b'MAXVAL'])
+    except (KeyError, ValueError):
+        raise ValueError('испорчен заголовок PAM')
+    if depth not in (3, 4) or maxval != 255:
+        raise ValueError('поддерживаются только PAM RGB и RGB_ALPHA '
+                         'по 8 бит на канал')
+    return width, height, depth, end + len('ENDHDR\n')
+
+
+def _read_header(data) -> Tuple[int, int, int, int]:
+    # (ширина, высота, байт на пиксель, начало данных)
+    if data[:len(GRID_MAGIC)] == GRID_MAGIC:
+        width, height = GRID_HEADER.unpack_from(data, len(GRID_MAGIC))
+        return width, height, 1, len(GRID_MAGIC) + GRID_HEADER.size
+    if data[:2] == b'P7':
+        return _read_pam_header(data)
+    return _read_pnm_header(data)
+
+
+def is_mapped(file_name: str) -> bool:
+    try:
+        with open(file_name, 'rb') as stream:
+            head = stream.read(4096)
+    except OSError:
+        return False
+    if head.startswith(GRID_MAGIC):
+        return True
+    if head[:2] not in (b'P6', b'P7'):
+        return False
+    # остальные PPM и PAM (не 8 бит на канал, без цвета) читает PIL
+    try:
+        _read_header(head)
+    except ValueError:
+        return False
+    return True
+
+
+def open_mapped(file_name: str,
+                codel_size: Optional[int] = None) -> Picture:
+    with open(file_name, 'rb') as stream:
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    width, height, channels, offset = _read_header(data)
+    if width < 1 or height < 1 or \
+            len(data) < offset + width * height * channels:
+        raise ValueError('файл картинки обрезан')
+    codels = MappedCodels(data, offset, width, height, channels)
+    picture = Picture(width, height, codels)
+    if codel_size is None and channels == 1:
+        # в файле коделей картинка уже разобрана
+        codel_size = 1
+    verify = False
+    if codel_size is None:
+        codel_size, verify = detect_prefix_codel_size(picture)
+    if codel_size == 1:
+        return picture
+    if width % codel_size or height % codel_size:
+        raise ValueError(f'размер картинки {width}x{height} '
+                         f'не кратен размеру коделя {codel_size}')
+    codels = MappedCodels(data, offset, width, height, channels, codel_size,
+                          verify=verify)
+    return Picture(codels.width, codels.height, codels)
+
+
+def detect_prefix_codel_size(picture: Picture) -> Tuple[int, bool]:
+    # как Picture.detect_codel_size, но по первым PREFIX_CODELS пикселям,
+    # а не по всему файлу; второе значение - картинка проверена не вся
+    width, height = picture.width, picture.height
+    rows = min(max(PREFIX_CODELS // width, 1), height)
+    common = gcd(width, height)
+    for codel_size in range(common, 1, -1):
+        if common % codel_size:
+            continue
+        prefix_rows = max(rows - rows % codel_size, codel_size)
+        prefix = Picture(width, prefix_rows, picture.codels)
+        if prefix.is_codel_size(codel_size):
+            return codel_size, prefix_rows < height
+    return 1, False
+
+
+def save_grid(picture: Picture, file_name: str):
+    # разобранные кодели для быстрой загрузки через open_mapped
+    with open(file_name, 'wb') as stream:
+        stream.write(GRID_MAGIC
+                     + GRID_HEADER.pack(picture.width, picture.height))
+        size = picture.width * picture.height
+        for start in range(0, size, TILE_CODELS):
+            stream.write(bytes(picture.codels[start:start + TILE_CODELS]))
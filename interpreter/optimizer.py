@@ -0,0 +1,141 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from interpreter.commands import (BaseCommand, Push, Pop, Add, Subtract,
+                                  Multiply, Divide, Mod, Not, Greater,
+                                  Duplicate, Roll)
+from interpreter.directions import Direction, CodelChooser
+from interpreter.graph import Transition
+
+# команда над двумя значениями : результат по (верхнее, предыдущее)
+BINARY_OPERATIONS: Dict[type, Callable[[int, int], int]] = {
+    Add: lambda a, b: a + b,
+    Subtract: lambda a, b: b - a,
+    Multiply: lambda a, b: a * b,
+    Divide: lambda a, b: b // a,
+    Mod: lambda a, b: b % abs(a),
+    Greater: lambda a, b: 1 if b > a else 0,
+}
+
+
+class PushValues(BaseCommand):
+    name = 'push_values'
+    description = 'кладет в стэк заранее вычисленные значения'
+
+    def __init__(self, values: Tuple[int, ...]):
+        self.values = values
+
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        stack.extend(self.values)
+
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        return self.values
+
+
+class ConstantOperation(BaseCommand):
+    description = 'push константы и следующая за ним команда ' \
+                  'над двумя значениями'
+
+    def __init__(self, command_class: type, value: int):
+        self.name = f'{command_class.name}_constant'
+        self.operation = BINARY_OPERATIONS[command_class]
+        self.value = value
+
+    def __call__(self, stack: List[int], len_current_block: int,
+                 dp: Direction, cc: CodelChooser):
+        # без второго значения команда ничего не делает,
+        # в стэке остается только константа
+        if len(stack) == 0:
+            stack.append(self.value)
+        else:
+            stack.append(self.operation(self.value, stack.pop()))
+
+    def peek_arguments(self, stack: List[int], len_current_block: int):
+        return (self.value, stack[-1]) if stack else self.value
+
+
+class Operation(NamedTuple):
+    # класс команды из commands.py, PushValues или ConstantOperation
+    command: type
+    # размер блока, значения для PushValues,
+    # (класс команды, константа) для ConstantOperation
+    argument: Any
+
+
+def _fold_roll(values: List[int]) -> bool:
+    depth, count = values[-2], values[-1]
+    if depth < 0:
+        return True
+    if depth == 1:
+        del values[-2:]
+        return True
+    # при count % depth == 0 Roll затрагивает весь стэк, а не только
+    # известные значения, а при depth == 0 - падает
+    if depth == 0 or depth > len(values) - 2 or count % depth == 0:
+        return False
+    del values[-2:]
+    count %= depth
+    values[-depth:] = values[-count:] + values[-depth:-count]
+    return True
+
+
+def optimize(transitions: List[Transition],
+             commands: Dict[Tuple[int, int], type],
+             bounds: Optional[Tuple[int, int]] = None) -> List[Operation]:
+    # bounds - пределы чисел: результат вне их не сворачивается, чтобы
+    # переполнение случилось во время исполнения
+    operations: List[Operation] = []
+    # значения, которые гарантированно лежат на вершине стэка,
+    # но еще не положены туда
+    values: List[int] = []
+
+    def flush():
+        if values:
+            operations.append(Operation(PushValues, tuple(values)))
+            values.clear()
+
+    for transition in transitions:
+        if transition.command is None:
+            continue
+        command = commands[transition.command]
+        if command is BaseCommand:
+            continue
+        if command is Push:
+            values.append(transition.block_size)
+        elif command is Pop and values:
+            values.pop()
+        elif command is Duplicate and values:
+            values.append(values[-1])
+        elif command is Not and values:
+            values[-1] = 1 if values[-1] == 0 else 0
+        elif command is Roll and len(values) >= 2 and _fold_roll(values):
+            continue
+        elif command in BINARY_OPERATIONS and values:
+            if command in (Divide, Mod) and values[-1] == 0:
+                # деление на ноль должно произойти во время исполнения
+                flush()
+                operations.append(Operation(command, transition.block_size))
+            elif len(values) >= 2:
+                result = BINARY_OPERATIONS[command](values[-1], values[-2])
+                if bounds is not None and \
+                        not bounds[0] <= result <= bounds[1]:
+                    flush()
+                    operations.append(Operation(command,
+                                                transition.block_size))
+                else:
+                    del values[-2:]
+                    values.append(result)
+            else:
+                value = values.pop()
+                flush()
+                operations.append(Operation(ConstantOperation,
+                                            (command, value)))
+        elif (command is Pop and operations
+              and operations[-1].command is Duplicate):
+            # duplicate и pop ничего не меняют и при пустом стэке
+            operations.pop()
+        else:
+            flush()
+            operations.append(Operation(command, transition.block_size))
+    flush()
+    return operations
@@ -1,8 +1,13 @@
-from PIL import Image
-from typing import List, Tuple
+from math import gcd
+from typing import (Dict, Iterable, Iterator, List, Optional, Tuple,
+                    TYPE_CHECKING)
 from dataclasses import dataclass
 
-from interpreter.colors import Color
+from interpreter.colors import (Color, COLORS, PALETTE, WHITE_INDEX,
+                                color_index)
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 @dataclass(frozen=True, repr=True)
@@ -12,24 +17,139 @@ class Pixel:
     color: Color
 
 
+def _channel_code(value: int) -> int:
+    # в палитре Piet каналы принимают только значения 0, 192 и 255
+    return {0: 0, 192: 1, 255: 2}.get(value, 3)
+
+
+_CHANNEL_CODES = [_channel_code(value) for value in range(256)] * 3
+# код цвета r * 16 + g * 4 + b : индекс в палитре
+_RGB_CODES = bytearray([WHITE_INDEX] * 256)
+for _index, (_r, _g, _b) in enumerate(PALETTE):
+    _RGB_CODES[_channel_code(_r) * 16 + _channel_code(_g) * 4
+               + _channel_code(_b)] = _index
+
+
 class Picture:
-    def __init__(self, picture: List[List[Pixel]]):
-        self.picture = picture
-        self.width: int = len(self.picture)
-        self.height: int = len(self.picture[0])
+    def __init__(self, width: int, height: int, codels: bytes):
+        self.width = width
+        self.height = height
+        # индексы цветов в палитре по строкам: codels[y * width + x],
+        # bytes или MappedCodels из mapped.py
+        self.codels = codels
+
+    @property
+    def mapped(self) -> bool:
+        # кодели читаются из файла по мере надобности (mapped.py)
+        return not isinstance(self.codels, (bytes, bytearray))
 
     def __getitem__(self, cord) -> Pixel:
-        return self.picture[cord[0]][cord[1]]
+        x, y = cord
+        return Pixel(x, y, COLORS[self.codels[y * self.width + x]])
 
-    def __iter__(self) -> Tuple[int, int, Pixel]:
+    def __iter__(self) -> Iterator[Tuple[int, int, Pixel]]:
         for i in range(self.width):
             for j in range(self.height):
                 yield j, i, self[j, i]
 
+    def region(self, x: int, y: int, width: int, height: int) -> List[int]:
+        # номера коделей прямоугольника, обрезанного по краям картинки
+        left, top = max(x, 0), max(y, 0)
+        right = min(x + width, self.width)
+        bottom = min(y + height, self.height)
+        return [row * self.width + column for row in range(top, bottom)
+                for column in range(left, right)]
+
+    def diff(self, other: 'Picture',
+             codels: Optional[Iterable[int]] = None) -> List[int]:
+        # номера коделей, цвет которых в other другой: среди codels или,
+        # если они не заданы, по всей картинке построчно
+        if (other.width, other.height) != (self.width, self.height):
+            raise ValueError('у картинок разные размеры')
+        old, new = self.codels, other.codels
+        if codels is not None:
+            return sorted({codel for codel in codels if old[codel]
+                           != new[codel]})
+        changed = []
+        width = self.width
+        for y in range(self.height):
+            start = y * width
+            if old[start:start + width] != new[start:start + width]:
+                changed.extend(codel for codel in range(start, start + width)
+                               if old[codel] != new[codel])
+        return changed
+
+    def paint(self, colors: Dict[int, int]) -> 'Picture':
+        # копия с другими цветами коделей: номер коделя : индекс цвета
+        codels = bytearray(self.codels)
+        for codel, color in colors.items():
+            codels[codel] = color
+        return Picture(self.width, self.height, bytes(codels))
+
+    def _row(self, y: int) -> bytes:
+        return self.codels[y * self.width:(y + 1) * self.width]
+
+    def is_codel_size(self, codel_size: int) -> bool:
+        if self.width % codel_size or self.height % codel_size:
+            return False
+        for y in range(0, self.height, codel_size):
+            row = self._row(y)
+            first = row[::codel_size]
+            if any(row[k::codel_size] != first
+                   for k in range(1, codel_size)):
+                return False
+            if any(self._row(y + k) != row for k in range(1, codel_size)):
+                return False
+        return True
+
+    def detect_codel_size(self) -> int:
+        # наибольший общий делитель длин всех одноцветных отрезков -
+        # наибольший размер квадрата, из которых сложена картинка
+        common = gcd(self.width, self.height)
+        for codel_size in range(common, 1, -1):
+            if common % codel_size == 0 and self.is_codel_size(codel_size):
+                return codel_size
+        return 1
+
+    def downsample(self, codel_size: int) -> 'Picture':
+        if codel_size == 1:
+            return self
+        if self.width % codel_size or self.height % codel_size:
+            raise ValueError(f'размер картинки {self.width}x{self.height} '
+                             f'не кратен размеру коделя {codel_size}')
+        codels = b''.join(self._row(y)[::codel_size]
+                          for y in range(0, self.height, codel_size))
+        return Picture(self.width // codel_size,
+                       self.height // codel_size, codels)
+
+    @staticmethod
+    def _classify_palette(pic: 'Image.Image') -> bytes:
+        palette = pic.getpalette() or []
+        table = bytearray([WHITE_INDEX] * 256)
+        for i in range(len(palette) // 3):
+            table[i] = color_index(palette[i * 3:i * 3 + 3])
+        return pic.tobytes().translate(table)
+
+    @staticmethod
+    def _classify_rgb(pic: 'Image.Image') -> bytes:
+        codes = (pic.point(_CHANNEL_CODES)
+                 .convert('L', matrix=(16, 4, 1, 0)))
+        return codes.tobytes().translate(_RGB_CODES)
+
     @classmethod
-    def open_picture(cls, file_name: str):
+    def open_picture(cls, file_name: str, codel_size: Optional[int] = None):
+        # несжатые картинки читаются через mmap по мере надобности
+        from interpreter.mapped import is_mapped, open_mapped
+        if is_mapped(file_name):
+            return open_mapped(file_name, codel_size)
+        # PIL нужен только для разбора картинки, которой нет в кэше
+        from PIL import Image
         with Image.open(file_name) as pic:
-            rows = [[Pixel(i, j, Color(pic.getpixel((i, j))))
-                     for j in range(pic.size[1])]
-                    for i in range(pic.size[0])]
-        return cls(rows)
+            if pic.mode == 'P':
+                codels = cls._classify_palette(pic)
+            else:
+                codels = cls._classify_rgb(pic.convert('RGB'))
+            picture = cls(pic.size[0], pic.size[1], codels)
+        if codel_size is None:
+            codel_size = picture.detect_codel_size()
+        return picture.downsample(codel_size)
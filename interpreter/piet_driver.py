@@ -1,29 +1,52 @@
-from typing import Set, List, Tuple
+from functools import partial
+from typing import Callable, Iterable, List, Optional
 
-from interpreter.colors import Hue
+from interpreter.blocks import Block, BlockMap, LazyBlockMap
+from interpreter.colors import Hue, WHITE_INDEX
 from interpreter.picture import Picture, Pixel
 from interpreter.directions import Direction, CodelChooser
-from interpreter.commands import (BaseCommand, Push, Pop, Duplicate,
-                                  InChar, InInt, OutInt, Pointer,
-                                  OutChar, Switch, Roll, Not,
-                                  Greater, Add, Subtract, Multiply,
-                                  Mod, Divide)
+from interpreter.checkpoint import Checkpoint, Checkpointer, program_digest
+from interpreter.graph import (CODEL_CHOOSERS, CODEL_CHOOSER_INDEXES,
+                               DIRECTIONS, DIRECTION_INDEXES, make_state,
+                               split_state)
+from interpreter.limits import (Governor, Limits, LimitExceeded,
+                                LimitedOutput, Status)
+from interpreter.commands import (COMMANDS, BaseCommand, In, Out,
+                                  Pointer, Roll, Switch)
+from interpreter.hooks import Hooks, HookSet, ObservedCommand
+from interpreter.int64 import INT64_COMMANDS, Int64Stack
+from interpreter.profiler import Profiler, WHITE
+from interpreter.program import Program
+from interpreter.trace import TraceRecorder
+from interpreter.streams import BufferedOutput, FlushPolicy, InputReader
 
 
-class StepByStepExecutor:
+class StepByStepExecutor(Hooks):
     def __init__(self, driver: 'PietDriver'):
         self.driver = driver
+        # аргументы последней команды: снятые со стэка значения
+        # или значение ввода-вывода
+        self.arguments = None
+
+    def on_command(self, driver, command, block_size: int):
+        self.arguments = command.peek_arguments(driver.stack, block_size)
+
+    def on_io(self, driver, command, value: int):
+        self.arguments = command.show_value(value)
+
+    def on_step(self, driver, state: int, count: int):
+        self.show_current_step()
+        self.continue_execution()
 
     def continue_execution(self):
         self.driver.error_stream.write('Для продолжения нажмите enter\n')
-        while True:
-            char = self.driver.in_stream.read(1)
-            if char == '\n':
-                break
+        # тот же буфер, что у команд ввода: данные программы не теряются
+        self.driver.in_stream.read_line()
 
     def show_current_step(self):
         self.driver.error_stream.write(f'текущая команда'
-                                       f':\n{self.driver.current_command}\n'
+                                       f':\n{self.driver.current_command}'
+                                       f',\n\tаргументы: {self.arguments}\n'
                                        f'стэк: {self.driver.stack}\n'
                                        f'текущий пиксель'
                                        f': {self.driver.current_pixel}\n')
@@ -31,75 +54,131 @@ class StepByStepExecutor:
 
 class PietDriver:
     def __init__(self, picture: Picture, step_by_step: bool,
-                 in_stream, out_stream, error_stream):
-        # (сдвиг оттенка, сдвиг яркости) : команда
-        self.commands = {(0, 0): BaseCommand, (0, 1): Push,
-                         (0, 2): Pop, (1, 0): Add,
-                         (1, 1): Subtract, (1, 2): Multiply,
-                         (2, 0): Divide, (2, 1): Mod,
-                         (2, 2): Not, (3, 0): Greater,
-                         (3, 1): Pointer, (3, 2): Switch,
-                         (4, 0): Duplicate, (4, 1): Roll,
-                         (4, 2): InInt, (5, 0): InChar,
-                         (5, 1): OutInt, (5, 2): OutChar}
-        self.picture: Picture = picture
+                 in_stream, out_stream, error_stream,
+                 limits: Optional[Limits] = None,
+                 program: Optional[Program] = None,
+                 flush_policy: Optional[FlushPolicy] = None,
+                 input_tokens: bool = False,
+                 stack_class: Callable[[], List[int]] = list,
+                 profiler: Optional[Profiler] = None,
+                 tracer: Optional[TraceRecorder] = None,
+                 checkpointer: Optional[Checkpointer] = None,
+                 hooks: Iterable[Hooks] = (),
+                 int64: Optional[str] = None,
+                 lazy: bool = False):
+        # int64 - 'wrap' или 'trap': числа в 64 битах с переполнением
+        # по модулю или остановкой с INT_LIMIT
+        self.int64 = int64
+        # блоки размечаются, только когда до них доходит исполнение;
+        # огромную картинку из mapped.py - всегда
+        self.lazy = lazy or (program.picture if program is not None
+                             else picture).mapped
+        self.commands = dict(COMMANDS if int64 is None else INT64_COMMANDS)
+        # готовая программа избавляет от разметки картинки
+        self.program = program
+        self.picture: Picture = picture if program is None \
+            else program.picture
         self.step_by_step = StepByStepExecutor(self) if step_by_step else None
         self.error_stream = error_stream
-        self.in_stream = in_stream
-        self.out_stream = out_stream
+        # в пошаговом режиме вывод виден сразу после команды
+        if flush_policy is None:
+            flush_policy = FlushPolicy(0) if step_by_step else FlushPolicy()
+        self.output = BufferedOutput(out_stream, flush_policy)
+        # перед чтением вывод сбрасывается, чтобы приглашение к вводу
+        # было видно до того, как программа начнет ждать
+        self.in_stream = InputReader(in_stream, input_tokens,
+                                     self.output.flush)
+        self.out_stream = self.output
         self.dp: Direction = Direction.RIGHT
         self.cc: CodelChooser = CodelChooser.LEFT
-        self.stack: List[int] = []
+        # list, стэк из stacks.py с быстрым roll или массив 64-битных чисел
+        self.new_stack: Callable[[], List[int]] = stack_class \
+            if int64 is None else partial(Int64Stack, overflow=int64)
+        self.stack: List[int] = self.new_stack()
         self.current_command = BaseCommand()
         self.current_pixel: Pixel = self.picture[0, 0]
-        self.current_block: Set[Tuple[int, int]] = set()
+        self.blocks = self.label_picture()
+        self.current_block: Block = self.blocks.block_at(0, 0)
+        self.governor = Governor(limits) if limits is not None else None
+        self.status: Optional[Status] = None
+        # False - исполнение остановлено посреди команды
+        self.between_steps = True
+        self.profiler = profiler
+        if profiler is not None:
+            # время ввода-вывода - обращения к самим потокам, а не команды:
+            # иначе на каждую команду внутри участка уходит два замера
+            self.output.stream = profiler.timed(self.output.stream)
+            self.in_stream.stream = profiler.timed(self.in_stream.stream)
+        self.tracer = tracer
+        self.checkpointer = checkpointer
+        # шаги до контрольной точки, с которой продолжено исполнение
+        self.resumed_steps = 0
+        # с какого места файла вывода пишет это исполнение
+        self.output_start = 0
+        self.digest: Optional[bytes] = None
+        # трасса, контрольные точки и пошаговый режим - тоже наблюдатели;
+        # без наблюдателей шаги идут отдельным циклом без проверок
+        self.hooks = HookSet([*hooks, tracer, checkpointer,
+                              self.step_by_step])
+        if limits is not None and limits.output is not None:
+            self.out_stream = LimitedOutput(self.output, limits.output)
+
+    def label_picture(self) -> BlockMap:
+        if self.program is not None:
+            return self.program.blocks
+        if self.lazy or self.picture.mapped:
+            return LazyBlockMap(self.picture)
+        return BlockMap(self.picture)
 
     def change_picture(self, picture: Picture):
+        self.program = None
+        self.picture = picture
+        self.blocks = self.label_picture()
+
+    def update_picture(self, picture: Picture,
+                       codels: Optional[Iterable[int]] = None):
+        # picture - та же картинка после правки, codels - кодели, которые
+        # могли измениться (например, Picture.region), None - любые;
+        # размечаются заново только затронутые блоки и переходы, и
+        # исполнение можно продолжить с того же места
+        if (picture.width, picture.height) != (self.picture.width,
+                                               self.picture.height):
+            self.change_picture(picture)
+            return
+        changed = self.picture.diff(picture, codels)
+        if self.program is not None:
+            self.program.update(picture, changed)
+        else:
+            self.blocks.update(picture, changed)
         self.picture = picture
+        self.digest = None
+        self.current_pixel = picture[self.current_pixel.x,
+                                     self.current_pixel.y]
+        self.set_current_block()
+
+    def restart(self):
+        # исполнение с начала на уже размеченной картинке
+        self.current_pixel = self.picture[0, 0]
+        self.dp = Direction.RIGHT
+        self.cc = CodelChooser.LEFT
+        self.set_current_block()
+        self.stack = self.new_stack()
+        self.status = None
+        self.between_steps = True
+        self.resumed_steps = 0
+        if self.governor is not None:
+            self.governor.steps = 0
 
     def set_current_block(self):
-        self.current_block.clear()
-        visited: Set[(int, int)] = set()
-        stack: List[Pixel] = [self.current_pixel]
-        while len(stack) != 0:
-            current_pixel = stack.pop()
-            visited.add((current_pixel.x, current_pixel.y))
-            for dx in range(-1, 2):
-                for dy in range(-1, 2):
-                    if dx != 0 and dy != 0:
-                        continue
-                    x = current_pixel.x + dx
-                    y = current_pixel.y + dy
-                    if (x >= self.picture.width or x < 0
-                            or y >= self.picture.height or y < 0):
-                        continue
-                    pixel = self.picture[x, y]
-                    if ((x, y) in visited
-                            or pixel.color != self.current_pixel.color):
-                        continue
-                    stack.append(pixel)
-        self.current_block = visited
+        self.current_block = self.blocks.block_at(self.current_pixel.x,
+                                                  self.current_pixel.y)
 
     def find_uttermost_pixel_by_dp(self):
-        if self.dp.value[0] + self.dp.value[1] == 1:
-            changing_cord = 'x' if self.dp.value[0] == 1 else 'y'
-            const_cord = 'y' if self.dp.value[0] == 1 else 'x'
-            edge = -1
-            compare_func = int.__lt__
-        else:
-            changing_cord = 'x' if self.dp.value[0] == -1 else 'y'
-            const_cord = 'y' if self.dp.value[0] == -1 else 'x'
-            edge = self.picture.width + self.picture.height
-            compare_func = int.__gt__
-        for x, y in self.current_block:
-            pixel = self.picture[x, y]
-            if compare_func(getattr(pixel, changing_cord), edge):
-                continue
-            if (getattr(pixel, const_cord)
-                    != getattr(self.current_pixel, const_cord)):
-                continue
-            edge = getattr(pixel, changing_cord)
-            self.current_pixel = pixel
+        # самый дальний по dp кодель блока в той же строке (столбце)
+        x, y = self.current_block.uttermost_by_dp(self.current_pixel.x,
+                                                  self.current_pixel.y,
+                                                  self.dp)
+        self.current_pixel = self.picture[x, y]
 
     def get_corner_pixel_direction(self) -> Direction:
         if self.dp == Direction.LEFT:
@@ -115,56 +194,61 @@ class PietDriver:
             if self.cc == CodelChooser.LEFT else Direction.LEFT
 
     def find_uttermost_pixel_by_cc(self):
-        corner_direction: Direction = self.get_corner_pixel_direction()
-        while True:
-            x = self.current_pixel.x + corner_direction.value[0]
-            y = self.current_pixel.y + corner_direction.value[1]
-            if not (self.is_correct_coords(x, y)
-                    and self.picture[x, y].color
-                    == self.current_pixel.color):
-                break
-            self.current_pixel = self.picture[x, y]
+        if self.current_block.color.hue == Hue.BLACK:
+            # из черного блока программа может только начинаться; по
+            # черным коделям не ходят
+            return
+        x, y = self.current_block.uttermost_by_cc(
+            self.current_pixel.x, self.current_pixel.y,
+            self.get_corner_pixel_direction())
+        self.current_pixel = self.picture[x, y]
 
     def is_correct_coords(self, x: int, y: int) -> bool:
         return (0 <= x < self.picture.width
                 and 0 <= y < self.picture.height
                 and self.picture[x, y].color.hue != Hue.BLACK)
 
-    def set_current_command(self, hue_shift: int, lightness_shift: int):
-        if (self.current_command is InInt
-                or self.current_command is InChar):
-            self.current_command = self.commands[hue_shift, lightness_shift](
-                self.in_stream, self.error_stream)
-        elif (self.current_command is OutInt
-              or self.current_command is OutChar):
-            self.current_command = self.commands[hue_shift, lightness_shift](
-                self.out_stream, self.error_stream)
+    def create_command(self, command_class) -> BaseCommand:
+        if issubclass(command_class, In):
+            command = command_class(self.in_stream, self.error_stream)
+        elif issubclass(command_class, Out):
+            command = command_class(self.out_stream, self.error_stream)
+        elif issubclass(command_class, Roll) and self.governor is not None:
+            return command_class(self.governor.limits.stack)
         else:
-            self.current_command = self.commands[hue_shift, lightness_shift]()
+            return command_class()
+        if self.hooks.io:
+            command = ObservedCommand(command, self, self.hooks.io)
+        return command
 
-    def go_to_next_block(self, next_x: int, next_y: int) -> bool:
-        next_pixel = self.picture[next_x, next_y]
-        if next_pixel.color.rgb == (255, 255, 255):
-            k = 0
-            while True:
-                x = next_pixel.x + self.dp.value[0]
-                y = next_pixel.y + self.dp.value[1]
-                if not self.is_correct_coords(x, y):
-                    k += 1
-                    self.dp = self.dp.next()
-                    if k == 4:
-                        return False
-                else:
-                    next_pixel = self.picture[x, y]
-                    if next_pixel.color.rgb != (255, 255, 255):
-                        self.current_pixel = next_pixel
-                        return True
+    def set_current_command(self, hue_shift: int, lightness_shift: int):
+        self.current_command = self.create_command(
+            self.commands[hue_shift, lightness_shift])
+
+    def pass_white(self, next_pixel: Pixel) -> bool:
+        k = 0
+        while True:
+            x = next_pixel.x + self.dp.value[0]
+            y = next_pixel.y + self.dp.value[1]
+            if not self.is_correct_coords(x, y):
+                k += 1
+                self.dp = self.dp.next()
+                if k == 4:
+                    return False
+            else:
+                next_pixel = self.picture[x, y]
+                if next_pixel.color.rgb != (255, 255, 255):
+                    self.current_pixel = next_pixel
+                    return True
+
+    def choose_command(self, next_pixel: Pixel):
         hue_shift = (6 - self.current_pixel.color.hue
                      + next_pixel.color.hue) % 6
         lightness_shift = (3 - self.current_pixel.color.lightness
                            + next_pixel.color.lightness) % 3
-        self.current_command = self.commands[hue_shift, lightness_shift]
         self.set_current_command(hue_shift, lightness_shift)
+
+    def run_current_command(self, next_pixel: Pixel):
         if isinstance(self.current_command, Switch):
             self.cc = self.current_command(self.stack,
                                            len(self.current_block),
@@ -177,9 +261,138 @@ class PietDriver:
             self.current_command(self.stack, len(self.current_block),
                                  self.dp, self.cc)
         self.current_pixel = next_pixel
+
+    def go_to_next_block(self, next_x: int, next_y: int) -> bool:
+        next_pixel = self.picture[next_x, next_y]
+        if next_pixel.color.rgb == (255, 255, 255):
+            return self.pass_white(next_pixel)
+        self.choose_command(next_pixel)
+        self.run_current_command(next_pixel)
+        return True
+
+    def observed_go_to_next_block(self, next_x: int, next_y: int) -> bool:
+        next_pixel = self.picture[next_x, next_y]
+        if next_pixel.color.rgb == (255, 255, 255):
+            return self.pass_white(next_pixel)
+        self.choose_command(next_pixel)
+        for on_command in self.hooks.command:
+            on_command(self, self.current_command, len(self.current_block))
+        self.run_current_command(next_pixel)
         return True
 
-    def process_picture(self):
+    def process_picture(self) -> Status:
+        if self.governor is not None:
+            self.governor.start()
+        if self.profiler is not None:
+            self.profiler.start()
+        for on_start in self.hooks.start:
+            on_start(self, self.get_state())
+        try:
+            self.run_steps()
+        except LimitExceeded as error:
+            self.status = error.status
+            self.between_steps = error.between_steps
+        else:
+            self.status = Status.FINISHED
+        finally:
+            self.output.flush()
+            if self.profiler is not None:
+                self.profiler.stop()
+                self.collect_profile()
+            for on_terminate in self.hooks.terminate:
+                on_terminate(self, self.status)
+        return self.status
+
+    def get_state(self) -> int:
+        return make_state(
+            self.current_pixel.y * self.picture.width + self.current_pixel.x,
+            DIRECTION_INDEXES[self.dp], CODEL_CHOOSER_INDEXES[self.cc])
+
+    def set_state(self, state: int):
+        codel, dp, cc = split_state(state)
+        y, x = divmod(codel, self.picture.width)
+        self.current_pixel = self.picture[x, y]
+        self.dp = DIRECTIONS[dp]
+        self.cc = CODEL_CHOOSERS[cc]
+        self.set_current_block()
+
+    def program_digest(self) -> bytes:
+        if self.digest is None:
+            self.digest = program_digest(self.picture)
+        return self.digest
+
+    def checkpoint(self, state: int, steps: int) -> Checkpoint:
+        # смещение вывода - с учетом всего, что было в буфере
+        self.output.flush()
+        return Checkpoint(self.program_digest(), state, steps,
+                          self.in_stream.consumed, self.output.written,
+                          list(self.stack), self.output_start)
+
+    def restore(self, checkpoint: Checkpoint):
+        if checkpoint.program != self.program_digest():
+            raise ValueError('контрольная точка сохранена для другой '
+                             'картинки')
+        self.set_state(checkpoint.state)
+        try:
+            self.stack.extend(checkpoint.stack)
+        except OverflowError:
+            raise ValueError('числа контрольной точки не помещаются '
+                             'в 64 бита')
+        self.in_stream.skip(checkpoint.input_offset)
+        self.output.written = checkpoint.output_offset
+        self.output_start = checkpoint.output_start
+        self.resumed_steps = checkpoint.steps
+        if self.governor is not None:
+            self.governor.steps = checkpoint.steps
+
+    def collect_profile(self):
+        pass
+
+    def profile_step(self, x: int, y: int):
+        # current_block - еще блок, из которого вышли
+        command = WHITE \
+            if self.picture.codels[y * self.picture.width + x] == WHITE_INDEX \
+            else self.current_command.name
+        self.profiler.count_step(
+            self.current_block.index,
+            self.blocks.block_id(self.current_pixel.x, self.current_pixel.y),
+            command)
+
+    def run_steps(self):
+        if self.hooks or self.profiler is not None:
+            self.run_observed_steps()
+        else:
+            self.run_plain_steps()
+
+    def run_plain_steps(self):
+        governor = self.governor
+        k = 0
+        while k < 8:
+            self.set_current_block()
+            self.find_uttermost_pixel_by_dp()
+            self.find_uttermost_pixel_by_cc()
+            x = self.current_pixel.x + self.dp.value[0]
+            y = self.current_pixel.y + self.dp.value[1]
+            if not self.is_correct_coords(x, y):
+                if k % 2 == 0:
+                    self.cc = self.cc.next()
+                else:
+                    self.dp = self.dp.next()
+                k += 1
+            else:
+                k = 0
+                if governor is not None:
+                    governor.before_steps(self.stack)
+                if not self.go_to_next_block(x, y):
+                    if governor is not None:
+                        # неудачный проход через белое - не шаг
+                        governor.steps -= 1
+                    break
+
+    def run_observed_steps(self):
+        # тот же обход, но с профилем и наблюдателями
+        governor = self.governor
+        on_step = self.hooks.step
         k = 0
         while k < 8:
             self.set_current_block()
@@ -195,9 +408,15 @@ class PietDriver:
                 k += 1
             else:
                 k = 0
-                do_next_iteration = self.go_to_next_block(x, y)
-                if do_next_iteration and self.step_by_step:
-                    self.step_by_step.show_current_step()
-                    self.step_by_step.continue_execution()
-                if not do_next_iteration:
+                if governor is not None:
+                    governor.before_steps(self.stack)
+                if not self.observed_go_to_next_block(x, y):
+                    if governor is not None:
+                        governor.steps -= 1
                     break
+                if self.profiler is not None:
+                    self.profile_step(x, y)
+                if on_step:
+                    state = self.get_state()
+                    for hook in on_step:
+                        hook(self, state, 1)
@@ -0,0 +1,192 @@
+import math
+from collections import Counter
+from time import perf_counter
+from typing import List, Tuple
+
+from interpreter.blocks import BlockMap
+from interpreter.colors import PALETTE
+from interpreter.commands import COMMANDS
+from interpreter.graph import split_state
+from interpreter.picture import Picture
+from interpreter.program import Program
+
+# имя перехода через белую область в отчете
+WHITE = 'white'
+# непрозрачность закраски исполненных блоков
+HEAT_ALPHA = 200
+
+
+class TimedStream:
+    # поток ввода или вывода, время обращений к которому считается:
+    # команды пишут в буфер и читают из него, а ждут только здесь
+    def __init__(self, stream, profiler: 'Profiler'):
+        self.stream = stream
+        self.profiler = profiler
+
+    def write(self, data):
+        start = perf_counter()
+        try:
+            return self.stream.write(data)
+        finally:
+            self.profiler.io_time += perf_counter() - start
+
+    def flush(self):
+        start = perf_counter()
+        try:
+            return self.stream.flush()
+        finally:
+            self.profiler.io_time += perf_counter() - start
+
+    def readline(self):
+        start = perf_counter()
+        try:
+            return self.stream.readline()
+        finally:
+            self.profiler.io_time += perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Profiler:
+    def __init__(self):
+        # (из блока, в блок, имя команды) : сколько раз
+        self.moves: Counter = Counter()
+        # скомпилированное исполнение считает только начала участков
+        # и отдельные переходы, collect раскладывает их по блокам
+        self.chains: Counter = Counter()
+        self.states: Counter = Counter()
+        self.io_time = 0.0
+        self.total_time = 0.0
+        self.started = 0.0
+
+    def start(self):
+        self.started = perf_counter()
+
+    def stop(self):
+        self.total_time += perf_counter() - self.started
+
+    def timed(self, stream) -> TimedStream:
+        return TimedStream(stream, self)
+
+    def count_step(self, block: int, next_block: int, command: str):
+        self.moves[block, next_block, command] += 1
+
+    @property
+    def blocks(self) -> Counter:
+        # номер блока : сколько раз из него выходили
+        blocks: Counter = Counter()
+        for (block, _, _), times in self.moves.items():
+            blocks[block] += times
+        return blocks
+
+    @property
+    def edges(self) -> Counter:
+        edges: Counter = Counter()
+        for (block, next_block, _), times in self.moves.items():
+            edges[block, next_block] += times
+        return edges
+
+    @property
+    def commands(self) -> Counter:
+        commands: Counter = Counter()
+        for (_, _, command), times in self.moves.items():
+            commands[command] += times
+        return commands
+
+    def collect(self, program: Program):
+        labels = program.blocks.labels
+        counts: Counter = Counter(self.states)
+        for state, times in self.chains.items():
+            transitions, _ = program.graph.chain(state, program.leaders)
+            for transition in transitions:
+                counts[state] += times
+                state = transition.state
+        self.chains.clear()
+        self.states.clear()
+        for state, times in counts.items():
+            transition = program.graph.resolve(state)
+            block = labels[split_state(state)[0]]
+            self.moves[block, labels[transition.codel],
+                       WHITE if transition.command is None
+                       else COMMANDS[transition.command].name] += times
+
+    def steps(self) -> int:
+        return sum(self.moves.values())
+
+    def report(self, block_map: BlockMap, top: int = 20) -> str:
+        steps = max(self.steps(), 1)
+        blocks = self.blocks
+        lines = [f'шагов: {self.steps()}',
+                 f'время: {self.total_time:.3f} с, из них ввод-вывод: '
+                 f'{self.io_time:.3f} с, вычисления: '
+                 f'{self.total_time - self.io_time:.3f} с',
+                 '', 'команды:']
+        lines.extend(f'  {name:<14} {times:>12} {times / steps:>7.1%}'
+                     for name, times in self.commands.most_common())
+        lines.extend(['', f'блоки (первые {top}):'])
+        for index, times in blocks.most_common(top):
+            block = block_map.blocks[index]
+            lines.append(f'  {index:>6} {times:>12} {times / steps:>7.1%}  '
+                         f'{block.color}, размер {block.size}, '
+                         f'границы {block.bbox}')
+        lines.extend(['', f'переходы (первые {top}):'])
+        lines.extend(f'  {source:>6} -> {target:<6} {times:>12} '
+                     f'{times / steps:>7.1%}'
+                     for (source, target), times
+                     in self.edges.most_common(top))
+        return '\n'.join(lines) + '\n'
+
+    def block_heat(self, block_map: BlockMap) -> List[float]:
+        # 0..1 в логарифмической шкале, иначе виден только самый горячий
+        # цикл; -1 - блок ни разу не исполнялся
+        heat = [-1.0] * len(block_map.blocks)
+        blocks = self.blocks
+        if not blocks:
+            return heat
+        top = math.log(max(blocks.values()) + 1)
+        for index, times in blocks.items():
+            heat[index] = math.log(times + 1) / top
+        return heat
+
+    def heatmap(self, block_map: BlockMap, picture: Picture,
+                file_name: str, output: str):
+        # исходная картинка обесцвечивается, а исполненные блоки
+        # закрашиваются от синего (редко) до красного (часто)
+        from PIL import Image
+        # ленивая разметка (LazyBlockMap) размечается при обходе целиком,
+        # поэтому номера блоков - до подсчета их цветов
+        labels = list(block_map.labels)
+        colors = [bytes((round(255 * value), 0, round(255 * (1 - value)),
+                         HEAT_ALPHA)) if value >= 0 else bytes(4)
+                  for value in self.block_heat(block_map)]
+        overlay = Image.frombytes(
+            'RGBA', (picture.width, picture.height),
+            b''.join(colors[label] for label in labels))
+        try:
+            with Image.open(file_name) as original:
+                gray = original.convert('L')
+        except OSError:
+            # файл коделей и PAM PIL не читает: фон - цвета коделей
+            palette = [bytes(rgb) for rgb in PALETTE]
+            gray = Image.frombytes(
+                'RGB', (picture.width, picture.height),
+                b''.join(palette[codel]
+                         for codel in bytes(picture.codels))).convert('L')
+        background = Image.blend(gray.convert('RGBA'),
+                                 Image.new('RGBA', gray.size,
+                                           (255, 255, 255, 255)), 0.5)
+        overlay = overlay.resize(background.size, Image.Resampling.NEAREST)
+        Image.alpha_composite(background, overlay).save(output)
+
+
+def profile_paths(prefix: str) -> Tuple[str, str]:
+    return f'{prefix}.profile.txt', f'{prefix}.profile.png'
+
+
+def write_profile(profiler: Profiler, block_map: BlockMap,
+                  picture: Picture, file_name: str, prefix: str):
+    report_path, heatmap_path = profile_paths(prefix)
+    with open(report_path, 'w', encoding='utf-8') as report:
+        report.write(profiler.report(block_map))
+    profiler.heatmap(block_map, picture, file_name, heatmap_path)
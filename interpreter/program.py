@@ -0,0 +1,105 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from interpreter.blocks import BlockMap, LazyBlockMap
+from interpreter.commands import COMMANDS, Pointer, Switch
+from interpreter.graph import TransitionGraph, Transition, make_state
+from interpreter.optimizer import Operation, optimize
+from interpreter.picture import Picture
+
+# левый верхний кодель, dp RIGHT, cc LEFT
+START_STATE = make_state(0, 0, 0)
+
+
+class ChainPlan(NamedTuple):
+    # оптимизированные команды линейного участка
+    operations: List[Operation]
+    # переход с pointer или switch в конце участка
+    branch: Optional[Transition]
+    # состояние после участка или последнее состояние перед концом
+    state: int
+    terminated: bool
+    # число переходов участка вместе с ветвлением
+    steps: int
+
+
+class Program:
+    def __init__(self, picture: Picture,
+                 blocks: Optional[BlockMap] = None,
+                 transitions: Optional[Dict[int, Optional[Transition]]]
+                 = None,
+                 leaders: Optional[Set[int]] = None,
+                 lazy: bool = False):
+        # готовые разметка, переходы и начала участков - из кэша;
+        # lazy - блоки размечаются, а переходы вычисляются, только когда
+        # до них доходит исполнение
+        self.picture = picture
+        # картинку из mapped.py не обходят целиком
+        lazy = lazy or picture.mapped
+        self.lazy = lazy
+        if blocks is None:
+            blocks = LazyBlockMap(picture) if lazy else BlockMap(picture)
+        self.blocks = blocks
+        self.graph = TransitionGraph(self.blocks)
+        if transitions is not None:
+            self.graph.transitions = transitions
+        elif not lazy:
+            self.graph.build(START_STATE)
+        # без всего графа начала участков неизвестны: участок тогда
+        # идет до ветвления или повтора, а в середину уже пройденного
+        # можно попасть отдельным участком
+        if leaders is None:
+            leaders = {START_STATE} if lazy \
+                else self.graph.find_leaders(START_STATE)
+        self.leaders = leaders
+        # (состояние, пределы чисел) : план участка
+        self.plans: Dict[Tuple[int, Optional[Tuple[int, int]]],
+                         ChainPlan] = {}
+
+    @classmethod
+    def open_program(cls, file_name: str,
+                     codel_size: Optional[int] = None,
+                     lazy: bool = False) -> 'Program':
+        return cls(Picture.open_picture(file_name, codel_size), lazy=lazy)
+
+    def update(self, picture: Picture, changed: Iterable[int]):
+        # changed - кодели, цвет которых в picture другой (Picture.diff);
+        # программа меняется на месте
+        changed = list(changed)
+        self.picture = picture
+        if not changed:
+            return
+        removed = self.graph.invalidate(self.blocks.touched(changed))
+        self.blocks.update(picture, changed)
+        self.graph.codels = picture.codels
+        self.plans.clear()
+        if self.lazy:
+            # убранные переходы вычислятся заново при исполнении
+            self.leaders = {START_STATE}
+            return
+        # заново достижимое - только через убранные переходы
+        for state in [START_STATE] + removed:
+            self.graph.build(state)
+        # переходы, до которых больше не добраться, лишние для участков
+        reachable = self.graph.reachable(START_STATE)
+        self.graph.transitions = {
+            state: transition
+            for state, transition in self.graph.transitions.items()
+            if state in reachable}
+        self.leaders = self.graph.find_leaders(START_STATE)
+
+    def plan(self, state: int,
+             bounds: Optional[Tuple[int, int]] = None) -> ChainPlan:
+        plan = self.plans.get((state, bounds))
+        if plan is not None:
+            return plan
+        transitions, terminated = self.graph.chain(state, self.leaders)
+        steps = len(transitions)
+        branch = None
+        if transitions and COMMANDS.get(transitions[-1].command) \
+                in (Pointer, Switch):
+            branch = transitions.pop()
+        plan = ChainPlan(optimize(transitions, COMMANDS, bounds), branch,
+                         transitions[-1].state if transitions else state,
+                         terminated, steps)
+        self.plans[state, bounds] = plan
+        return plan
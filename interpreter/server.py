@@ -0,0 +1,251 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import replace
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from interpreter.async_driver import YIELD_EVERY, AsyncPietDriver
+from interpreter.cache import ProgramCache
+from interpreter.limits import Limits
+from interpreter.program import Program
+
+# сколько разобранных программ держать в памяти
+MAX_PROGRAMS = 64
+# сколько программ исполняется одновременно, остальные ждут
+MAX_RUNNING = 16
+# наибольший размер тела запроса, байт
+MAX_REQUEST = 64 * 1024 * 1024
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 411: 'Length Required',
+               413: 'Payload Too Large'}
+# поле запроса : поле Limits
+LIMIT_FIELDS = {'max_steps': 'steps', 'max_time': 'seconds',
+                'max_stack': 'stack', 'max_int_bits': 'int_bits',
+                'max_output': 'output'}
+
+
+class RequestError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class OutputSink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data: bytes):
+        self.data += data
+
+
+def tighter(limit, requested):
+    # запрос может только ужесточить ограничения сервера
+    if requested is None:
+        return limit
+    if limit is None:
+        return requested
+    return min(limit, requested)
+
+
+def _get_number(request: dict, name: str, kind: type = int):
+    value = request.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, kind)) \
+            or value < (1 if name == 'codel_size' else 0):
+        raise RequestError(400, f'неверное значение {name}')
+    return value
+
+
+class ProgramServer:
+    def __init__(self, limits: Optional[Limits] = None,
+                 max_programs: int = MAX_PROGRAMS,
+                 max_running: int = MAX_RUNNING,
+                 max_request: int = MAX_REQUEST,
+                 cache: Optional[ProgramCache] = None,
+                 yield_every: int = YIELD_EVERY):
+        # limits - наибольшие ограничения для любого запроса
+        self.limits = limits if limits is not None else Limits()
+        # (sha256 картинки, размер коделя) : программа, по давности
+        # использования
+        self.programs: Dict[Tuple[str, Optional[int]], Program] = \
+            OrderedDict()
+        self.max_programs = max_programs
+        self.running = asyncio.Semaphore(max_running)
+        self.active = 0
+        self.max_request = max_request
+        # кэш на диске переживает перезапуск сервера
+        self.cache = cache
+        self.yield_every = yield_every
+
+    def find(self, key: Tuple[str, Optional[int]]) -> Optional[Program]:
+        program = self.programs.get(key)
+        if program is not None:
+            self.programs.move_to_end(key)
+        return program
+
+    def remember(self, key: Tuple[str, Optional[int]], program: Program):
+        self.programs[key] = program
+        self.programs.move_to_end(key)
+        while len(self.programs) > self.max_programs:
+            self.programs.popitem(last=False)
+
+    def decode(self, image: bytes, codel_size: Optional[int]) -> Program:
+        # PIL, mmap и кэш на диске открывают картинку по имени файла
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'program')
+            with open(path, 'wb') as stream:
+                stream.write(image)
+            if self.cache is not None:
+                return self.cache.open_program(path, codel_size)
+            return Program.open_program(path, codel_size)
+
+    async def load(self, image: bytes,
+                   codel_size: Optional[int]) -> Tuple[str, Program]:
+        digest = hashlib.sha256(image).hexdigest()
+        key = (digest, codel_size)
+        program = self.find(key)
+        if program is None:
+            # разбор не должен останавливать идущие исполнения
+            try:
+                program = await asyncio.get_running_loop().run_in_executor(
+                    None, self.decode, image, codel_size)
+            except (OSError, ValueError) as error:
+                raise RequestError(400, f'картинка не разобрана: {error}')
+            self.remember(key, program)
+        return digest, program
+
+    async def run(self, request: dict) -> dict:
+        codel_size = _get_number(request, 'codel_size')
+        text = request.get('input', '')
+        if not isinstance(text, str):
+            raise RequestError(400, 'input должен быть строкой')
+        limits = replace(self.limits, **{
+            field: tighter(getattr(self.limits, field),
+                           _get_number(request, name,
+                                       float if field == 'seconds' else int))
+            for name, field in LIMIT_FIELDS.items()})
+        if 'image' in request:
+            try:
+                image = base64.b64decode(request['image'], validate=True)
+            except (binascii.Error, TypeError):
+                raise RequestError(400, 'image должен быть в base64')
+            digest, program = await self.load(image, codel_size)
+        elif 'program' in request:
+            digest = str(request['program'])
+            program = self.find((digest, codel_size))
+            if program is None:
+                raise RequestError(404, 'программа не загружена')
+        else:
+            raise RequestError(400, 'нужно поле image или program')
+        source = asyncio.StreamReader()
+        source.feed_data(text.encode('utf-8', 'surrogateescape'))
+        source.feed_eof()
+        sink = OutputSink()
+        result = {'program': digest}
+        driver = None
+        async with self.running:
+            self.active += 1
+            start = perf_counter()
+            try:
+                driver = AsyncPietDriver(program.picture, source, sink,
+                                         limits=limits, program=program,
+                                         yield_every=self.yield_every)
+                result['status'] = (await driver.process()).value
+            except (Exception, SystemExit) as error:
+                result['status'] = 'error'
+                result['error'] = f'{type(error).__name__}: {error}'
+            finally:
+                self.active -= 1
+        result['stdout'] = sink.data.decode('utf-8', 'surrogateescape')
+        result['steps'] = driver.governor.steps if driver is not None else 0
+        result['time'] = perf_counter() - start
+        return result
+
+    async def respond(self, reader: asyncio.StreamReader) -> Tuple[int, dict]:
+        try:
+            method, target, _ = (await reader.readline()).decode(
+                'latin-1').split(' ', 2)
+        except ValueError:
+            raise RequestError(400, 'неверная строка запроса')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/status':
+            return 200, {'programs': [digest for digest, _
+                                      in self.programs],
+                         'running': self.active}
+        if method != 'POST':
+            raise RequestError(405, 'нужен POST')
+        try:
+            length = int(headers['content-length'])
+        except (KeyError, ValueError):
+            raise RequestError(411, 'нужен Content-Length')
+        if length > self.max_request:
+            raise RequestError(413, 'слишком большой запрос')
+        body = await reader.readexactly(length)
+        if url.path == '/programs':
+            query = parse_qs(url.query)
+            codel_size = None
+            if 'codel_size' in query:
+                value = query['codel_size'][0]
+                codel_size = _get_number(
+                    {'codel_size': int(value) if value.isdecimal() else 0},
+                    'codel_size')
+            digest, program = await self.load(body, codel_size)
+            return 200, {'program': digest, 'width': program.picture.width,
+                         'height': program.picture.height}
+        if url.path == '/run':
+            try:
+                request = json.loads(body)
+            except ValueError:
+                raise RequestError(400, 'тело запроса - не json')
+            if not isinstance(request, dict):
+                raise RequestError(400, 'тело запроса - не объект json')
+            return 200, await self.run(request)
+        raise RequestError(404, 'нет такого адреса')
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        # одно соединение - один запрос
+        try:
+            code, body = await self.respond(reader)
+        except RequestError as error:
+            code, body = error.code, {'error': str(error)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        writer.write(f'HTTP/1.1 {code} {STATUS_TEXT[code]}\r\n'
+                     f'Content-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(payload)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1')
+                     + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Optional[str] = None,
+                    port: Optional[int] = None, host: str = '127.0.0.1'):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle,
+                                                     socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,146 @@
+from itertools import chain
+from typing import Callable, Dict, Iterator, List
+
+# наибольший размер куска: сдвиг на глубину depth переставляет
+# depth / CHUNK_SIZE ссылок на куски и режет не больше трех кусков
+CHUNK_SIZE = 512
+
+
+class BlockStack:
+    # стэк из кусков-списков снизу вверх: roll переставляет куски целиком,
+    # а не копирует depth элементов, как срез обычного списка
+    def __init__(self, values=()):
+        self.chunks: List[List[int]] = [[]]
+        self.size = 0
+        self.extend(values)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return chain.from_iterable(self.chunks)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, BlockStack)):
+            return len(other) == self.size and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def append(self, value: int):
+        top = self.chunks[-1]
+        if len(top) >= CHUNK_SIZE:
+            top = []
+            self.chunks.append(top)
+        top.append(value)
+        self.size += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def pop(self) -> int:
+        top = self.chunks[-1]
+        if not top:
+            if len(self.chunks) == 1:
+                raise IndexError('pop from empty stack')
+            self.chunks.pop()
+            top = self.chunks[-1]
+        self.size -= 1
+        return top.pop()
+
+    def _locate(self, index: int):
+        # (номер куска, место в нем) для индекса от дна стэка,
+        # кусков проходится столько, сколько лежит выше индекса
+        position = self.size
+        for number in range(len(self.chunks) - 1, -1, -1):
+            position -= len(self.chunks[number])
+            if position <= index:
+                return number, index - position
+        raise IndexError('stack index out of range')
+
+    def tail(self, start: int) -> List[int]:
+        # значения от индекса start до вершины без обхода всего стэка
+        if start >= self.size:
+            return []
+        number, offset = self._locate(max(start, 0))
+        values = self.chunks[number][offset:]
+        for chunk in self.chunks[number + 1:]:
+            values.extend(chunk)
+        return values
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is None and index.stop is None:
+                start = index.start or 0
+                return self.tail(start + self.size if start < 0 else start)
+            return list(self)[index]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('stack index out of range')
+        number, offset = self._locate(index)
+        return self.chunks[number][offset]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            values = list(self)
+            values[index] = value
+            self.chunks = [[]]
+            self.size = 0
+            self.extend(values)
+            return
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('stack index out of range')
+        number, offset = self._locate(index)
+        self.chunks[number][offset] = value
+
+    def _split(self, index: int) -> int:
+        # разрезает кусок так, чтобы index был началом куска,
+        # и возвращает номер этого куска
+        if index == self.size:
+            return len(self.chunks)
+        number, offset = self._locate(index)
+        if offset:
+            chunk = self.chunks[number]
+            self.chunks[number:number + 1] = [chunk[:offset],
+                                              chunk[offset:]]
+            number += 1
+        return number
+
+    def _merge(self, number: int):
+        # сливает кусок number с предыдущим, если вместе они не больше
+        chunks = self.chunks
+        if (0 < number < len(chunks)
+                and len(chunks[number - 1]) + len(chunks[number])
+                <= CHUNK_SIZE):
+            chunks[number - 1].extend(chunks.pop(number))
+
+    def roll(self, depth: int, count: int):
+        # count уже приведен к 0 <= count < depth, как в Roll
+        if count == 0 or depth > self.size:
+            # редкие случаи с порчей стэка - как у списка
+            values = list(self)
+            index = -abs(count) + depth * (count < 0)
+            values[-depth:] = values[index:] + values[-depth:index]
+            self.chunks = [[]]
+            self.size = 0
+            self.extend(values)
+            return
+        chunks = self.chunks
+        if not chunks[-1]:
+            chunks.pop()
+        start = self._split(self.size - depth)
+        middle = self._split(self.size - count)
+        moved = len(chunks) - middle
+        chunks[start:] = chunks[middle:] + chunks[start:middle]
+        for number in (start + moved, start):
+            self._merge(number)
+
+
+# имя для --stack : класс стэка
+STACKS: Dict[str, Callable[[], object]] = {'list': list,
+                                           'blocks': BlockStack}
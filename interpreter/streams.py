@@ -0,0 +1,180 @@
+import codecs
+import io
+import mmap
+import os
+import re
+import stat
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    # вывод сбрасывается, когда в буфере набирается size байт,
+    # 0 - после каждой записи
+    size: int = 8192
+    # сбрасывать после каждого перевода строки
+    newline: bool = False
+
+
+def is_binary(stream) -> bool:
+    return isinstance(stream, (io.RawIOBase, io.BufferedIOBase))
+
+
+class BufferedOutput:
+    def __init__(self, stream, policy: FlushPolicy = FlushPolicy(),
+                 encoding: str = 'utf-8'):
+        self.stream = stream
+        self.policy = policy
+        # в двоичный поток пишутся байты в encoding
+        self.binary = is_binary(stream)
+        self.encoding = encoding
+        self.parts: List[str] = []
+        self.size = 0
+        # сколько байт (в текстовый поток - символов) уже записано
+        self.written = 0
+
+    def write(self, value: str):
+        self.parts.append(value)
+        # размер считается в символах: точнее не нужно, а кодировать
+        # каждую запись ради этого дорого
+        self.size += len(value)
+        if (self.size >= self.policy.size
+                or self.policy.newline and '\n' in value):
+            self.flush()
+        return len(value)
+
+    def flush(self):
+        if self.parts:
+            text = ''.join(self.parts)
+            self.parts.clear()
+            self.size = 0
+            if self.binary:
+                data = text.encode(self.encoding, 'surrogatepass')
+                self.stream.write(data)
+                self.written += len(data)
+            else:
+                self.stream.write(text)
+                self.written += len(text)
+        flush = getattr(self.stream, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class InputReader:
+    # общий для команд ввода и пошагового режима буфер: строка читается
+    # так же, как посимвольно до '\n', но без вызова на каждый символ
+    _TOKEN = re.compile(r'\s*(\S*)')
+
+    def __init__(self, stream, tokens: bool = False,
+                 before_read: Optional[Callable[[], None]] = None,
+                 chunk_size: int = 1 << 16):
+        self.stream = stream
+        # in_int читает слова, разделенные пробельными символами,
+        # а не строки целиком
+        self.tokens = tokens
+        # вызывается перед каждым обращением к потоку
+        self.before_read = before_read
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        # сколько символов прочитано до начала buffer
+        self.base = 0
+        self.eof = False
+        self.mapping: Optional[mmap.mmap] = None
+        self.offset = 0
+        self.decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder('utf-8')('surrogateescape'), True)
+        self._map()
+
+    def _map(self):
+        # обычный файл читается через mmap большими кусками
+        try:
+            descriptor = self.stream.fileno()
+            if not stat.S_ISREG(os.fstat(descriptor).st_mode):
+                return
+            offset = self.stream.tell()
+            self.mapping = mmap.mmap(descriptor, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, AttributeError):
+            return
+        self.offset = offset
+
+    def _read_chunk(self) -> str:
+        if self.mapping is not None:
+            data = self.mapping[self.offset:self.offset + self.chunk_size]
+            self.offset += len(data)
+            return self.decoder.decode(data, not data)
+        # построчно, чтобы не ждать ввода, которого еще нет
+        line = self.stream.readline()
+        if isinstance(line, bytes):
+            return self.decoder.decode(line, not line)
+        return line
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        if self.before_read is not None:
+            self.before_read()
+        while True:
+            text = self._read_chunk()
+            if text:
+                self.base += self.position
+                self.buffer = self.buffer[self.position:] + text
+                self.position = 0
+                return True
+            if self.mapping is None or self.offset >= len(self.mapping):
+                self.eof = True
+                return False
+
+    def read_line(self) -> str:
+        # строка без '\n', в конце ввода - остаток или ''
+        while True:
+            end = self.buffer.find('\n', self.position)
+            if end != -1:
+                line = self.buffer[self.position:end]
+                self.position = end + 1
+                return line
+            if not self._fill():
+                line = self.buffer[self.position:]
+                self.base += len(self.buffer)
+                self.buffer = ''
+                self.position = 0
+                return line
+
+    def read_token(self) -> str:
+        # слово и один пробельный символ после него, в конце ввода - ''
+        while True:
+            match = self._TOKEN.match(self.buffer, self.position)
+            if match.end() < len(self.buffer) or not self._fill():
+                break
+        self.position = min(match.end() + 1, len(self.buffer))
+        return match.group(1)
+
+    def read_number(self) -> str:
+        return self.read_token() if self.tokens else self.read_line()
+
+    @property
+    def consumed(self) -> int:
+        # сколько символов ввода уже прочитано командами
+        # (после замены '\r\n' на '\n')
+        return self.base + self.position
+
+    def skip(self, count: int):
+        # пропускает count символов: продолжение с контрольной точки
+        while self.position + count > len(self.buffer):
+            count -= len(self.buffer) - self.position
+            self.position = len(self.buffer)
+            if not self._fill():
+                self.base += len(self.buffer)
+                self.buffer = ''
+                self.position = 0
+                return
+        self.position += count
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
@@ -0,0 +1,284 @@
+import struct
+from typing import (BinaryIO, Iterator, List, NamedTuple, Optional, Tuple)
+
+from interpreter.commands import COMMANDS, Roll
+from interpreter.graph import split_state
+from interpreter.hooks import Hooks
+
+MAGIC = b'PIETTRC1'
+# ширина, высота картинки и через сколько шагов ключевой кадр
+HEADER = struct.Struct('<III')
+STEP = 0
+KEYFRAME = 1
+# код команды в записи шага: 0 - проход через белое
+COMMAND_KEYS: List[Optional[Tuple[int, int]]] = [None] + list(COMMANDS)
+COMMAND_CODES = {key: code for code, key in enumerate(COMMAND_KEYS)}
+COMMAND_NAMES = {command.name: key for key, command in COMMANDS.items()}
+
+
+def write_int(buffer: bytearray, value: int):
+    # zigzag и 7 бит на байт, длинные числа - длина и байты целиком,
+    # чтобы не резать их сдвигами по 7 бит
+    zigzag = value << 1 if value >= 0 else ((-value) << 1) - 1
+    if zigzag < 1 << 62:
+        write_uint(buffer, zigzag << 1)
+        return
+    raw = value.to_bytes((value.bit_length() + 8) // 8, 'little',
+                         signed=True)
+    write_uint(buffer, len(raw) << 1 | 1)
+    buffer += raw
+
+
+def write_uint(buffer: bytearray, value: int):
+    while value >= 0x80:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_uint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def read_int(data: bytes, position: int) -> Tuple[int, int]:
+    header, position = read_uint(data, position)
+    if header & 1:
+        size = header >> 1
+        return (int.from_bytes(data[position:position + size], 'little',
+                               signed=True), position + size)
+    zigzag = header >> 1
+    return (zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1),
+            position)
+
+
+class TraceRecorder(Hooks):
+    def __init__(self, stream: BinaryIO, width: int, height: int,
+                 keyframe_every: int = 10000,
+                 capacity: Optional[int] = None):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        # ключевой кадр - полный стэк, с него начинается перемотка
+        self.keyframe_every = keyframe_every
+        # None - все записи сразу пишутся в поток, иначе в памяти
+        # хранятся последние куски от ключевого кадра общим размером
+        # не больше capacity байт и пишутся при close
+        self.capacity = capacity
+        self.segments: List[bytearray] = []
+        self.kept = 0
+        self.segment = bytearray()
+        self.steps = 0
+        self.base = 0
+        # значения до команды с места base и сама команда
+        self.before: Optional[List[int]] = None
+        self.command: Optional[Tuple[int, int]] = None
+        # код команды последнего шага - для ключевого кадра
+        self.code = 0
+        self.stream.write(MAGIC + HEADER.pack(width, height, keyframe_every))
+
+    def start(self, state: int, stack: List[int]):
+        self.keyframe(state, stack)
+
+    def keyframe(self, state: int, stack: List[int]):
+        segment = self.segment
+        segment.append(KEYFRAME)
+        write_uint(segment, self.steps)
+        write_uint(segment, state)
+        segment.append(self.code)
+        write_uint(segment, len(stack))
+        for value in stack:
+            write_int(segment, value)
+
+    def before_command(self, stack: List[int],
+                       command: Tuple[int, int]):
+        # верхние значения, которые команда может изменить
+        size = len(stack)
+        touched = 2
+        if COMMANDS[command] is Roll and size >= 2:
+            depth, count = stack[-2], stack[-1]
+            if depth > 1 and count % depth == 0:
+                # такой roll портит весь стэк
+                touched = size
+            elif depth > 1:
+                touched = depth + 2
+        self.base = max(size - touched, 0)
+        self.before = stack[self.base:]
+        self.command = command
+
+    def step(self, state: int, stack: List[int]):
+        segment = self.segment
+        segment.append(STEP)
+        write_uint(segment, state)
+        if self.before is None:
+            self.code = 0
+            segment.append(0)
+        else:
+            self.code = COMMAND_CODES[self.command]
+            segment.append(self.code)
+            before = self.before
+            after = stack[self.base:]
+            common = 0
+            limit = min(len(before), len(after))
+            while common < limit and before[common] == after[common]:
+                common += 1
+            write_uint(segment, len(before) - common)
+            write_uint(segment, len(after) - common)
+            for value in after[common:]:
+                write_int(segment, value)
+            self.before = None
+        self.steps += 1
+        if self.steps % self.keyframe_every == 0:
+            self.finish_segment()
+            self.keyframe(state, stack)
+
+    def finish_segment(self):
+        if self.capacity is None:
+            self.stream.write(self.segment)
+        else:
+            self.segments.append(self.segment)
+            self.kept += len(self.segment)
+            while self.kept > self.capacity and len(self.segments) > 1:
+                self.kept -= len(self.segments.pop(0))
+        self.segment = bytearray()
+
+    def on_start(self, driver, state: int):
+        self.start(state, driver.stack)
+
+    def on_command(self, driver, command, block_size: int):
+        self.before_command(driver.stack, COMMAND_NAMES[command.name])
+
+    def on_step(self, driver, state: int, count: int):
+        self.step(state, driver.stack)
+
+    def on_terminate(self, driver, status):
+        self.close()
+
+    def close(self):
+        self.finish_segment()
+        for segment in self.segments:
+            self.stream.write(segment)
+        self.segments.clear()
+        self.stream.flush()
+
+
+class TraceFrame(NamedTuple):
+    # номер шага: состояние после step шагов
+    step: int
+    state: int
+    stack: List[int]
+    # команда последнего шага, None - проход через белое или начало
+    # исполнения
+    command: Optional[Tuple[int, int]]
+
+    @property
+    def codel(self) -> int:
+        return split_state(self.state)[0]
+
+
+class TraceReader:
+    def __init__(self, data: bytes):
+        if not data.startswith(MAGIC):
+            raise ValueError('это не файл трассы')
+        self.data = data
+        self.width, self.height, self.keyframe_every = HEADER.unpack_from(
+            data, len(MAGIC))
+        # номер шага ключевого кадра : место в данных
+        self.keyframes: List[Tuple[int, int]] = []
+        self.steps = 0
+        self._index()
+
+    @classmethod
+    def open(cls, file_name: str) -> 'TraceReader':
+        with open(file_name, 'rb') as stream:
+            return cls(stream.read())
+
+    def _index(self):
+        data = self.data
+        position = len(MAGIC) + HEADER.size
+        step = 0
+        while position < len(data):
+            if data[position] == KEYFRAME:
+                step, _ = read_uint(data, position + 1)
+                self.keyframes.append((step, position))
+                position = self._skip_keyframe(position)
+            else:
+                position = self._skip_step(position + 1)
+                step += 1
+        self.steps = step
+
+    def _skip_step(self, position: int) -> int:
+        data = self.data
+        _, position = read_uint(data, position)
+        code = data[position]
+        position += 1
+        if code:
+            _, position = read_uint(data, position)
+            pushed, position = read_uint(data, position)
+            for _ in range(pushed):
+                _, position = read_int(data, position)
+        return position
+
+    def first_step(self) -> int:
+        return self.keyframes[0][0] if self.keyframes else 0
+
+    def frames(self, start: Optional[int] = None) -> Iterator[TraceFrame]:
+        # кадры с шага start (по умолчанию - с первого записанного)
+        data = self.data
+        if not self.keyframes:
+            return
+        if start is None:
+            start = self.first_step()
+        if not self.first_step() <= start <= self.steps:
+            raise IndexError(f'шаг {start} не записан в трассе: есть '
+                             f'{self.first_step()}..{self.steps}')
+        position = [position for step, position in self.keyframes
+                    if step <= start][-1]
+        step, position = read_uint(data, position + 1)
+        state, position = read_uint(data, position)
+        command = COMMAND_KEYS[data[position]]
+        size, position = read_uint(data, position + 1)
+        stack = []
+        for _ in range(size):
+            value, position = read_int(data, position)
+            stack.append(value)
+        if step >= start:
+            yield TraceFrame(step, state, list(stack), command)
+        while position < len(data):
+            if data[position] == KEYFRAME:
+                position = self._skip_keyframe(position)
+                continue
+            state, position = read_uint(data, position + 1)
+            code = data[position]
+            position += 1
+            command = COMMAND_KEYS[code]
+            if code:
+                popped, position = read_uint(data, position)
+                pushed, position = read_uint(data, position)
+                if popped:
+                    del stack[len(stack) - popped:]
+                for _ in range(pushed):
+                    value, position = read_int(data, position)
+                    stack.append(value)
+            step += 1
+            if step >= start:
+                yield TraceFrame(step, state, list(stack), command)
+
+    def _skip_keyframe(self, position: int) -> int:
+        data = self.data
+        _, position = read_uint(data, position + 1)
+        _, position = read_uint(data, position)
+        size, position = read_uint(data, position + 1)
+        for _ in range(size):
+            _, position = read_int(data, position)
+        return position
+
+    def seek(self, step: int) -> TraceFrame:
+        return next(self.frames(step))
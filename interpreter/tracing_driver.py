@@ -0,0 +1,355 @@
+from collections import defaultdict
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Tuple)
+
+from interpreter.commands import (Add, BaseCommand, Divide, Duplicate,
+                                  Greater, InChar, InInt, Mod, Multiply, Not,
+                                  OutChar, OutInt, Pop, Push, Roll, Subtract,
+                                  Switch)
+from interpreter.compiled_driver import COMMAND_KEYS, CompiledPietDriver
+from interpreter.graph import make_state, split_state
+from interpreter.limits import LimitExceeded
+from interpreter.optimizer import ConstantOperation, PushValues
+from interpreter.picture import Picture
+from interpreter.program import ChainPlan
+
+# сколько раз участок должен начаться с одного состояния, чтобы с него
+# записывался след
+HOT_THRESHOLD = 50
+# самый длинный след в участках
+MAX_TRACE_CHAINS = 64
+# след, первая охрана которого столько раз не прошла, выбрасывается
+MAX_MISSES = 64
+# с наблюдателями шагов след отдает управление хотя бы раз в столько
+# шагов, чтобы, например, контрольная точка сохранилась вовремя
+HOOK_STEPS = 1024
+# шагов за один вход в след без ограничений
+MAX_STEPS = 1 << 62
+
+# команда : (сколько значений нужно в стэке, сколько снимает, сколько
+# кладет); у команд, которые вызываются как есть, снятие и добавление
+# зависят от значений и ввода, поэтому считается худший случай
+EFFECTS: Dict[type, Tuple[int, int, int]] = {
+    Push: (0, 0, 1), Pop: (1, 1, 0),
+    Add: (2, 2, 1), Subtract: (2, 2, 1), Multiply: (2, 2, 1),
+    Divide: (2, 2, 1), Mod: (2, 2, 1), Greater: (2, 2, 1),
+    Not: (1, 1, 1), Duplicate: (1, 0, 1), ConstantOperation: (1, 1, 1),
+    Roll: (0, 2, 0), InInt: (0, 0, 0), InChar: (0, 0, 0),
+    OutInt: (0, 1, 0), OutChar: (0, 1, 0),
+}
+
+# команда : код без проверок размера стэка, их заменяет охрана
+FAST_CODE = {
+    Push: 'append({argument})',
+    Pop: 'pop()',
+    Add: 'a = pop()\nstack[-1] += a',
+    Subtract: 'a = pop()\nstack[-1] -= a',
+    Multiply: 'a = pop()\nstack[-1] *= a',
+    # при делении на ноль в стэке, как и у команды, не остается ни
+    # одного из аргументов
+    Divide: 'a = pop()\nb = pop()\nappend(b // a)',
+    Mod: 'a = pop()\nb = pop()\nappend(b % abs(a))',
+    Greater: 'a = pop()\nstack[-1] = 1 if stack[-1] > a else 0',
+    Not: 'stack[-1] = 0 if stack[-1] else 1',
+    Duplicate: 'append(stack[-1])',
+}
+
+# команда после константы : код над верхним значением
+CONSTANT_CODE = {
+    Add: 'stack[-1] += {value}',
+    Subtract: 'stack[-1] -= {value}',
+    Multiply: 'stack[-1] *= {value}',
+    Divide: 'stack[-1] //= {value}',
+    Mod: 'stack[-1] %= {modulus}',
+    Greater: 'stack[-1] = 1 if stack[-1] > {value} else 0',
+}
+
+
+class TraceInterrupted(Exception):
+    # ограничение, на котором остановился след, и сделанные до него шаги
+    def __init__(self, error: LimitExceeded, steps: int):
+        super().__init__(error, steps)
+        self.error = error
+        self.steps = steps
+
+
+class Trace(NamedTuple):
+    # состояния, с которых начинаются участки следа
+    states: Tuple[int, ...]
+    # состояние после последнего участка: начало следа, если это цикл,
+    # или начало другого следа
+    target: int
+    # шагов за один проход
+    steps: int
+    source: str
+    # (стэк, сколько шагов можно сделать) -> (состояние, сделано шагов)
+    run: Callable[[List[int], int], Tuple[int, int]]
+
+
+def _effect(operation) -> Tuple[int, int, int]:
+    if operation.command is PushValues:
+        return 0, 0, len(operation.argument)
+    return EFFECTS[operation.command]
+
+
+def _after(depth: int, effect: Tuple[int, int, int]) -> Optional[int]:
+    # сколько значений в стэке точно есть после команды, None - команде
+    # без проверок их не хватает
+    need, pops, pushes = effect
+    if depth < need:
+        return None
+    return max(depth - pops, 0) + pushes
+
+
+def _required(depth: int, effects: List[Tuple[int, int, int]]) -> int:
+    # наименьшая глубина стэка в начале участка, не меньше уже
+    # известной, при которой хватает всем командам участка
+    need = depth
+    while True:
+        current: Optional[int] = need
+        for effect in effects:
+            current = _after(current, effect)
+            if current is None:
+                break
+        else:
+            return need
+        need += 1
+
+
+class TraceCompiler:
+    # переводит записанный след в функцию на питоне: участки идут подряд,
+    # команды - без проверок, а охраны сверяют размер стэка и исход
+    # pointer и switch с записанными и при расхождении возвращают
+    # состояние, с которого продолжит обычное исполнение
+    def __init__(self, plans: List[ChainPlan], states: List[int],
+                 target: int, commands: Dict[Tuple[int, int], BaseCommand]):
+        self.plans = plans
+        self.states = states
+        self.target = target
+        self.loop = target == states[0]
+        self.commands = commands
+        self.steps = sum(plan.steps for plan in plans)
+        # есть ли в следе вывод
+        self.calls = False
+
+    def operation_code(self, operation) -> str:
+        command = operation.command
+        if command is PushValues:
+            values = operation.argument
+            if len(values) == 1:
+                return f'append({values[0]})'
+            return f'stack.extend({values!r})'
+        if command is ConstantOperation:
+            command, value = operation.argument
+            return CONSTANT_CODE[command].format(value=value,
+                                                 modulus=abs(value))
+        if command in FAST_CODE:
+            return FAST_CODE[command].format(argument=operation.argument)
+        return f'{command.name}(stack, {operation.argument}, None, None)'
+
+    def branch_code(self, plan: ChainPlan, following: int,
+                    done: str) -> List[str]:
+        branch = plan.branch
+        codel, dp, cc = split_state(following)
+        if codel != branch.codel:
+            raise ValueError('след не совпадает с переходом')
+        if branch.command == COMMAND_KEYS[Switch]:
+            # switch меняет cc, если снятое значение нечетное
+            other = make_state(codel, dp, 1 - cc)
+            return [f'if pop() % 2 != {cc ^ branch.cc}:',
+                    f'    return {other}, {done}']
+        base = make_state(codel, 0, cc)
+        return ['a = pop()',
+                f'if a % 4 != {(dp - branch.dp) % 4}:',
+                f'    return {base} + (a + {branch.dp}) % 4 * 2, {done}']
+
+    def body(self) -> Tuple[List[str], int, int]:
+        # строки прохода, глубина стэка, которую проверяет первая охрана,
+        # и глубина, которая точно есть в конце прохода
+        lines: List[str] = []
+        depth = 0
+        first_guard = 0
+        done = 0
+        prefix = 'i + ' if self.loop else ''
+        for index, (plan, state) in enumerate(zip(self.plans, self.states)):
+            following = self.states[index + 1] \
+                if index + 1 < len(self.states) else self.target
+            effects = [_effect(operation) for operation in plan.operations]
+            if plan.branch is not None:
+                effects.append((1, 1, 0))
+            need = _required(depth, effects)
+            lines.append(f'# участок {state}')
+            if need > depth:
+                if index == 0:
+                    first_guard = need
+                lines.append(f'if len(stack) < {need}:')
+                lines.append(f'    return {state}, {prefix}{done}')
+                depth = need
+            for operation in plan.operations:
+                if operation.command in (OutInt, OutChar):
+                    # вывод может упереться в ограничение: шаги участка
+                    # к этому моменту уже сделаны
+                    lines.append(f'k = {prefix}{done + plan.steps}')
+                    self.calls = True
+                lines.extend(self.operation_code(operation).split('\n'))
+                depth = _after(depth, _effect(operation))
+            done += plan.steps
+            if plan.branch is not None:
+                lines.extend(self.branch_code(plan, following,
+                                              f'{prefix}{done}'))
+                depth -= 1
+        return lines, first_guard, depth
+
+    def compile(self) -> Trace:
+        head = self.states[0]
+        steps = self.steps
+        lines, first_guard, depth = self.body()
+        if all(line.startswith('#') for line in lines):
+            lines.append('pass')
+        source = []
+        if self.loop:
+            if depth >= first_guard > 0:
+                # стэк не убывает за проход: первую охрану достаточно
+                # проверить один раз
+                lines = lines[:1] + lines[3:]
+                source += [f'if len(stack) < {first_guard}:',
+                           f'    return {head}, 0']
+            source += [f'done = limit - limit % {steps}',
+                       f'for i in range(0, done, {steps}):']
+            source += ['    ' + line for line in lines]
+            source.append(f'return {head}, done')
+        else:
+            source += [f'if limit < {steps}:',
+                       f'    return {head}, 0']
+            source += lines
+            source.append(f'return {self.target}, {steps}')
+        if self.calls:
+            source = ['k = 0', 'try:'] + ['    ' + line for line in source]
+            source += ['except LimitExceeded as error:',
+                       '    raise TraceInterrupted(error, k) from None']
+        source = ['def trace(stack, limit):',
+                  '    pop = stack.pop',
+                  '    append = stack.append'] + \
+            ['    ' + line for line in source]
+        source = '\n'.join(source) + '\n'
+        namespace = {command.name: command
+                     for command in self.commands.values()}
+        namespace['LimitExceeded'] = LimitExceeded
+        namespace['TraceInterrupted'] = TraceInterrupted
+        exec(compile(source, f'<след {head}>', 'exec'), namespace)
+        return Trace(tuple(self.states), self.target, steps, source,
+                     namespace['trace'])
+
+
+class TracingPietDriver(CompiledPietDriver):
+    # участки исполняются как у CompiledPietDriver, но там, где исполнение
+    # часто возвращается в одно состояние, записывается путь по участкам
+    # до возврата (или до другого следа) и переводится в одну функцию
+    def __init__(self, *args, hot_threshold: int = HOT_THRESHOLD,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hot_threshold = hot_threshold
+        # начало следа : след
+        self.traces: Dict[int, Trace] = {}
+        self.counts: Dict[int, int] = defaultdict(int)
+        self.misses: Dict[int, int] = defaultdict(int)
+
+    def change_picture(self, picture: Picture):
+        super().change_picture(picture)
+        self.forget_traces()
+
+    def update_picture(self, picture: Picture,
+                       codels: Optional[Iterable[int]] = None):
+        super().update_picture(picture, codels)
+        self.forget_traces()
+
+    def forget_traces(self):
+        self.traces = {}
+        self.counts = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def compile_trace(self, states: List[int], target: int) -> Trace:
+        plans = [self.program.plan(state) for state in states]
+        trace = TraceCompiler(plans, states, target,
+                              self.command_instances).compile()
+        self.traces[states[0]] = trace
+        return trace
+
+    def run_chains(self):
+        # профиль считает участки, а стэки из stacks.py и 64-битные
+        # числа отличаются от списка, с которым работает след
+        if self.profiler is not None or self.int64 is not None \
+                or type(self.stack) is not list:
+            super().run_chains()
+            return
+        chains = self.chains
+        traces = self.traces
+        counts = self.counts
+        hot_threshold = self.hot_threshold
+        stack = self.stack
+        governor = self.governor
+        on_step = self.hooks.step
+        # состояния начал участков с тех пор, как началась запись следа
+        recording: Optional[List[int]] = None
+        state = self.get_state()
+        while True:
+            trace = traces.get(state)
+            if trace is not None:
+                limit = MAX_STEPS if governor is None \
+                    else min(governor.next_check - governor.steps, MAX_STEPS)
+                if on_step:
+                    limit = min(limit, HOOK_STEPS)
+                if limit >= trace.steps:
+                    try:
+                        following, steps = trace.run(stack, int(limit))
+                    except TraceInterrupted as interrupted:
+                        if governor is not None:
+                            governor.steps += interrupted.steps
+                        raise interrupted.error
+                    if steps:
+                        if governor is not None:
+                            governor.steps += steps
+                        for hook in on_step:
+                            hook(self, following, steps)
+                        state = following
+                        continue
+                    self.misses[state] += 1
+                    if self.misses[state] >= MAX_MISSES:
+                        del traces[state]
+            chain = chains.get(state)
+            if chain is None:
+                chain = self.compile_chain(state)
+            if governor is not None:
+                if not governor.fits(chain.steps):
+                    self.set_state(state)
+                    self.run_transitions()
+                    return
+                try:
+                    governor.before_steps(stack, chain.steps)
+                except LimitExceeded:
+                    self.set_state(state)
+                    raise
+            if recording is None and trace is None:
+                counts[state] += 1
+                if counts[state] == hot_threshold:
+                    recording = [state]
+            for command, block_size in chain.operations:
+                command(stack, block_size, None, None)
+            if chain.branch is not None:
+                state = self.run_branch(chain.branch)
+            elif chain.terminated:
+                state = chain.state
+                break
+            else:
+                state = chain.state
+            for hook in on_step:
+                hook(self, state, chain.steps)
+            if recording is not None:
+                if state == recording[0] or state in traces:
+                    self.compile_trace(recording, state)
+                    recording = None
+                elif len(recording) == MAX_TRACE_CHAINS:
+                    recording = None
+                else:
+                    recording.append(state)
+        self.set_state(state)
@@ -0,0 +1,200 @@
+import inspect
+from typing import List
+
+from interpreter import bigint
+from interpreter.commands import (COMMANDS, Push, Pop, Add,
+                                  Subtract, Multiply, Divide, Mod, Not,
+                                  Greater, Pointer, Switch, Duplicate, Roll,
+                                  InInt, InChar, OutInt, OutChar)
+from interpreter.blocks import BlockMap
+from interpreter.graph import TransitionGraph, make_state
+from interpreter.optimizer import (ConstantOperation, Operation, PushValues,
+                                   optimize)
+from interpreter.picture import Picture
+
+# перевод длинных чисел - копия bigint.py, чтобы модуль ни от чего
+# не зависел
+BIGINT = inspect.getsource(bigint)
+
+# общая часть модуля: команды с тем же поведением, что и в commands.py
+PRELUDE = '''import sys
+
+
+def read_value(in_stream):
+    line = in_stream.readline()
+    return line[:-1] if line.endswith('\\n') else line
+
+
+def in_int(stack, in_stream):
+    chars = read_value(in_stream)
+    if len(chars) == 0:
+        return
+    k = 1
+    sign = chars[0]
+    if not sign.isdigit():
+        if sign == '-':
+            k = -1
+        elif sign != '+':
+            sys.exit(1)
+        chars = chars[1:]
+    if len(chars) == 0:
+        return
+    if not chars.isdecimal():
+        for char in chars:
+            if not char.isdigit():
+                return
+            int(char)
+    stack.append(parse_int(chars) * k)
+
+
+def in_char(stack, in_stream):
+    chars = read_value(in_stream)
+    if len(chars) > 1:
+        return
+    stack.append(ord(chars[0]))
+
+
+def out_int(stack, out_stream):
+    if len(stack) == 0:
+        return
+    out_stream.write(format_int(stack.pop()))
+
+
+def out_char(stack, out_stream):
+    if len(stack) == 0:
+        return
+    try:
+        out_value = chr(stack.pop())
+    except ValueError:
+        return
+    out_stream.write(out_value)
+
+
+def roll(stack):
+    if len(stack) < 2 or stack[-2] < 0:
+        return
+    count = stack.pop()
+    depth = stack.pop()
+    if depth == 1:
+        return
+    count %= depth
+    index = -abs(count) + depth * (count < 0)
+    stack[-depth:] = stack[index:] + stack[-depth:index]
+'''
+
+RUNNER = '''
+
+def run(in_stream=None, out_stream=None, stack=None):
+    in_stream = sys.stdin if in_stream is None else in_stream
+    out_stream = sys.stdout if out_stream is None else out_stream
+    stack = [] if stack is None else stack
+    state = {start}
+    while state is not None:
+        state = STATES[state](stack, in_stream, out_stream)
+    return stack
+
+
+if __name__ == '__main__':
+    run()
+'''
+
+BINARY = '''if len(stack) >= 2:
+    a = stack.pop()
+    b = stack.pop()
+    stack.append({expression})'''
+
+CONSTANT = '''if stack:
+    b = stack.pop()
+    a = {value}
+    stack.append({expression})
+else:
+    stack.append({value})'''
+
+# команда над двумя значениями : выражение от верхнего a и предыдущего b
+EXPRESSIONS = {
+    Add: 'a + b',
+    Subtract: 'b - a',
+    Multiply: 'a * b',
+    Divide: 'b // a',
+    Mod: 'b % abs(a)',
+    Greater: '1 if b > a else 0',
+}
+
+# команда : код на питоне, повторяющий ее поведение
+COMMAND_CODE = {
+    Push: 'stack.append({size})',
+    Pop: 'if stack:\n    stack.pop()',
+    Not: 'if stack:\n    stack.append(1 if stack.pop() == 0 else 0)',
+    Duplicate: 'if stack:\n    stack.append(stack[-1])',
+    Roll: 'roll(stack)',
+    InInt: 'in_int(stack, in_stream)',
+    InChar: 'in_char(stack, in_stream)',
+    OutInt: 'out_int(stack, out_stream)',
+    OutChar: 'out_char(stack, out_stream)',
+}
+COMMAND_CODE.update({command: BINARY.format(expression=expression)
+                     for command, expression in EXPRESSIONS.items()})
+
+
+def operation_code(operation: Operation) -> str:
+    if operation.command is PushValues:
+        return f'stack.extend({operation.argument!r})'
+    if operation.command is ConstantOperation:
+        command, value = operation.argument
+        return CONSTANT.format(value=value, expression=EXPRESSIONS[command])
+    return COMMAND_CODE[operation.command].format(size=operation.argument)
+
+
+class Transpiler:
+    def __init__(self, graph: TransitionGraph, start: int):
+        self.graph = graph.build(start)
+        self.start = start
+        self.leaders = self.graph.find_leaders(start)
+
+    def _chain(self, leader: int) -> List[str]:
+        transitions, terminated = self.graph.chain(leader, self.leaders)
+        branch = None
+        if transitions and COMMANDS.get(transitions[-1].command) \
+                in (Pointer, Switch):
+            branch = transitions[-1]
+            transitions = transitions[:-1]
+        lines = [operation_code(operation)
+                 for operation in optimize(transitions, COMMANDS)]
+        if branch is not None and COMMANDS[branch.command] is Pointer:
+            base = make_state(branch.codel, 0, branch.cc)
+            lines.append(f'dp = {branch.dp}\n'
+                         f'if stack:\n'
+                         f'    dp = (dp + stack.pop()) % 4\n'
+                         f'return {base} + dp * 2')
+        elif branch is not None:
+            base = make_state(branch.codel, branch.dp, 0)
+            lines.append(f'cc = {branch.cc}\n'
+                         f'if stack and stack.pop() % 2:\n'
+                         f'    cc = 1 - cc\n'
+                         f'return {base} + cc')
+        elif terminated:
+            lines.append('return None')
+        else:
+            lines.append(f'return {transitions[-1].state}')
+        return lines
+
+    def transpile(self, name: str = 'program') -> str:
+        parts = [f'# Сгенерировано из {name} интерпретатором Piet\n',
+                 BIGINT, '\n\n', PRELUDE]
+        leaders = sorted(self.leaders)
+        for leader in leaders:
+            body = '\n'.join(self._chain(leader))
+            body = '\n'.join('    ' + line for line in body.split('\n'))
+            parts.append(f'\n\ndef state_{leader}(stack, in_stream, '
+                         f'out_stream):\n{body}\n')
+        states = ',\n'.join(f'    {leader}: state_{leader}'
+                            for leader in leaders)
+        parts.append(f'\n\nSTATES = {{\n{states},\n}}\n')
+        parts.append(RUNNER.format(start=self.start))
+        return ''.join(parts)
+
+
+def transpile_picture(picture: Picture, name: str = 'program') -> str:
+    # исполнение начинается с левого верхнего коделя, dp RIGHT, cc LEFT
+    graph = TransitionGraph(BlockMap(picture))
+    return Transpiler(graph, make_state(0, 0, 0)).transpile(name)
@@ -0,0 +1,130 @@
+from benchmarks.programs import closed_cycle, ring
+from interpreter.async_driver import AsyncPietDriver
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+
+import asyncio
+import io
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+
+
+class Sink:
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data: bytes):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+class SlowSource:
+    # отдает строки по одной с задержкой и запоминает, что к этому
+    # моменту было выведено
+    def __init__(self, lines, sink=None, delay=0.001):
+        self.lines = list(lines)
+        self.sink = sink
+        self.delay = delay
+        self.seen = []
+
+    async def readline(self):
+        if self.sink is not None:
+            self.seen.append(self.sink.data)
+        await asyncio.sleep(self.delay)
+        return self.lines.pop(0) if self.lines else b''
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.parametrize('data', [b'5\n3\n', b'3\n5\n', b'4\n4', b''])
+def test_same_output_as_compiled(data):
+    expected = io.StringIO()
+    CompiledPietDriver(Picture.open_picture(PROGRAM), False,
+                       io.StringIO(data.decode()), expected,
+                       io.StringIO()).process_picture()
+    sink = Sink()
+    source = SlowSource(data.splitlines(keepends=True))
+    driver = AsyncPietDriver(Picture.open_picture(PROGRAM), source, sink)
+    assert run(driver.process()) == Status.FINISHED
+    assert sink.data.decode() == expected.getvalue()
+
+
+def test_stream_reader_source():
+    async def session():
+        reader = asyncio.StreamReader()
+        sink = Sink()
+        driver = AsyncPietDriver(Picture.open_picture(PROGRAM), reader, sink)
+        task = asyncio.create_task(driver.process())
+        await asyncio.sleep(0.01)
+        reader.feed_data(b'2\n')
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        reader.feed_data(b'7\n')
+        reader.feed_eof()
+        await task
+        return sink.data
+
+    assert run(session()) == b'-1'
+
+
+def test_many_sessions_concurrently():
+    async def sessions():
+        program = CompiledPietDriver(Picture.open_picture(PROGRAM), False,
+                                     io.StringIO(), io.StringIO(),
+                                     io.StringIO()).program
+        sinks = [Sink() for _ in range(100)]
+        drivers = [AsyncPietDriver(program.picture,
+                                   SlowSource([b'%d\n' % i, b'50\n'],
+                                              delay=0.05),
+                                   sink, program=program)
+                   for i, sink in enumerate(sinks)]
+        await asyncio.gather(*(driver.process() for driver in drivers))
+        return [sink.data for sink in sinks]
+
+    # по сессии на поток заняло бы 100 * 2 * 0.05 с
+    outputs = run(asyncio.wait_for(sessions(), 3))
+    assert outputs == [b'-1'] * 50 + [b'0'] + [b'1'] * 49
+
+
+def test_output_is_sent_before_waiting(tmp_path):
+    path = tmp_path / 'echo.png'
+    ring(closed_cycle(['push', 'out_int', 'in_char', 'pop'])).save(path)
+    sink = Sink()
+    source = SlowSource([b'a\n'] * 50, sink)
+    driver = AsyncPietDriver(Picture.open_picture(path, 1), source, sink,
+                             limits=Limits(steps=100))
+    assert run(driver.process()) == Status.STEP_LIMIT
+    assert source.seen[1:] == [b'1' * i for i in range(1, len(source.seen))]
+
+
+def test_long_run_yields_to_event_loop(tmp_path):
+    path = tmp_path / 'loop.png'
+    ring(closed_cycle(['push', 'push', 'add', 'pop'])).save(path)
+
+    async def race():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        driver = AsyncPietDriver(Picture.open_picture(path, 1),
+                                 SlowSource([]), Sink(),
+                                 limits=Limits(steps=20000),
+                                 yield_every=100)
+        status = await driver.process()
+        task.cancel()
+        return status, ticks
+
+    status, ticks = run(race())
+    assert status == Status.STEP_LIMIT
+    assert ticks >= 20000 // 100 - 1
@@ -0,0 +1,72 @@
+from interpreter.batch import (MAX_PROGRAMS, Job, get_program, read_manifest,
+                               run_batch, run_job)
+from interpreter.limits import Limits
+
+import json
+import pytest
+from pathlib import Path
+
+PROGRAM = 'programs/print_TLEN_use_switch.png'
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    input_path = tmp_path / 'input.txt'
+    input_path.write_text('5\n')
+    path = tmp_path / 'manifest.jsonl'
+    program = str(Path(PROGRAM).resolve())
+    lines = [{'id': 'first', 'program': program},
+             {'program': program, 'input': 'input.txt'},
+             {'id': 'missing', 'program': 'missing.png'}]
+    path.write_text('\n'.join(json.dumps(line) for line in lines) + '\n\n')
+    return path
+
+
+def test_read_manifest(manifest, tmp_path):
+    jobs = read_manifest(str(manifest))
+    assert [job.id for job in jobs] == ['first', '2', 'missing']
+    assert jobs[1].input == str(tmp_path / 'input.txt')
+    assert jobs[2].program == str(tmp_path / 'missing.png')
+
+
+def test_run_job():
+    result = run_job(Job('1', PROGRAM))
+    assert result['status'] == 'finished'
+    assert result['stdout'] == 'TLEN'
+    assert result['steps'] > 0
+
+
+def test_program_is_opened_once_per_process():
+    get_program.cache_clear()
+    run_job(Job('1', PROGRAM))
+    program = get_program(PROGRAM, None)
+    run_job(Job('2', PROGRAM))
+    assert get_program(PROGRAM, None) is program
+    assert get_program.cache_info().misses == 1
+
+
+def test_programs_are_evicted(tmp_path):
+    get_program.cache_clear()
+    for number in range(MAX_PROGRAMS + 2):
+        path = tmp_path / f'{number}.png'
+        path.write_bytes(Path(PROGRAM).read_bytes())
+        get_program(str(path), None)
+    assert get_program.cache_info().currsize == MAX_PROGRAMS
+
+
+def test_limits_and_errors():
+    assert run_job(Job('1', PROGRAM), Limits(steps=3))['status'] \
+        == 'step_limit'
+    result = run_job(Job('2', 'missing.png'))
+    assert result['status'] == 'error'
+    assert result['steps'] == 0
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_batch(manifest, workers):
+    results = {result['id']: result
+               for result in run_batch(read_manifest(str(manifest)),
+                                       workers=workers)}
+    assert results['first']['stdout'] == 'TLEN'
+    assert results['2']['status'] == 'finished'
+    assert results['missing']['status'] == 'error'
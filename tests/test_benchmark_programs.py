@@ -0,0 +1,51 @@
+from benchmarks.bench_programs import main
+from benchmarks.programs import PROGRAMS
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+
+def run(driver_class, path):
+    out_stream = io.StringIO()
+    driver = driver_class(Picture.open_picture(path, 1), False,
+                          io.StringIO(), out_stream, io.StringIO(),
+                          Limits(steps=500))
+    status = driver.process_picture()
+    return status, out_stream.getvalue(), list(driver.stack)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_programs_loop_forever(tmp_path, name):
+    generate, _ = PROGRAMS[name]
+    path = str(tmp_path / f'{name}.png')
+    generate(0.02).save(path)
+    status, output, stack = run(PietDriver, path)
+    assert status == Status.STEP_LIMIT
+    assert run(CompiledPietDriver, path) == (status, output, stack)
+
+
+def test_output_loop_prints_lines(tmp_path):
+    path = str(tmp_path / 'output.png')
+    PROGRAMS['output_loop'][0](1).save(path)
+    _, output, stack = run(PietDriver, path)
+    lines = output.strip('\n').split('\n')
+    assert set(lines) == {'1'} and len(lines) >= 500 // 14
+    # стэк не растет от круга к кругу
+    assert len(stack) <= 3
+
+
+def test_profile_overhead_is_recorded(tmp_path):
+    report = main(['--programs', 'output_loop', 'branch_loop',
+                   '--engines', 'compiled', 'profiled', '--scale', '0.05',
+                   '--steps', '2000', '--no-memory',
+                   '-o', str(tmp_path / 'report.json')])
+    assert set(report['profile_overhead']) == {'output_loop', 'branch_loop'}
+    profiled = [result for result in report['results']
+                if result['engine'] == 'profiled']
+    assert [result['steps'] for result in profiled] == [
+        result['steps'] for result in report['results']
+        if result['engine'] == 'compiled']
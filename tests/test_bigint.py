@@ -0,0 +1,69 @@
+from interpreter.bigint import format_int, parse_int
+from interpreter.commands import InInt, OutInt
+from interpreter.transpiler import BIGINT, PRELUDE
+
+import io
+import random
+import pytest
+import sys
+
+
+@pytest.fixture
+def unlimited_digits():
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    yield
+    sys.set_int_max_str_digits(limit)
+
+
+@pytest.mark.parametrize('digits', [1, 10, 2999, 3000, 3001, 4301, 20000])
+def test_round_trip(digits, unlimited_digits):
+    generator = random.Random(digits)
+    text = str(generator.randint(1, 9)) + ''.join(
+        generator.choice('0123456789') for _ in range(digits - 1))
+    value = parse_int(text)
+    assert value == int(text)
+    assert format_int(value) == text
+    assert format_int(-value) == '-' + text
+
+
+def test_leading_zeros_and_other_digits():
+    assert parse_int('0' * 5000 + '42') == 42
+    assert parse_int('٣' * 4000) == int('3' * 4000)
+
+
+def test_beyond_digit_limit():
+    value = 7 ** 20000
+    text = format_int(value)
+    assert len(text) > sys.get_int_max_str_digits()
+    assert parse_int(text) == value
+
+
+def run_in_int(text):
+    stack = []
+    InInt(io.StringIO(text), io.StringIO())(stack, 1, None, None)
+    return stack
+
+
+def test_in_int():
+    assert run_in_int('-' + '9' * 10000 + '\n') == [-(10 ** 10000 - 1)]
+    assert run_in_int('+12\n') == [12]
+    assert run_in_int('12a\n') == []
+    with pytest.raises(ValueError):
+        run_in_int('1²\n')
+
+
+def test_out_int():
+    out_stream = io.StringIO()
+    OutInt(out_stream, io.StringIO())([-(10 ** 10000)], 1, None, None)
+    assert out_stream.getvalue() == '-1' + '0' * 10000
+
+
+def test_transpiled_functions():
+    module = {}
+    exec(BIGINT + PRELUDE, module)
+    stack = []
+    module['in_int'](stack, io.StringIO('5' * 9000 + '\n'))
+    out_stream = io.StringIO()
+    module['out_int'](stack, out_stream)
+    assert out_stream.getvalue() == '5' * 9000
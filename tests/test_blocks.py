@@ -0,0 +1,68 @@
+from interpreter.blocks import BlockMap, LazyBlockMap
+from interpreter.directions import Direction
+from interpreter.picture import Picture
+
+import pytest
+
+
+@pytest.fixture
+def block_map():
+    return BlockMap(Picture.open_picture('tests/test_pictures/test_1.png'))
+
+
+def test_labels_cover_picture(block_map):
+    assert all(label != -1 for label in block_map.labels)
+    assert (sum(len(block) for block in block_map.blocks)
+            == block_map.width * block_map.height)
+
+
+@pytest.mark.parametrize(
+    ('x', 'y', 'size', 'bbox'), [
+        (0, 0, 1, (0, 0, 0, 0)),
+        (1, 0, 16, (0, 0, 6, 4)),
+        (0, 3, 4, (0, 3, 3, 3)),
+        (6, 0, 3, (6, 0, 6, 2)),
+    ]
+)
+def test_block_metadata(block_map, x, y, size, bbox):
+    block = block_map.block_at(x, y)
+    assert len(block) == size
+    assert block.bbox == bbox
+    assert (x, y) in block
+
+
+@pytest.mark.parametrize(
+    ('x', 'y', 'dp', 'expected_xy'), [
+        (4, 3, Direction.RIGHT, (6, 3)),
+        (4, 2, Direction.LEFT, (0, 2)),
+        (4, 3, Direction.DOWN, (4, 4)),
+        (1, 1, Direction.UP, (1, 0)),
+    ]
+)
+def test_uttermost_by_dp(block_map, x, y, dp, expected_xy):
+    block = block_map.block_at(x, y)
+    assert block.uttermost_by_dp(x, y, dp) == expected_xy
+
+
+@pytest.mark.parametrize('map_class', [BlockMap, LazyBlockMap])
+@pytest.mark.parametrize(
+    ('x', 'y', 'direction', 'expected_xy'), [
+        (0, 2, Direction.UP, (0, 2)),
+        (0, 2, Direction.DOWN, (0, 3)),
+        (0, 0, Direction.DOWN, (0, 0)),
+        (1, 3, Direction.UP, (1, 3)),
+        (2, 1, Direction.UP, (2, 0)),
+        (2, 1, Direction.DOWN, (2, 3)),
+        (1, 0, Direction.LEFT, (0, 0)),
+        (1, 0, Direction.RIGHT, (2, 0)),
+        (2, 2, Direction.LEFT, (2, 2)),
+    ]
+)
+def test_uttermost_by_cc_over_gaps(map_class, x, y, direction, expected_xy):
+    # подкова: в столбцах 0 и 1 между коделями блока - другой цвет
+    block_map = map_class(Picture(3, 4, bytes([0, 0, 0,
+                                               1, 1, 0,
+                                               0, 1, 0,
+                                               0, 0, 0])))
+    block = block_map.block_at(x, y)
+    assert block.uttermost_by_cc(x, y, direction) == expected_xy
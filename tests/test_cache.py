@@ -0,0 +1,81 @@
+from interpreter.cache import (ProgramCache, dump_program, interpreter_version,
+                               load_program)
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.program import Program
+from interpreter.piet_driver import PietDriver
+
+import interpreter.cache as cache_module
+import io
+import os
+import pytest
+
+PROGRAM = 'programs/print_TLEN_use_switch.png'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ProgramCache(tmp_path / 'cache')
+
+
+def test_round_trip():
+    program = Program.open_program(PROGRAM)
+    loaded = load_program(dump_program(program))
+    assert loaded.picture.codels == program.picture.codels
+    assert loaded.blocks.labels == program.blocks.labels
+    assert [(len(block), block.bbox, block.rows, block.cols, block.color)
+            for block in loaded.blocks.blocks] == \
+        [(len(block), block.bbox, block.rows, block.cols, block.color)
+         for block in program.blocks.blocks]
+    assert loaded.graph.transitions == program.graph.transitions
+    assert loaded.leaders == program.leaders
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_cached_program_runs(cache, driver_class):
+    cache.open_program(PROGRAM)
+    program = cache.open_program(PROGRAM)
+    out_stream = io.StringIO()
+    driver_class(program.picture, False, io.StringIO(), out_stream,
+                 io.StringIO(), program=program).process_picture()
+    assert out_stream.getvalue() == 'TLEN'
+
+
+def test_hit_does_not_open_picture(cache, monkeypatch):
+    cache.open_program(PROGRAM)
+
+    def fail(*args):
+        raise AssertionError('картинка открыта повторно')
+    monkeypatch.setattr(Program, 'open_program', fail)
+    assert cache.open_program(PROGRAM).picture.width > 0
+
+
+def test_key_depends_on_codel_size(cache):
+    assert cache.key(b'picture', None) != cache.key(b'picture', 1)
+    assert cache.key(b'picture', 1) != cache.key(b'other', 1)
+
+
+def test_key_depends_on_sources(cache, monkeypatch):
+    key = cache.key(b'picture', None)
+    assert interpreter_version() == cache_module.INTERPRETER_VERSION
+    monkeypatch.setattr(cache_module, 'INTERPRETER_VERSION', 'edited')
+    assert cache.key(b'picture', None) != key
+
+
+def test_broken_file_is_replaced(cache):
+    cache.open_program(PROGRAM)
+    path, = cache.directory.glob('*.piet')
+    path.write_bytes(b'PIETC broken')
+    assert cache.open_program(PROGRAM).picture.width > 0
+    assert load_program(path.read_bytes()).picture.width > 0
+
+
+def test_eviction(cache):
+    for i in range(3):
+        cache.directory.mkdir(exist_ok=True)
+        path = cache.path(str(i))
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (i, i))
+    cache.max_size = 250
+    cache.evict()
+    assert sorted(path.stem for path in cache.directory.glob('*.piet')) \
+        == ['1', '2']
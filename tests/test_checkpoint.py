@@ -0,0 +1,158 @@
+from benchmarks.programs import closed_cycle, output_loop, ring
+from interpreter.checkpoint import (Checkpoint, Checkpointer, dump_checkpoint,
+                                    load_checkpoint, open_checkpoint,
+                                    output_position, truncate_output)
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+DRIVERS = [PietDriver, CompiledPietDriver]
+
+
+def run(driver_class, picture, data, limits=None, checkpointer=None,
+        checkpoint=None):
+    output = io.BytesIO()
+    driver = driver_class(picture, False, io.StringIO(data), output,
+                          io.StringIO(), limits, checkpointer=checkpointer)
+    if checkpoint is not None:
+        driver.restore(checkpoint)
+    status = driver.process_picture()
+    return status, output.getvalue(), driver
+
+
+def resume(driver_class, picture, data, stop, tmp_path):
+    path = str(tmp_path / 'state.ckp')
+    status, first, _ = run(driver_class, picture, data, Limits(steps=stop),
+                           Checkpointer(path))
+    assert status == Status.STEP_LIMIT
+    checkpoint = open_checkpoint(path)
+    assert checkpoint.output_offset == len(first)
+    status, rest, driver = run(driver_class, picture, data,
+                               checkpoint=checkpoint)
+    return status, first + rest, driver
+
+
+def test_round_trip():
+    checkpoint = Checkpoint(bytes(range(32)), 12345, 10 ** 9, 7, 3,
+                            [0, -1, 2 ** 100, -(2 ** 70)], 11)
+    assert load_checkpoint(dump_checkpoint(checkpoint)) == checkpoint
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+@pytest.mark.parametrize('stop', [1, 3, 6, 10])
+def test_resume_with_input(driver_class, stop, tmp_path):
+    picture = Picture.open_picture(PROGRAM)
+    _, expected, full = run(driver_class, picture, '5\n3\n')
+    status, output, driver = resume(driver_class, picture, '5\n3\n', stop,
+                                    tmp_path)
+    assert status == Status.FINISHED
+    assert output == expected
+    assert driver.governor is None or \
+        driver.governor.steps == full.governor.steps
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_resume_loop(driver_class, tmp_path):
+    path = tmp_path / 'loop.png'
+    ring(closed_cycle(['push', 'out_int', 'push', 'push', 'add',
+                       'pop'])).save(path)
+    picture = Picture.open_picture(path, 1)
+    _, expected, _ = run(driver_class, picture, '', Limits(steps=3000))
+    checkpoints = str(tmp_path / 'state.ckp')
+    _, first, _ = run(driver_class, picture, '', Limits(steps=1000),
+                      Checkpointer(checkpoints))
+    checkpoint = open_checkpoint(checkpoints)
+    assert checkpoint.steps == 1000
+    status, rest, _ = run(driver_class, picture, '', Limits(steps=3000),
+                          checkpoint=checkpoint)
+    assert status == Status.STEP_LIMIT
+    assert first + rest == expected
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_resume_after_output_limit(driver_class, tmp_path):
+    path = tmp_path / 'output.png'
+    output_loop(1).save(path)
+    picture = Picture.open_picture(path, 1)
+    _, expected, _ = run(driver_class, picture, '', Limits(steps=300))
+    # out_int уже снял значение, когда вывод уперся в ограничение:
+    # остается точка, сохраненная до этого
+    checkpoints = str(tmp_path / 'state.ckp')
+    status, first, _ = run(driver_class, picture, '', Limits(output=7),
+                           Checkpointer(checkpoints, every=20))
+    assert status == Status.OUTPUT_LIMIT
+    checkpoint = open_checkpoint(checkpoints)
+    assert checkpoint.output_offset <= len(first)
+    _, _, stopped = run(driver_class, picture, '',
+                        Limits(steps=checkpoint.steps))
+    assert checkpoint.stack == list(stopped.stack)
+    status, rest, _ = run(driver_class, picture, '', Limits(steps=300),
+                          checkpoint=checkpoint)
+    assert first[:checkpoint.output_offset] + rest == expected
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_resume_appending_to_file(driver_class, tmp_path):
+    # как с >> log: в файле уже есть чужой текст, а вывод первого
+    # исполнения после точки лишний
+    path = tmp_path / 'output.png'
+    output_loop(1).save(path)
+    picture = Picture.open_picture(path, 1)
+    _, expected, _ = run(driver_class, picture, '', Limits(steps=300))
+    log = tmp_path / 'log'
+    log.write_bytes(b'old log\n')
+    checkpoints = str(tmp_path / 'state.ckp')
+    with open(log, 'ab') as stream:
+        driver = driver_class(picture, False, io.StringIO(), stream,
+                              io.StringIO(), Limits(output=7),
+                              checkpointer=Checkpointer(checkpoints,
+                                                        every=20))
+        driver.output_start = output_position(stream)
+        driver.process_picture()
+    checkpoint = open_checkpoint(checkpoints)
+    assert checkpoint.output_start == len(b'old log\n')
+    with open(log, 'ab') as stream:
+        driver = driver_class(picture, False, io.StringIO(), stream,
+                              io.StringIO(), Limits(steps=300))
+        driver.restore(checkpoint)
+        truncate_output(stream, checkpoint.output_start
+                        + checkpoint.output_offset)
+        driver.process_picture()
+    assert log.read_bytes() == b'old log\n' + expected
+
+
+def test_periodic_and_requested_saves(tmp_path):
+    path = str(tmp_path / 'state.ckp')
+    checkpointer = Checkpointer(path, every=4)
+    run(PietDriver, Picture.open_picture(PROGRAM), '5\n3\n',
+        checkpointer=checkpointer)
+    assert open_checkpoint(path).steps % 4 == 0
+    # запрос, как из обработчика сигнала, исполняется после шага
+    checkpointer = Checkpointer(path)
+    checkpointer.request()
+    run(PietDriver, Picture.open_picture(PROGRAM), '5\n3\n',
+        checkpointer=checkpointer)
+    assert not checkpointer.requested
+    assert open_checkpoint(path).steps == 1
+
+
+def test_other_program_is_rejected(tmp_path):
+    path = str(tmp_path / 'state.ckp')
+    run(CompiledPietDriver, Picture.open_picture(PROGRAM), '5\n3\n',
+        Limits(steps=3), Checkpointer(path))
+    with pytest.raises(ValueError):
+        run(CompiledPietDriver, Picture.open_picture('programs/print_(.png'),
+            '', checkpoint=open_checkpoint(path))
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    data = dump_checkpoint(Checkpoint(bytes(32), 1, 2, 3, 4, [5, 6]))
+    with pytest.raises(ValueError):
+        load_checkpoint(data[:-1])
+    with pytest.raises(ValueError):
+        load_checkpoint(b'PIETTRC1' + data[8:])
@@ -0,0 +1,61 @@
+from interpreter.colors import BLACK_INDEX
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+
+def run_driver(driver_class, path, input_text, **kwargs):
+    out_stream = io.StringIO()
+    driver = driver_class(Picture.open_picture(path), False,
+                          io.StringIO(input_text), out_stream,
+                          io.StringIO(), **kwargs)
+    driver.process_picture()
+    return out_stream.getvalue(), driver.stack
+
+
+@pytest.mark.parametrize(
+    ('path', 'input_text'), [
+        ('programs/800-400.png', ''),
+        ('programs/800-400_with_incorrect_color.png', ''),
+        ('programs/print_(.png', ''),
+        ('programs/print_TLEN_use_switch.png', ''),
+        ('programs/Comparsion_int.png', '5\n3\n'),
+        ('programs/Comparsion_int.png', '3\n3\n'),
+        ('programs/Comparsion_int.png', '-3\n3\n'),
+    ]
+)
+@pytest.mark.parametrize('optimize_chains', [True, False])
+def test_same_as_piet_driver(path, input_text, optimize_chains):
+    assert (run_driver(CompiledPietDriver, path, input_text,
+                       optimize_chains=optimize_chains)
+            == run_driver(PietDriver, path, input_text))
+
+
+def test_graph_is_built_ahead():
+    driver = CompiledPietDriver(
+        Picture.open_picture('programs/print_TLEN_use_switch.png'), False,
+        io.StringIO(), io.StringIO(), io.StringIO())
+    transitions = dict(driver.graph.transitions)
+    driver.process_picture()
+    assert driver.graph.transitions == transitions
+
+
+def test_step_by_step_is_rejected():
+    with pytest.raises(ValueError):
+        CompiledPietDriver(Picture.open_picture('programs/print_(.png'),
+                           True, io.StringIO(), io.StringIO(), io.StringIO())
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_start_in_black_block(driver_class):
+    # из черного блока в левом верхнем углу выходят, не проходя по
+    # черным коделям вдоль cc
+    picture = Picture(2, 3, bytes([BLACK_INDEX] * 5 + [0]))
+    driver = driver_class(picture, False, io.StringIO(), io.StringIO(),
+                          io.StringIO(), Limits(steps=100))
+    driver.process_picture()
+    assert driver.governor.steps == 1
@@ -1,7 +1,10 @@
+from interpreter.commands import Greater, InChar
 from interpreter.piet_driver import PietDriver, CodelChooser, Direction
 from interpreter.picture import Picture
 
+import io
 import pytest
+import re
 import sys
 
 
@@ -22,7 +25,7 @@ def driver():
 def test_set_current_block(driver, start_x, start_y, expected_pixels):
     driver.current_pixel = driver.picture[start_x, start_y]
     driver.set_current_block()
-    assert driver.current_block.union(expected_pixels) == expected_pixels
+    assert set(driver.current_block) == expected_pixels
 
 
 @pytest.mark.parametrize(
@@ -96,3 +99,42 @@ def test_find_uttermost_by_cc(driver, start_xy, dp, cc, expected_xy):
     driver.find_uttermost_pixel_by_cc()
     assert (driver.current_pixel.x,
             driver.current_pixel.y) == expected_xy
+
+
+def test_step_by_step_output():
+    error_stream = io.StringIO()
+    driver = PietDriver(
+        Picture.open_picture('programs/print_TLEN_use_switch.png'), True,
+        io.StringIO('\n' * 20), io.StringIO(), error_stream)
+    driver.process_picture()
+    steps = re.findall(r'название: (\w+),\n.*\n\tаргументы: (.*)\n'
+                       r'стэк: (.*)\n', error_stream.getvalue())
+    # как у исходного интерпретатора; проход через белое показывает
+    # прошлую команду
+    assert steps == [
+        ('push', '78', '[78]'), ('push', '69', '[78, 69]'),
+        ('push', '76', '[78, 69, 76]'), ('push', '76', '[78, 69, 76]'),
+        ('push', '84', '[78, 69, 76, 84]'),
+        ('out_char', 'T', '[78, 69, 76]'), ('out_char', 'L', '[78, 69]'),
+        ('out_char', 'E', '[78]'), ('out_char', 'N', '[]'),
+        ('push', '1', '[1]'), ('switch', '1', '[]')]
+
+
+@pytest.mark.parametrize(
+    ('command_class', 'stack', 'arguments'), [
+        (Greater, [3, 5], '(3, 5)'),
+        (InChar, [], 'ы'),
+    ]
+)
+def test_step_by_step_arguments(command_class, stack, arguments):
+    driver = PietDriver(
+        Picture.open_picture('tests/test_pictures/test_1.png'), True,
+        io.StringIO('ы\n'), io.StringIO(), io.StringIO())
+    command = driver.create_command(command_class)
+    driver.stack = stack
+    driver.step_by_step.on_command(driver, command, 1)
+    command(stack, 1, driver.dp, driver.cc)
+    driver.current_command = command
+    driver.step_by_step.show_current_step()
+    assert (f'\tаргументы: {arguments}\n'
+            in driver.error_stream.getvalue())
@@ -0,0 +1,107 @@
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.hooks import Hooks, HookSet
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+DRIVERS = [PietDriver, CompiledPietDriver]
+
+
+class Recorder(Hooks):
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, driver, state):
+        self.events.append(('start', state))
+
+    def on_step(self, driver, state, count):
+        self.events.append(('step', state, count))
+
+    def on_command(self, driver, command, block_size):
+        self.events.append(('command', command.name,
+                            command.peek_arguments(driver.stack,
+                                                   block_size)))
+
+    def on_io(self, driver, command, value):
+        self.events.append(('io', command.name, value))
+
+    def on_terminate(self, driver, status):
+        self.events.append(('terminate', status))
+
+
+class OnlyIO(Hooks):
+    def __init__(self):
+        self.values = []
+
+    def on_io(self, driver, command, value):
+        self.values.append((command.name, value))
+
+
+def run(driver_class, hooks, data='5\n3\n', limits=None):
+    output = io.StringIO()
+    driver = driver_class(Picture.open_picture(PROGRAM), False,
+                          io.StringIO(data), output, io.StringIO(), limits,
+                          hooks=hooks)
+    return driver.process_picture(), output.getvalue(), driver
+
+
+def test_engines_report_the_same_events():
+    expected = Recorder()
+    run(PietDriver, [expected])
+    recorder = Recorder()
+    run(CompiledPietDriver, [recorder])
+    assert recorder.events == expected.events
+    assert expected.events[0][0] == 'start'
+    assert expected.events[-1] == ('terminate', Status.FINISHED)
+    assert ('io', 'in_int', 5) in expected.events
+    assert ('io', 'out_int', 1) in expected.events
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_steps_are_counted(driver_class):
+    recorder = Recorder()
+    status, _, driver = run(driver_class, [recorder], limits=Limits(steps=7))
+    assert status == Status.STEP_LIMIT
+    steps = [event for event in recorder.events if event[0] == 'step']
+    assert sum(event[2] for event in steps) == driver.governor.steps == 7
+    assert recorder.events[-1] == ('terminate', Status.STEP_LIMIT)
+
+
+def test_terminate_on_error():
+    recorder = Recorder()
+    with pytest.raises(SystemExit):
+        run(PietDriver, [recorder], data='x\n')
+    assert recorder.events[-1] == ('terminate', None)
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_io_hooks_keep_chains(driver_class, monkeypatch):
+    hook = OnlyIO()
+    if driver_class is CompiledPietDriver:
+        monkeypatch.setattr(CompiledPietDriver, 'run_transitions',
+                            pytest.fail)
+    _, output, _ = run(driver_class, [hook])
+    assert output == '1'
+    assert hook.values == [('in_int', 5), ('in_int', 3), ('out_int', 1)]
+
+
+@pytest.mark.parametrize('driver_class, method', [
+    (PietDriver, 'run_observed_steps'),
+    (CompiledPietDriver, 'run_observed_transitions')])
+def test_without_hooks_plain_loop(driver_class, method, monkeypatch):
+    monkeypatch.setattr(driver_class, method, pytest.fail)
+    _, output, _ = run(driver_class, [], limits=Limits(steps=1000))
+    assert output == '1'
+
+
+def test_only_overridden_methods_are_called():
+    hooks = HookSet([OnlyIO(), None])
+    assert len(hooks.io) == 1
+    assert not (hooks.start or hooks.step or hooks.command
+                or hooks.terminate)
+    assert not hooks.every_step
+    assert not HookSet([])
@@ -0,0 +1,137 @@
+from benchmarks.programs import bigint_growth
+from interpreter.commands import COMMANDS, Mod, Roll
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.graph import Transition
+from interpreter.int64 import (INT64_BOUNDS, INT64_COMMANDS, INT64_MAX,
+                               INT64_MIN, Int64Stack, wrap)
+from interpreter.limits import LimitExceeded, Limits, Status
+from interpreter.optimizer import Operation, PushValues, optimize
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+KEYS = {command.name: key for key, command in COMMANDS.items()}
+PROGRAMS = [('programs/Comparsion_int.png', '5\n3\n'),
+            ('programs/Comparsion_int.png', '-4\n-4\n'),
+            ('programs/print_(.png', ''),
+            ('programs/print_TLEN_use_switch.png', ''),
+            ('programs/800-400.png', '')]
+
+
+def execute(name, stack, *arguments):
+    command = INT64_COMMANDS[KEYS[name]]
+    if name == 'in_int':
+        command = command(io.StringIO(arguments[0]), io.StringIO())
+    else:
+        command = command()
+    command(stack, 1, None, None)
+    return stack
+
+
+@pytest.mark.parametrize('name, values, expected', [
+    ('add', [INT64_MAX, 1], [INT64_MIN]),
+    ('subtract', [INT64_MIN, 1], [INT64_MAX]),
+    ('multiply', [1 << 62, 4], [0]),
+    ('multiply', [-3, 5], [-15]),
+    ('divide', [INT64_MIN, -1], [INT64_MIN]),
+    ('divide', [-7, 2], [-4]),
+    ('mod', [-7, 2], [1]),
+    ('mod', [7, INT64_MIN], [7]),
+    ('greater', [INT64_MAX, INT64_MIN], [1]),
+])
+def test_wrap(name, values, expected):
+    assert execute(name, Int64Stack(values), '') == expected
+
+
+@pytest.mark.parametrize('name, values', [
+    ('add', [INT64_MAX, 1]), ('subtract', [INT64_MIN, 1]),
+    ('multiply', [1 << 32, 1 << 31]), ('divide', [INT64_MIN, -1])])
+def test_trap_keeps_arguments(name, values):
+    stack = Int64Stack(values, 'trap')
+    with pytest.raises(LimitExceeded):
+        execute(name, stack)
+    assert stack == values
+
+
+def test_in_int():
+    assert execute('in_int', Int64Stack(), '-9223372036854775808\n') == \
+        [INT64_MIN]
+    assert execute('in_int', Int64Stack(), '9223372036854775808\n') == \
+        [INT64_MIN]
+    with pytest.raises(LimitExceeded):
+        execute('in_int', Int64Stack(overflow='trap'), '1' * 30 + '\n')
+
+
+def test_division_by_zero():
+    with pytest.raises(ZeroDivisionError):
+        execute('divide', Int64Stack([1, 0]))
+    with pytest.raises(ZeroDivisionError):
+        Mod()(Int64Stack([1, 0]), 1, None, None)
+
+
+@pytest.mark.parametrize('depth, count', [
+    (3, 1), (3, -1), (5, 2), (5, 5), (2, 7), (8, 1), (9, 3)])
+def test_roll_matches_list(depth, count):
+    values = list(range(1, 9))
+    expected = values + [depth, count]
+    Roll()(expected, 1, None, None)
+    stack = Int64Stack(values + [depth, count])
+    Roll()(stack, 1, None, None)
+    assert stack == expected
+
+
+def test_wrap_function():
+    assert wrap(INT64_MAX + 1) == INT64_MIN
+    assert wrap(-(1 << 64) + 5) == 5
+    assert wrap(123) == 123
+
+
+def test_overflowing_constants_are_not_folded():
+    transitions = [Transition(KEYS[name], size, 0, 0, 0, 0)
+                   for name, size in [('push', 1 << 40), ('push', 1 << 40),
+                                      ('multiply', 1), ('push', 2),
+                                      ('add', 1)]]
+    assert optimize(transitions, COMMANDS) == \
+        [Operation(PushValues, ((1 << 80) + 2,))]
+    operations = optimize(transitions, COMMANDS, INT64_BOUNDS)
+    assert operations[0] == Operation(PushValues, (1 << 40, 1 << 40))
+    assert operations[1].command is COMMANDS[KEYS['multiply']]
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+@pytest.mark.parametrize('path, data', PROGRAMS)
+def test_same_output_on_small_numbers(driver_class, path, data):
+    outputs = []
+    for int64 in (None, 'wrap', 'trap'):
+        output = io.StringIO()
+        driver_class(Picture.open_picture(path), False, io.StringIO(data),
+                     output, io.StringIO(), Limits(steps=5000),
+                     int64=int64).process_picture()
+        outputs.append(output.getvalue())
+    assert outputs[1] == outputs[2] == outputs[0]
+
+
+def test_growth(tmp_path):
+    path = tmp_path / 'growth.png'
+    bigint_growth(1).save(path)
+    picture = Picture.open_picture(path, 1)
+    stacks = []
+    for options in ({}, {'optimize_chains': False}):
+        driver = CompiledPietDriver(picture, False, io.StringIO(),
+                                    io.StringIO(), io.StringIO(),
+                                    Limits(steps=1000), int64='wrap',
+                                    **options)
+        assert driver.process_picture() == Status.STEP_LIMIT
+        stacks.append(list(driver.stack))
+    # те же значения, что у длинных чисел, по модулю 2 ** 64
+    driver = CompiledPietDriver(picture, False, io.StringIO(),
+                                io.StringIO(), io.StringIO(),
+                                Limits(steps=1000))
+    driver.process_picture()
+    assert stacks[0] == stacks[1] == [wrap(value) for value in driver.stack]
+    trapped = PietDriver(picture, False, io.StringIO(), io.StringIO(),
+                         io.StringIO(), Limits(steps=1000), int64='trap')
+    assert trapped.process_picture() == Status.INT_LIMIT
+    assert all(INT64_MIN <= value <= INT64_MAX for value in trapped.stack)
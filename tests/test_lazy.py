@@ -0,0 +1,123 @@
+from benchmarks.programs import decorated_loop
+from interpreter.blocks import BlockMap, LazyBlockMap
+from interpreter.colors import BLACK_INDEX, WHITE_INDEX
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.program import Program
+from interpreter.tracing_driver import TracingPietDriver
+
+import io
+import random
+import pytest
+
+DRIVERS = [PietDriver, CompiledPietDriver, TracingPietDriver]
+PROGRAMS = [('programs/Comparsion_int.png', '5\n3\n'),
+            ('programs/print_(.png', ''),
+            ('programs/print_TLEN_use_switch.png', ''),
+            ('programs/800-400.png', '')]
+
+
+def random_picture(seed):
+    rnd = random.Random(seed)
+    width, height = rnd.randint(2, 10), rnd.randint(1, 8)
+    colors = rnd.sample(range(18), rnd.randint(2, 6)) \
+        + [WHITE_INDEX, BLACK_INDEX] * rnd.randint(0, 2)
+    codels = bytes(rnd.choice(colors) for _ in range(width * height))
+    data = ''.join(f'{rnd.randint(-5, 9)}\n' for _ in range(20))
+    return Picture(width, height, codels), data
+
+
+def run(driver_class, picture, data, lazy, steps=2000):
+    output = io.StringIO()
+    driver = driver_class(picture, False, io.StringIO(data), output,
+                          io.StringIO(), Limits(steps=steps), lazy=lazy)
+    try:
+        status = driver.process_picture()
+    except (Exception, SystemExit) as error:
+        return type(error).__name__, output.getvalue()
+    return status, output.getvalue(), list(driver.stack), driver.get_state()
+
+
+def test_only_touched_blocks_are_labeled():
+    picture = Picture(4, 2, bytes([0, 0, 1, 2,
+                                   0, 3, 1, 2]))
+    blocks = LazyBlockMap(picture)
+    assert blocks.labels.labeled() == 0
+    block = blocks.block_at(0, 1)
+    assert (block.size, block.bbox) == (3, (0, 0, 1, 1))
+    assert blocks.labels.labeled() == 3
+    assert blocks.block_at(1, 0) is block
+    assert len(blocks.blocks) == 1
+    with pytest.raises(IndexError):
+        blocks.labels[8]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_same_partition(seed):
+    picture, _ = random_picture(seed)
+    lazy, eager = LazyBlockMap(picture), BlockMap(picture)
+    assert [(lazy.blocks[label].size, lazy.blocks[label].bbox)
+            for label in lazy.labels] == \
+        [(eager.blocks[label].size, eager.blocks[label].bbox)
+         for label in eager.labels]
+    assert lazy.labels.labeled() == picture.width * picture.height
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+@pytest.mark.parametrize('path, data', PROGRAMS)
+def test_same_as_eager(driver_class, path, data):
+    picture = Picture.open_picture(path)
+    assert run(driver_class, picture, data, True) == \
+        run(driver_class, picture, data, False)
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+@pytest.mark.parametrize('seed', range(30))
+def test_random_same_as_eager(driver_class, seed):
+    picture, data = random_picture(seed)
+    assert run(driver_class, picture, data, True) == \
+        run(driver_class, picture, data, False)
+
+
+def test_transitions_on_demand():
+    picture = Picture.open_picture('programs/Comparsion_int.png')
+    program = Program(picture, lazy=True)
+    assert program.graph.transitions == {}
+    driver = CompiledPietDriver(picture, False, io.StringIO('5\n3\n'),
+                                io.StringIO(), io.StringIO(),
+                                program=program)
+    driver.process_picture()
+    eager = Program(picture)
+    assert program.graph.transitions
+    for state, transition in program.graph.transitions.items():
+        assert eager.graph.transitions[state] == transition
+
+
+@pytest.mark.parametrize('driver_class', DRIVERS)
+def test_update_picture(driver_class):
+    picture = Picture.open_picture('programs/Comparsion_int.png')
+    square = picture.region(2, 0, 3, 3)
+    broken = picture.paint({codel: BLACK_INDEX for codel in square})
+    output = io.StringIO()
+    driver = driver_class(broken, False, io.StringIO('5\n3\n'), output,
+                          io.StringIO(), Limits(steps=10 ** 4), lazy=True)
+    driver.process_picture()
+    assert output.getvalue() == ''
+    driver.update_picture(picture, square)
+    driver.restart()
+    driver.process_picture()
+    assert output.getvalue() == '1'
+
+
+def test_large_picture_stays_unlabeled(tmp_path):
+    path = tmp_path / 'decorated.png'
+    decorated_loop(0.2).save(path)
+    picture = Picture.open_picture(path, 1)
+    driver = CompiledPietDriver(picture, False, io.StringIO(),
+                                io.StringIO(), io.StringIO(),
+                                Limits(steps=1000), lazy=True)
+    driver.process_picture()
+    size = picture.width * picture.height
+    assert driver.blocks.labels.labeled() < size // 10
@@ -0,0 +1,94 @@
+from benchmarks.programs import closed_cycle, ring
+from interpreter.commands import Pointer, Switch
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.directions import CodelChooser, Direction
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import io
+import pytest
+
+PROGRAM = 'programs/print_TLEN_use_switch.png'
+
+
+def run_driver(driver_class, limits, path=PROGRAM):
+    out_stream = io.StringIO()
+    driver = driver_class(Picture.open_picture(path), False,
+                          io.StringIO(), out_stream, io.StringIO(), limits)
+    status = driver.process_picture()
+    return status, out_stream.getvalue(), driver.stack
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_no_limits_reached(driver_class):
+    assert run_driver(driver_class, Limits()) == (Status.FINISHED, 'TLEN',
+                                                  [])
+
+
+@pytest.mark.parametrize('steps', range(0, 40, 3))
+@pytest.mark.parametrize('path', [PROGRAM, 'programs/800-400.png'])
+def test_step_limit_is_exact(steps, path):
+    expected = run_driver(PietDriver, Limits(steps=steps), path)
+    assert run_driver(CompiledPietDriver, Limits(steps=steps),
+                      path) == expected
+
+
+def test_step_count():
+    driver = CompiledPietDriver(Picture.open_picture(PROGRAM), False,
+                                io.StringIO(), io.StringIO(), io.StringIO(),
+                                Limits())
+    driver.process_picture()
+    interpreted = PietDriver(Picture.open_picture(PROGRAM), False,
+                             io.StringIO(), io.StringIO(), io.StringIO(),
+                             Limits())
+    interpreted.process_picture()
+    assert driver.governor.steps == interpreted.governor.steps > 0
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+@pytest.mark.parametrize(
+    ('limits', 'status'), [
+        (Limits(steps=3), Status.STEP_LIMIT),
+        (Limits(seconds=-1), Status.TIME_LIMIT),
+        (Limits(stack=1, check_every=1), Status.STACK_LIMIT),
+        (Limits(int_bits=6), Status.INT_LIMIT),
+        (Limits(output=2), Status.OUTPUT_LIMIT),
+    ]
+)
+def test_limit_status(driver_class, limits, status):
+    assert run_driver(driver_class, limits)[0] == status
+
+
+def test_output_is_cut_at_limit():
+    assert run_driver(CompiledPietDriver, Limits(output=3))[1] == 'TLE'
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_stack_doubling_roll_is_stopped(driver_class, tmp_path):
+    # roll с count % depth == 0 почти удваивает стэк за шаг: ограничение
+    # срабатывает до этого шага, а не на периодической проверке
+    path = tmp_path / 'doubling.png'
+    ring(closed_cycle(['push', 'push', 'push', 'push', 'add', 'push', 'push',
+                       'add', 'roll'])).save(path)
+    driver = driver_class(Picture.open_picture(path, 1), False,
+                          io.StringIO(), io.StringIO(), io.StringIO(),
+                          Limits(stack=1000))
+    assert driver.process_picture() == Status.STACK_LIMIT
+    assert len(driver.stack) <= 1000
+    assert driver.governor.steps < 200
+
+
+@pytest.mark.parametrize('turns', [-5, -4, -1, 0, 1, 2, 3, 7])
+def test_pointer_and_switch_turns(turns):
+    dp, cc = Direction.RIGHT, CodelChooser.LEFT
+    expected_dp, expected_cc = dp, cc
+    for _ in range(abs(turns)):
+        expected_dp = expected_dp.next(turns > 0)
+        expected_cc = expected_cc.next()
+    assert Pointer()([turns], 1, dp, cc) == expected_dp
+    assert Switch()([turns], 1, dp, cc) == expected_cc
+    # огромное число поворотов - за O(1)
+    big = turns + 4 * 10 ** 30
+    assert Pointer()([big], 1, dp, cc) == expected_dp
+    assert Switch()([big], 1, dp, cc) == expected_cc
@@ -0,0 +1,140 @@
+from PIL import Image
+
+from benchmarks.programs import decorated_loop
+
+from interpreter.colors import PALETTE
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.mapped import (MappedCodels, is_mapped, open_mapped,
+                                save_grid)
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+
+import interpreter.mapped as mapped
+import io
+import pytest
+
+PATHS = ['tests/test_pictures/palette.png', 'tests/test_pictures/test_1.png',
+         'programs/800-400_with_incorrect_color.png',
+         'programs/Comparsion_int.png']
+
+
+def save_pam(path, file_name):
+    with Image.open(path) as pic:
+        pic = pic.convert('RGBA')
+        with open(file_name, 'wb') as stream:
+            stream.write(b'P7\nWIDTH %d\nHEIGHT %d\nDEPTH 4\nMAXVAL 255\n'
+                         b'TUPLTYPE RGB_ALPHA\nENDHDR\n' % pic.size)
+            stream.write(pic.tobytes())
+
+
+def save_ppm(path, file_name):
+    with Image.open(path) as pic:
+        pic.convert('RGB').save(file_name, 'PPM')
+
+
+@pytest.mark.parametrize('path', PATHS)
+@pytest.mark.parametrize('save', [save_ppm, save_pam])
+def test_same_codels_as_png(tmp_path, path, save):
+    expected = Picture.open_picture(path)
+    save(path, tmp_path / 'picture')
+    picture = Picture.open_picture(tmp_path / 'picture')
+    assert isinstance(picture.codels, MappedCodels)
+    assert (picture.width, picture.height) == \
+        (expected.width, expected.height)
+    assert bytes(picture.codels) == expected.codels
+
+
+def test_other_ppm_is_read_by_pil(tmp_path):
+    # 1 бит на канал: красный, белый
+    path = tmp_path / 'picture.ppm'
+    path.write_bytes(b'P6\n2 1\n1\n' + bytes([1, 0, 0, 1, 1, 1]))
+    assert not is_mapped(path)
+    picture = Picture.open_picture(path, 1)
+    assert [PALETTE[codel] for codel in picture.codels] == \
+        [(255, 0, 0), (255, 255, 255)]
+    # 16 бит на канал
+    path.write_bytes(b'P6\n2 1\n65535\n' + bytes(12))
+    assert not is_mapped(path)
+    assert [PALETTE[codel] for codel in
+            Picture.open_picture(path, 1).codels] == [(0, 0, 0)] * 2
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_grid_round_trip(tmp_path, path):
+    expected = Picture.open_picture(path)
+    save_grid(expected, tmp_path / 'picture.grid')
+    picture = Picture.open_picture(tmp_path / 'picture.grid')
+    assert (picture.width, picture.height) == \
+        (expected.width, expected.height)
+    assert bytes(picture.codels) == expected.codels
+
+
+def test_tiles_are_bounded(tmp_path):
+    path = 'programs/800-400.png'
+    save_ppm(path, tmp_path / 'picture.ppm')
+    picture = open_mapped(tmp_path / 'picture.ppm', 1)
+    codels = picture.codels
+    codels.tile_rows, codels.tile_size, codels.max_tiles = \
+        1, picture.width, 3
+    with Image.open(path) as pic:
+        expected = Picture.open_picture(path, 1).codels
+        assert pic.size == (picture.width, picture.height)
+    assert [codels[i] for i in range(len(codels))] == list(expected)
+    assert len(codels.tiles) == 3
+    assert codels[-1] == expected[-1]
+    with pytest.raises(IndexError):
+        codels[len(codels)]
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_large_picture_is_read_where_explored(tmp_path, driver_class):
+    # цикл в углу картинки 1000x1000: ни размер коделя, ни разметка не
+    # читают всю картинку
+    decorated_loop(1).save(tmp_path / 'picture.ppm')
+    picture = Picture.open_picture(tmp_path / 'picture.ppm')
+    codels = picture.codels
+    assert codels.codel_size == 1
+    driver = driver_class(picture, False, io.StringIO(), io.StringIO(),
+                          io.StringIO(), Limits(steps=1000))
+    driver.process_picture()
+    assert driver.governor.steps == 1000
+    assert len(codels.tiles) <= 2 < len(codels) // codels.tile_size
+    assert driver.blocks.labels.labeled() < codels.tile_size
+
+
+def test_codel_size_from_prefix_is_verified(tmp_path, monkeypatch):
+    # первые две строки - квадраты 2x2, дальше - нет
+    red, green = bytes([255, 0, 0]), bytes([0, 255, 0])
+    rows = [red * 2 + green * 2] * 2 + [red + green + red + green] * 2
+    (tmp_path / 'picture.ppm').write_bytes(b'P6\n4 4\n255\n'
+                                           + b''.join(rows))
+    monkeypatch.setattr(mapped, 'PREFIX_CODELS', 8)
+    picture = Picture.open_picture(tmp_path / 'picture.ppm')
+    codels = picture.codels
+    assert codels.codel_size == 2
+    codels.tile_rows, codels.tile_size = 1, picture.width
+    assert codels[0] != codels[1]
+    with pytest.raises(ValueError):
+        codels[2]
+
+
+def test_program_runs_from_ppm(tmp_path):
+    save_ppm('programs/Comparsion_int.png', tmp_path / 'picture.ppm')
+    out_stream = io.StringIO()
+    CompiledPietDriver(Picture.open_picture(tmp_path / 'picture.ppm'),
+                       False, io.StringIO('5\n3\n'), out_stream,
+                       io.StringIO()).process_picture()
+    assert out_stream.getvalue() == '1'
+
+
+@pytest.mark.parametrize('content', [
+    b'P6\n2 2\n255\n' + bytes(5),
+    b'P7\nWIDTH 2\nHEIGHT 2\nDEPTH 1\nMAXVAL 255\nENDHDR\n' + bytes(4),
+    b'P6\nx 2\n255\n',
+])
+def test_bad_files(tmp_path, content):
+    # обрезанный файл отвергает mmap, остальные - PIL
+    (tmp_path / 'bad.ppm').write_bytes(content)
+    with pytest.raises((ValueError, OSError)):
+        Picture.open_picture(tmp_path / 'bad.ppm')
@@ -0,0 +1,90 @@
+from interpreter.commands import (COMMANDS, Push, Pop, Add, Multiply,
+                                  Duplicate, Divide, Roll, Not)
+from interpreter.graph import Transition
+from interpreter.optimizer import (ConstantOperation, Operation, PushValues,
+                                   optimize)
+
+import random
+import pytest
+
+KEYS = {command: key for key, command in COMMANDS.items()}
+STRAIGHT_KEYS = [key for key, command in COMMANDS.items()
+                 if command.name not in ('pointer', 'switch', 'in_int',
+                                         'in_char', 'out_int', 'out_char')]
+
+
+def make_transitions(commands):
+    return [Transition(KEYS[command], size, 0, 0, 0, 0)
+            for command, size in commands]
+
+
+def run_commands(stack, commands):
+    for command, size in commands:
+        command()(stack, size, None, None)
+    return stack
+
+
+def run_operations(stack, operations):
+    for operation in operations:
+        if operation.command is PushValues:
+            command = PushValues(operation.argument)
+        elif operation.command is ConstantOperation:
+            command = ConstantOperation(*operation.argument)
+        else:
+            command = operation.command()
+        command(stack, operation.argument, None, None)
+    return stack
+
+
+def test_constants_are_folded():
+    operations = optimize(make_transitions(
+        [(Push, 3), (Push, 4), (Multiply, 1), (Push, 2), (Add, 1),
+         (Duplicate, 1)]), COMMANDS)
+    assert operations == [Operation(PushValues, (14, 14))]
+
+
+def test_constant_operation():
+    operations = optimize(make_transitions([(Push, 5), (Add, 1)]), COMMANDS)
+    assert operations == [Operation(ConstantOperation, (Add, 5))]
+    assert run_operations([], operations) == [5]
+    assert run_operations([1, 2], operations) == [1, 7]
+
+
+def test_duplicate_pop_removed():
+    operations = optimize(make_transitions(
+        [(Duplicate, 1), (Pop, 1), (Not, 1)]), COMMANDS)
+    assert operations == [Operation(Not, 1)]
+
+
+def test_division_by_zero_is_kept():
+    operations = optimize(make_transitions(
+        [(Push, 1), (Push, 0), (Push, 1), (Pop, 1), (Divide, 1)]), COMMANDS)
+    with pytest.raises(ZeroDivisionError):
+        run_operations([], operations)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_same_stack_as_commands(seed):
+    generator = random.Random(seed)
+    commands = [(COMMANDS[generator.choice(STRAIGHT_KEYS)],
+                 generator.randint(0, 4))
+                for _ in range(generator.randint(1, 12))]
+    start = [generator.randint(-3, 5)
+             for _ in range(generator.randint(0, 4))]
+    try:
+        expected = run_commands(list(start), commands)
+    except ZeroDivisionError:
+        expected = ZeroDivisionError
+    operations = optimize(make_transitions(commands), COMMANDS)
+    try:
+        actual = run_operations(list(start), operations)
+    except ZeroDivisionError:
+        actual = ZeroDivisionError
+    assert actual == expected
+
+
+def test_roll_is_folded():
+    operations = optimize(make_transitions(
+        [(Push, 1), (Push, 2), (Push, 3), (Push, 3), (Push, 1),
+         (Roll, 1)]), COMMANDS)
+    assert operations == [Operation(PushValues, (3, 1, 2))]
@@ -0,0 +1,58 @@
+from PIL import Image
+
+from interpreter.colors import Color, WHITE_INDEX, BLACK_INDEX
+from interpreter.picture import Picture
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    'path', [
+        'tests/test_pictures/palette.png',
+        'tests/test_pictures/test_1.png',
+        'programs/800-400_with_incorrect_color.png',
+    ]
+)
+def test_same_colors_as_getpixel(path):
+    picture = Picture.open_picture(path)
+    with Image.open(path) as pic:
+        assert (picture.width, picture.height) == pic.size
+        for x in range(pic.size[0]):
+            for y in range(pic.size[1]):
+                assert picture[x, y].color == Color(pic.getpixel((x, y)))
+
+
+def test_palette_mode(tmp_path):
+    path = 'tests/test_pictures/palette.png'
+    with Image.open(path) as pic:
+        pic = pic.convert('P', palette=Image.Palette.ADAPTIVE)
+        pic.save(tmp_path / 'palette.png')
+    assert (Picture.open_picture(tmp_path / 'palette.png').codels
+            == Picture.open_picture(path).codels)
+
+
+def test_unknown_color_is_white(tmp_path):
+    pic = Image.new('RGB', (3, 1))
+    pic.putdata([(0, 0, 0), (1, 2, 3), (192, 0, 1)])
+    pic.save(tmp_path / 'unknown.png')
+    picture = Picture.open_picture(tmp_path / 'unknown.png')
+    assert list(picture.codels) == [BLACK_INDEX, WHITE_INDEX, WHITE_INDEX]
+
+
+@pytest.mark.parametrize('codel_size', [1, 2, 5])
+def test_detect_codel_size(tmp_path, codel_size):
+    path = 'programs/print_TLEN_use_switch.png'
+    with Image.open(path) as pic:
+        pic.resize((pic.size[0] * codel_size, pic.size[1] * codel_size),
+                   Image.Resampling.NEAREST).save(tmp_path / 'scaled.png')
+    scaled = Picture.open_picture(tmp_path / 'scaled.png')
+    picture = Picture.open_picture(path)
+    assert (scaled.width, scaled.height) == (picture.width, picture.height)
+    assert scaled.codels == picture.codels
+
+
+def test_explicit_codel_size():
+    picture = Picture.open_picture('tests/test_pictures/palette.png', 1)
+    assert (picture.width, picture.height) == (8, 5)
+    with pytest.raises(ValueError):
+        Picture.open_picture('tests/test_pictures/palette.png', 3)
@@ -0,0 +1,78 @@
+from interpreter.blocks import BlockMap
+from interpreter.colors import BLACK_INDEX, WHITE_INDEX
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.program import Program
+
+import io
+import random
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+
+
+def random_picture(rnd):
+    width, height = rnd.randint(2, 9), rnd.randint(2, 9)
+    colors = rnd.sample(range(18), 3) + [WHITE_INDEX, BLACK_INDEX]
+    codels = bytes(rnd.choice(colors) for _ in range(width * height))
+    return Picture(width, height, codels), colors
+
+
+def partition(blocks):
+    groups = {}
+    for codel, label in enumerate(blocks.labels):
+        groups.setdefault(label, []).append(codel)
+    return sorted(
+        (tuple(codels), blocks.blocks[label].size,
+         blocks.blocks[label].bbox, blocks.blocks[label].color,
+         sorted(blocks.blocks[label].rows.items()),
+         sorted(blocks.blocks[label].cols.items()))
+        for label, codels in groups.items())
+
+
+def test_region_and_diff():
+    picture = Picture(4, 3, bytes(12))
+    assert picture.region(2, 1, 5, 5) == [6, 7, 10, 11]
+    assert picture.region(-1, -1, 2, 2) == [0]
+    painted = picture.paint({5: WHITE_INDEX, 11: BLACK_INDEX})
+    assert picture.diff(painted) == [5, 11]
+    assert picture.diff(painted, picture.region(0, 0, 2, 2)) == [5]
+    assert painted.diff(painted) == []
+    with pytest.raises(ValueError):
+        picture.diff(Picture(3, 4, bytes(12)))
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_update_matches_new_analysis(seed):
+    rnd = random.Random(seed)
+    picture, colors = random_picture(rnd)
+    program = Program(picture)
+    for _ in range(5):
+        codels = rnd.sample(range(len(picture.codels)), rnd.randint(1, 4))
+        painted = picture.paint({codel: rnd.choice(colors)
+                                 for codel in codels})
+        program.update(painted, picture.diff(painted))
+        picture = painted
+        fresh = Program(picture)
+        assert partition(program.blocks) == partition(BlockMap(picture))
+        assert program.graph.transitions == fresh.graph.transitions
+        assert program.leaders == fresh.leaders
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_update_picture_and_restart(driver_class):
+    picture = Picture.open_picture(PROGRAM)
+    # программа, испорченная черным квадратом
+    square = picture.region(2, 0, 3, 3)
+    broken = picture.paint({codel: BLACK_INDEX for codel in square})
+    output = io.StringIO()
+    driver = driver_class(broken, False, io.StringIO('5\n3\n'), output,
+                          io.StringIO(), Limits(steps=10 ** 4))
+    driver.process_picture()
+    assert output.getvalue() == ''
+    driver.update_picture(picture, square)
+    driver.restart()
+    driver.process_picture()
+    assert output.getvalue() == '1'
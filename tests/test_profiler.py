@@ -0,0 +1,71 @@
+from interpreter.commands import OutChar
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.mapped import save_grid
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.profiler import Profiler, write_profile
+
+import io
+import pytest
+from PIL import Image
+
+PROGRAM = 'programs/print_TLEN_use_switch.png'
+
+
+def profile(driver_class, path=PROGRAM, **kwargs):
+    profiler = Profiler()
+    driver = driver_class(Picture.open_picture(path), False,
+                          io.StringIO('5\n3\n'), io.StringIO(),
+                          io.StringIO(), profiler=profiler, **kwargs)
+    driver.process_picture()
+    return profiler, driver
+
+
+@pytest.mark.parametrize('path', ['programs/Comparsion_int.png', PROGRAM])
+@pytest.mark.parametrize('optimize_chains', [True, False])
+def test_engines_count_the_same(path, optimize_chains):
+    expected, _ = profile(PietDriver, path)
+    profiler, _ = profile(CompiledPietDriver, path,
+                          optimize_chains=optimize_chains)
+    assert profiler.moves == expected.moves
+
+
+def test_counts():
+    profiler, driver = profile(PietDriver)
+    assert profiler.steps() == 11
+    assert profiler.commands == {'push': 5, 'out_char': 4, 'white': 1,
+                                 'switch': 1}
+    assert profiler.blocks[driver.blocks.block_id(0, 0)] == 1
+    # время считается на потоках, команды ввода-вывода не обернуты
+    assert profiler.io_time > 0
+    assert type(driver.create_command(OutChar)) is OutChar
+
+
+def test_report_and_heatmap(tmp_path):
+    profiler, driver = profile(CompiledPietDriver)
+    prefix = str(tmp_path / 'program')
+    write_profile(profiler, driver.blocks, driver.picture, PROGRAM, prefix)
+    report = (tmp_path / 'program.profile.txt').read_text(encoding='utf-8')
+    assert report.startswith('шагов: 11\n')
+    assert 'out_char' in report
+    with Image.open(PROGRAM) as original, \
+            Image.open(tmp_path / 'program.profile.png') as heatmap:
+        assert heatmap.size == original.size
+        # выполненный блок закрашен, белый фон остается белым
+        red, green, blue, _ = heatmap.getpixel((0, 0))
+        assert green < red or green < blue
+        assert heatmap.getpixel((5, 5)) == (255, 255, 255, 255)
+
+
+def test_heatmap_of_grid_file(tmp_path):
+    # файл коделей PIL не читает, фон рисуется по коделям
+    path = str(tmp_path / 'program.grid')
+    save_grid(Picture.open_picture(PROGRAM), path)
+    profiler, driver = profile(CompiledPietDriver, path)
+    prefix = str(tmp_path / 'program')
+    write_profile(profiler, driver.blocks, driver.picture, path, prefix)
+    with Image.open(tmp_path / 'program.profile.png') as heatmap:
+        assert heatmap.size == (driver.picture.width, driver.picture.height)
+        red, green, blue, _ = heatmap.getpixel((0, 0))
+        assert green < red or green < blue
+        assert heatmap.getpixel((5, 5)) == (255, 255, 255, 255)
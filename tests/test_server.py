@@ -0,0 +1,120 @@
+from interpreter.limits import Limits
+from interpreter.server import ProgramServer
+
+import asyncio
+import base64
+import hashlib
+import json
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+
+
+def request(path, method, target, body=b''):
+    async def send():
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(f'{method} {target} HTTP/1.1\r\nHost: piet\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                     + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(payload)
+    return send()
+
+
+def session(tmp_path, server, *requests):
+    path = str(tmp_path / 'piet.sock')
+
+    async def run():
+        task = asyncio.create_task(server.serve(path))
+        while not (tmp_path / 'piet.sock').exists():
+            await asyncio.sleep(0.01)
+        try:
+            return [await request(path, *arguments)
+                    for arguments in requests]
+        finally:
+            task.cancel()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def image():
+    with open(PROGRAM, 'rb') as stream:
+        return stream.read()
+
+
+def run_body(**fields):
+    return json.dumps(fields).encode()
+
+
+def test_upload_then_run_by_hash(tmp_path, image):
+    digest = hashlib.sha256(image).hexdigest()
+    (code, loaded), (_, result), (_, status) = session(
+        tmp_path, ProgramServer(),
+        ('POST', '/programs', image),
+        ('POST', '/run', run_body(program=digest, input='5\n3\n')),
+        ('GET', '/status'))
+    assert code == 200
+    assert loaded == {'program': digest, 'width': 10, 'height': 6}
+    assert result['status'] == 'finished'
+    assert result['stdout'] == '1'
+    assert result['steps'] > 0
+    assert status == {'programs': [digest], 'running': 0}
+
+
+def test_run_with_image(tmp_path, image):
+    [(code, result)] = session(
+        tmp_path, ProgramServer(),
+        ('POST', '/run', run_body(image=base64.b64encode(image).decode(),
+                                  input='2\n7\n')))
+    assert (code, result['stdout']) == (200, '-1')
+
+
+def test_limits_only_tighten(tmp_path, image):
+    body = base64.b64encode(image).decode()
+    (_, capped), (_, requested) = session(
+        tmp_path, ProgramServer(Limits(steps=3)),
+        ('POST', '/run', run_body(image=body, max_steps=1000)),
+        ('POST', '/run', run_body(image=body, max_steps=2)))
+    assert (capped['status'], capped['steps']) == ('step_limit', 3)
+    assert (requested['status'], requested['steps']) == ('step_limit', 2)
+
+
+def test_programs_are_evicted(tmp_path, image):
+    digest = hashlib.sha256(image).hexdigest()
+    other = open('programs/print_(.png', 'rb').read()
+    responses = session(
+        tmp_path, ProgramServer(max_programs=1),
+        ('POST', '/programs', image),
+        ('POST', '/programs', other),
+        ('POST', '/run', run_body(program=digest)))
+    assert responses[-1] == (404, {'error': 'программа не загружена'})
+
+
+@pytest.mark.parametrize('method, target, body, code', [
+    ('POST', '/run', b'not json', 400),
+    ('POST', '/run', b'{}', 400),
+    ('POST', '/run', run_body(program='x', max_steps=-1), 400),
+    ('POST', '/programs', b'not an image', 400),
+    ('POST', '/programs?codel_size=0', b'', 400),
+    ('GET', '/run', b'', 405),
+    ('POST', '/unknown', b'', 404),
+    ('POST', '/run', b'x' * 100, 413),
+])
+def test_bad_requests(tmp_path, method, target, body, code):
+    [(status, response)] = session(tmp_path,
+                                   ProgramServer(max_request=50),
+                                   (method, target, body))
+    assert status == code
+    assert 'error' in response
+
+
+def test_program_errors_are_reported(tmp_path, image):
+    [(code, result)] = session(
+        tmp_path, ProgramServer(),
+        ('POST', '/run', run_body(image=base64.b64encode(image).decode(),
+                                  input='x\n')))
+    assert code == 200
+    assert result['status'] == 'error'
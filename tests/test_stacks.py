@@ -0,0 +1,73 @@
+from interpreter import stacks
+from interpreter.commands import Roll
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.stacks import BlockStack
+
+import io
+import random
+import pytest
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(stacks, 'CHUNK_SIZE', 4)
+
+
+def roll(stack, depth, count):
+    stack.extend([depth, count])
+    Roll()(stack, 1, None, None)
+    return stack
+
+
+def test_list_behaviour(small_chunks):
+    stack = BlockStack(range(10))
+    assert len(stack) == 10
+    assert stack[-1] == 9 and stack[0] == 0 and stack[-2] == 8
+    assert stack[2:5] == [2, 3, 4]
+    assert stack.pop() == 9
+    stack[-1] = 42
+    assert stack == [0, 1, 2, 3, 4, 5, 6, 7, 42]
+    assert repr(stack) == repr(list(stack))
+    with pytest.raises(IndexError):
+        BlockStack().pop()
+
+
+@pytest.mark.parametrize('depth, count', [
+    (3, 1), (3, -1), (9, 4), (10, 7), (2, 5), (12, 1), (4, 4), (5, 0)])
+def test_roll_matches_list(small_chunks, depth, count):
+    assert roll(BlockStack(range(10)), depth, count) == \
+        roll(list(range(10)), depth, count)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_operations(small_chunks, seed):
+    generator = random.Random(seed)
+    expected, stack = [], BlockStack()
+    for _ in range(300):
+        if len(expected) > 100:
+            expected.clear()
+            stack = BlockStack()
+        choice = generator.random()
+        if choice < 0.5:
+            value = generator.randint(-2, 20)
+            expected.append(value)
+            stack.append(value)
+        elif choice < 0.65 and expected:
+            assert stack.pop() == expected.pop()
+        elif len(expected) < 2 or expected[-2] != 0:
+            Roll()(expected, 1, None, None)
+            Roll()(stack, 1, None, None)
+        assert stack == expected
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_driver_with_block_stack(driver_class):
+    out_stream = io.StringIO()
+    driver = driver_class(Picture.open_picture('programs/Comparsion_int.png'),
+                          False, io.StringIO('7\n3\n'), out_stream,
+                          io.StringIO(), stack_class=BlockStack)
+    driver.process_picture()
+    assert isinstance(driver.stack, BlockStack)
+    assert out_stream.getvalue() == '1'
@@ -0,0 +1,118 @@
+from interpreter.commands import InInt
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.streams import BufferedOutput, FlushPolicy, InputReader
+
+import io
+import pytest
+
+PROGRAM = 'programs/print_TLEN_use_switch.png'
+
+
+class CountingStream(io.StringIO):
+    writes = 0
+
+    def write(self, value):
+        self.writes += 1
+        return super().write(value)
+
+
+def test_size_policy():
+    stream = CountingStream()
+    output = BufferedOutput(stream, FlushPolicy(size=4))
+    for char in 'abcdefghij':
+        output.write(char)
+    assert stream.getvalue() == 'abcdefgh'
+    assert stream.writes == 2
+    output.flush()
+    assert stream.getvalue() == 'abcdefghij'
+
+
+def test_newline_policy():
+    stream = io.StringIO()
+    output = BufferedOutput(stream, FlushPolicy(newline=True))
+    output.write('a')
+    output.write('\n')
+    output.write('b')
+    assert stream.getvalue() == 'a\n'
+
+
+def test_binary_stream():
+    stream = io.BytesIO()
+    output = BufferedOutput(stream)
+    output.write('ы')
+    output.write('\ud800')
+    output.flush()
+    assert stream.getvalue() == 'ы'.encode() + b'\xed\xa0\x80'
+
+
+def test_flush_before_read():
+    stream = io.StringIO()
+    output = BufferedOutput(stream)
+    reader = InputReader(io.StringIO('1\n'), before_read=output.flush)
+    output.write('введите число: ')
+    assert stream.getvalue() == ''
+    assert reader.read_line() == '1'
+    assert stream.getvalue() == 'введите число: '
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+@pytest.mark.parametrize('policy', [FlushPolicy(), FlushPolicy(0)])
+def test_driver_output(driver_class, policy):
+    stream = CountingStream()
+    driver_class(Picture.open_picture(PROGRAM), False, io.StringIO(),
+                 stream, io.StringIO(),
+                 flush_policy=policy).process_picture()
+    assert stream.getvalue() == 'TLEN'
+    assert stream.writes == (1 if policy.size else 4)
+
+
+def test_driver_binary_output():
+    stream = io.BytesIO()
+    CompiledPietDriver(Picture.open_picture(PROGRAM), False, io.StringIO(),
+                       stream, io.StringIO()).process_picture()
+    assert stream.getvalue() == b'TLEN'
+
+
+@pytest.mark.parametrize('make_stream', [
+    io.StringIO, lambda text: io.BytesIO(text.encode())])
+def test_read_line(make_stream):
+    reader = InputReader(make_stream('12\nab\n\nпоследняя'))
+    assert [reader.read_line() for _ in range(5)] == \
+        ['12', 'ab', '', 'последняя', '']
+
+
+def test_read_token():
+    reader = InputReader(io.StringIO('  1 -2\n\n+3\nab\n4'), tokens=True)
+    assert reader.read_number() == '1'
+    assert reader.read_number() == '-2'
+    assert reader.read_number() == '+3'
+    assert reader.read_line() == 'ab'
+    assert reader.read_number() == '4'
+    assert reader.read_number() == ''
+
+
+@pytest.mark.parametrize('tokens', [False, True])
+def test_read_file_with_mmap(tmp_path, tokens):
+    path = tmp_path / 'input.txt'
+    path.write_bytes('skip\n'.encode() + 'ы\r\n'.encode() * 3 + b'7')
+    with open(path) as stream:
+        stream.readline()
+        reader = InputReader(stream, tokens, chunk_size=3)
+        assert reader.mapping is not None
+        assert [reader.read_line() for _ in range(3)] == ['ы'] * 3
+        assert reader.read_number() == '7'
+        assert reader.read_line() == ''
+        reader.close()
+
+
+def test_step_by_step_shares_input():
+    driver = PietDriver(Picture.open_picture(PROGRAM), True,
+                        io.StringIO('\n5\n'), io.StringIO(), io.StringIO())
+    command = driver.create_command(InInt)
+    driver.step_by_step.continue_execution()
+    stack = []
+    command(stack, 1, None, None)
+    assert stack == [5]
+    assert driver.step_by_step.arguments == 5
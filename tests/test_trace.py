@@ -0,0 +1,79 @@
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.limits import Limits
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.trace import (TraceReader, TraceRecorder, read_int,
+                               write_int)
+
+import io
+import pytest
+
+PROGRAM = 'programs/Comparsion_int.png'
+INPUT = '5\n3\n'
+
+
+def record(driver_class, keyframe_every=4, capacity=None, limits=None):
+    picture = Picture.open_picture(PROGRAM)
+    stream = io.BytesIO()
+    tracer = TraceRecorder(stream, picture.width, picture.height,
+                           keyframe_every, capacity)
+    driver = driver_class(picture, False, io.StringIO(INPUT),
+                          io.StringIO(), io.StringIO(), limits,
+                          tracer=tracer)
+    driver.process_picture()
+    return stream.getvalue(), driver
+
+
+def test_engines_write_the_same_trace():
+    expected, _ = record(PietDriver)
+    data, _ = record(CompiledPietDriver)
+    assert data == expected
+
+
+@pytest.mark.parametrize('driver_class', [PietDriver, CompiledPietDriver])
+def test_frames_follow_execution(driver_class):
+    data, driver = record(driver_class)
+    reader = TraceReader(data)
+    frames = list(reader.frames())
+    assert [frame.step for frame in frames] == \
+        list(range(reader.steps + 1))
+    assert frames[0].stack == [] and frames[0].command is None
+    assert frames[-1].state == driver.get_state()
+    assert frames[-1].stack == list(driver.stack)
+
+
+def test_seek_matches_limited_run():
+    reader = TraceReader(record(PietDriver)[0])
+    for step in range(1, reader.steps):
+        # скомпилированное исполнение останавливается ровно между шагами
+        _, driver = record(CompiledPietDriver, limits=Limits(steps=step))
+        frame = reader.seek(step)
+        assert frame.state == driver.get_state()
+        assert frame.stack == list(driver.stack)
+
+
+def test_ring_keeps_last_segments():
+    full = TraceReader(record(PietDriver, keyframe_every=2)[0])
+    reader = TraceReader(record(PietDriver, keyframe_every=2,
+                                capacity=1)[0])
+    assert reader.steps == full.steps
+    assert reader.first_step() > 0
+    assert list(reader.frames()) == \
+        list(full.frames(reader.first_step()))
+    with pytest.raises(IndexError):
+        reader.seek(0)
+
+
+@pytest.mark.parametrize('value', [0, 1, -1, 63, -64, 2 ** 61, -2 ** 61,
+                                   2 ** 62, -2 ** 62 - 1, 7 ** 500,
+                                   -7 ** 500])
+def test_int_round_trip(value):
+    buffer = bytearray()
+    write_int(buffer, value)
+    buffer.append(0xff)
+    assert read_int(bytes(buffer), 0) == (value, len(buffer) - 1)
+
+
+def test_not_a_trace():
+    with pytest.raises(ValueError):
+        TraceReader(b'PIETC')
@@ -0,0 +1,103 @@
+from benchmarks.programs import PROGRAMS
+from interpreter.colors import BLACK_INDEX, WHITE_INDEX
+from interpreter.compiled_driver import CompiledPietDriver
+from interpreter.hooks import Hooks
+from interpreter.limits import Limits, Status
+from interpreter.picture import Picture
+from interpreter.tracing_driver import HOOK_STEPS, TracingPietDriver
+
+import io
+import random
+import pytest
+
+
+class Steps(Hooks):
+    every_step = False
+
+    def __init__(self):
+        self.counts = []
+
+    def on_step(self, driver, state, count):
+        self.counts.append(count)
+
+
+def run(driver_class, picture, data='', limits=None, **options):
+    output = io.StringIO()
+    driver = driver_class(picture, False, io.StringIO(data), output,
+                          io.StringIO(), limits, **options)
+    try:
+        status = driver.process_picture()
+    except (Exception, SystemExit) as error:
+        return (type(error), output.getvalue()), driver
+    steps = driver.governor.steps if driver.governor is not None else None
+    return (status, output.getvalue(), list(driver.stack),
+            driver.get_state(), steps), driver
+
+
+def benchmark(tmp_path, name):
+    path = tmp_path / f'{name}.png'
+    PROGRAMS[name][0](0.1).save(path)
+    return Picture.open_picture(path, 1)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+@pytest.mark.parametrize('steps', [1, 777, 5000])
+def test_same_as_compiled(tmp_path, name, steps):
+    picture = benchmark(tmp_path, name)
+    expected, _ = run(CompiledPietDriver, picture, limits=Limits(steps))
+    result, driver = run(TracingPietDriver, picture, limits=Limits(steps),
+                         hot_threshold=2)
+    assert result == expected
+    if steps == 5000 and name != 'huge_block':
+        assert driver.traces
+
+
+def test_guards(tmp_path):
+    picture = benchmark(tmp_path, 'branch_loop')
+    _, driver = run(TracingPietDriver, picture, limits=Limits(5000),
+                    hot_threshold=2)
+    source = next(iter(driver.traces.values())).source
+    assert 'if pop() % 2 != ' in source
+    assert 'if a % 4 != ' in source
+
+
+@pytest.mark.parametrize('seed', range(150))
+def test_random_programs(seed):
+    rnd = random.Random(seed)
+    width, height = rnd.randint(2, 8), rnd.randint(1, 6)
+    colors = list(range(18)) + [WHITE_INDEX, BLACK_INDEX] * rnd.randint(0, 3)
+    picture = Picture(width, height, bytes(rnd.choice(colors)
+                                           for _ in range(width * height)))
+    data = ''.join(f'{rnd.randint(-5, 9)}\n' for _ in range(20))
+    limits = Limits(steps=rnd.randint(1, 5000), stack=50, check_every=7,
+                    output=rnd.choice([None, 30]))
+    expected, _ = run(CompiledPietDriver, picture, data, limits)
+    result, _ = run(TracingPietDriver, picture, data,
+                    Limits(**vars(limits)), hot_threshold=2)
+    assert result == expected
+
+
+def test_output_limit_inside_trace(tmp_path):
+    picture = benchmark(tmp_path, 'output_loop')
+    limits = Limits(steps=10 ** 5, output=301)
+    expected, _ = run(CompiledPietDriver, picture, limits=limits)
+    result, driver = run(TracingPietDriver, picture,
+                         limits=Limits(**vars(limits)), hot_threshold=2)
+    assert expected[0] == Status.OUTPUT_LIMIT
+    assert result == expected
+    assert driver.traces
+
+
+def test_step_hooks_are_called(tmp_path):
+    picture = benchmark(tmp_path, 'arithmetic_loop')
+    hook = Steps()
+    _, driver = run(TracingPietDriver, picture, limits=Limits(10 ** 5),
+                    hooks=[hook])
+    assert sum(hook.counts) == driver.governor.steps == 10 ** 5
+    assert max(hook.counts) <= HOOK_STEPS
+
+
+def test_without_limits():
+    picture = Picture.open_picture('programs/Comparsion_int.png')
+    result, _ = run(TracingPietDriver, picture, '5\n3\n', hot_threshold=1)
+    assert result[:2] == (Status.FINISHED, '1')
@@ -0,0 +1,44 @@
+from interpreter.picture import Picture
+from interpreter.piet_driver import PietDriver
+from interpreter.transpiler import transpile_picture
+
+import io
+import pytest
+
+PROGRAMS = [
+    ('programs/800-400.png', ''),
+    ('programs/800-400_with_incorrect_color.png', ''),
+    ('programs/print_(.png', ''),
+    ('programs/print_TLEN_use_switch.png', ''),
+    ('programs/Comparsion_int.png', '5\n3\n'),
+    ('programs/Comparsion_int.png', '3\n3\n'),
+    ('programs/Comparsion_int.png', '-3\n3\n'),
+]
+
+
+def run_module(source, input_text):
+    module = {'__name__': 'program'}
+    exec(compile(source, 'program', 'exec'), module)
+    out_stream = io.StringIO()
+    stack = module['run'](io.StringIO(input_text), out_stream)
+    return out_stream.getvalue(), stack
+
+
+@pytest.mark.parametrize(('path', 'input_text'), PROGRAMS)
+def test_same_as_piet_driver(path, input_text):
+    out_stream = io.StringIO()
+    driver = PietDriver(Picture.open_picture(path), False,
+                        io.StringIO(input_text), out_stream, io.StringIO())
+    driver.process_picture()
+    source = transpile_picture(Picture.open_picture(path), path)
+    assert run_module(source, input_text) == (out_stream.getvalue(),
+                                              driver.stack)
+
+
+def test_module_is_standalone():
+    source = transpile_picture(
+        Picture.open_picture('programs/Comparsion_int.png'))
+    imports = [line for line in source.splitlines()
+               if line.startswith(('import', 'from'))]
+    assert imports == ['import decimal', 'from typing import Dict',
+                       'import sys']